@@ -0,0 +1,171 @@
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+try:
+    from backend.database import get_async_session
+    from backend.models import UserProfile, Product, Campaign, GenerationJob, ProductBase
+    from backend.schemas import UserProfileRead, CampaignRead, GenerationJobRead, UserProfileFilter, CampaignFilter, CampaignVariantsCreate
+    from backend.queries import (
+        DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, user_load_options, campaign_load_options, user_list_statement, campaign_list_statement,
+        keyset_page, split_page, parse_fields, page_response, iter_pages_async
+    )
+    from backend.generation import async_client, build_persona_prompt
+    from backend.jobs import job_queue
+    from backend.serialization import stream_response
+    from backend.http_cache import (
+        has_validator, matches, not_modified, version, user_version_statement, user_headers,
+        campaign_version_statement, campaign_headers, loaded_campaign_headers, product_cache, product_list_response
+    )
+    from backend.streaming import stream_campaign_generation
+except ImportError:
+    from database import get_async_session
+    from models import UserProfile, Product, Campaign, GenerationJob, ProductBase
+    from schemas import UserProfileRead, CampaignRead, GenerationJobRead, UserProfileFilter, CampaignFilter, CampaignVariantsCreate
+    from queries import (
+        DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, user_load_options, campaign_load_options, user_list_statement, campaign_list_statement,
+        keyset_page, split_page, parse_fields, page_response, iter_pages_async
+    )
+    from generation import async_client, build_persona_prompt
+    from jobs import job_queue
+    from serialization import stream_response
+    from http_cache import (
+        has_validator, matches, not_modified, version, user_version_statement, user_headers,
+        campaign_version_statement, campaign_headers, loaded_campaign_headers, product_cache, product_list_response
+    )
+    from streaming import stream_campaign_generation
+
+# Asyncio versions of the generation path and read endpoints, served
+# instead of the sync handlers in main.py when IO_MODE=async
+router = APIRouter()
+
+@router.get("/users/{user_id}", response_model=UserProfileRead)
+async def read_user(user_id: int, request: Request, response: Response, session: AsyncSession = Depends(get_async_session)):
+    if has_validator(request):
+        updated = (await session.exec(user_version_statement(user_id))).first()
+        if updated is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        headers = user_headers(user_id, updated)
+        if matches(request, headers["ETag"]):
+            return not_modified(headers)
+    statement = select(UserProfile).where(UserProfile.id == user_id).options(*user_load_options())
+    user = (await session.exec(statement)).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    response.headers.update(user_headers(user_id, version(user)))
+    return user
+
+@router.get("/users", response_model=List[UserProfileRead])
+async def read_users(
+    request: Request,
+    response: Response,
+    filters: UserProfileFilter = Depends(),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    stream: bool = False,
+    session: AsyncSession = Depends(get_async_session)
+):
+    projection = parse_fields(fields, UserProfileRead)
+    statement = user_list_statement(filters).options(*user_load_options(projection))
+    if stream:
+        # Every matching row from `cursor` on, as a chunked JSON array or NDJSON (Accept: application/x-ndjson)
+        return stream_response(iter_pages_async(statement, UserProfile, cursor, projection, UserProfileRead), request)
+    users, next_cursor = split_page((await session.exec(keyset_page(statement, UserProfile, cursor, limit))).all(), limit)
+    return page_response(users, next_cursor, projection, UserProfileRead, response)
+
+@router.get("/products", response_model=List[ProductBase])
+async def read_products(request: Request, session: AsyncSession = Depends(get_async_session)):
+    cached = product_cache.get()
+    if cached is None:
+        generation = product_cache.generation
+        cached = product_cache.set(generation, (await session.exec(select(Product))).all())
+    return product_list_response(request, *cached)
+
+@router.get("/campaigns", response_model=List[CampaignRead])
+async def read_campaigns(
+    request: Request,
+    response: Response,
+    filters: CampaignFilter = Depends(),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    stream: bool = False,
+    session: AsyncSession = Depends(get_async_session)
+):
+    projection = parse_fields(fields, CampaignRead)
+    statement = campaign_list_statement(filters).options(*campaign_load_options(projection))
+    if stream:
+        # Every matching row from `cursor` on, as a chunked JSON array or NDJSON (Accept: application/x-ndjson)
+        return stream_response(iter_pages_async(statement, Campaign, cursor, projection, CampaignRead), request)
+    campaigns, next_cursor = split_page((await session.exec(keyset_page(statement, Campaign, cursor, limit))).all(), limit)
+    return page_response(campaigns, next_cursor, projection, CampaignRead, response)
+
+@router.get("/campaigns/{campaign_id}", response_model=CampaignRead)
+async def read_campaign(campaign_id: int, request: Request, response: Response, session: AsyncSession = Depends(get_async_session)):
+    if has_validator(request):
+        versions = (await session.exec(campaign_version_statement(campaign_id))).first()
+        if versions is None:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+        headers = campaign_headers(campaign_id, *versions)
+        if matches(request, headers["ETag"]):
+            return not_modified(headers)
+    statement = select(Campaign).where(Campaign.id == campaign_id).options(*campaign_load_options())
+    campaign = (await session.exec(statement)).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    response.headers.update(loaded_campaign_headers(campaign))
+    return campaign
+
+@router.post("/campaigns/{campaign_id}/generate", response_model=GenerationJobRead, status_code=202)
+async def generate_ad(campaign_id: int, force: bool = False, session: AsyncSession = Depends(get_async_session)):
+    campaign = await session.get(Campaign, campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+
+    if not async_client:
+        raise HTTPException(status_code=500, detail="OpenAI API Key is not configured")
+
+    return await job_queue.enqueue_async(campaign, session, force=force)
+
+@router.post("/campaigns/{campaign_id}/variants", response_model=GenerationJobRead, status_code=202)
+async def generate_variants(campaign_id: int, request: CampaignVariantsCreate, force: bool = False, session: AsyncSession = Depends(get_async_session)):
+    campaign = await session.get(Campaign, campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+
+    if not async_client:
+        raise HTTPException(status_code=500, detail="OpenAI API Key is not configured")
+
+    placements = [(variant.platform, variant.duration_seconds) for variant in request.variants]
+    return await job_queue.enqueue_async(campaign, session, force=force, placements=placements)
+
+@router.get("/campaigns/{campaign_id}/generate/stream")
+async def stream_generate_ad(campaign_id: int, request: Request, force: bool = False, session: AsyncSession = Depends(get_async_session)):
+    campaign = (await session.exec(select(Campaign).where(Campaign.id == campaign_id).options(*campaign_load_options()))).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+
+    if not async_client:
+        raise HTTPException(status_code=500, detail="OpenAI API Key is not configured")
+
+    persona_user_prompt = build_persona_prompt(campaign)
+    duration_seconds = campaign.duration_seconds
+    job, created = await job_queue.start_streamed_async(campaign, session, force=force)
+    if not created:
+        raise HTTPException(status_code=409, detail=f"Campaign is already generating (job {job.id})")
+
+    return StreamingResponse(
+        stream_campaign_generation(request, campaign_id, job.id, persona_user_prompt, duration_seconds, force=force),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Job-Id": str(job.id)}
+    )
+
+@router.get("/jobs/{job_id}", response_model=GenerationJobRead)
+async def read_job(job_id: int, session: AsyncSession = Depends(get_async_session)):
+    job = await session.get(GenerationJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
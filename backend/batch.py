@@ -0,0 +1,172 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import insert, update
+from sqlmodel import Session, select
+
+try:
+    from backend.database import engine
+    from backend.models import UserProfile, Campaign
+    from backend.queries import apply_user_filters
+    from backend.schemas import CampaignBatchCreate, CampaignGenerationResult
+    from backend.queries import campaign_load_options
+    from backend.jobs import run_generation
+    from backend.grouping import AudienceGroup, chunks
+    from backend.metrics import GENERATION_RESULTS
+    from backend import generation
+except ImportError:
+    from database import engine
+    from models import UserProfile, Campaign
+    from queries import apply_user_filters
+    from schemas import CampaignBatchCreate, CampaignGenerationResult
+    from queries import campaign_load_options
+    from jobs import run_generation
+    from grouping import AudienceGroup, chunks
+    from metrics import GENERATION_RESULTS
+    import generation
+
+# How many campaigns of one batch generate at the same time; the shared
+# LLM_MAX_CONCURRENCY limit still applies on top of this
+BATCH_GENERATION_CONCURRENCY = int(os.getenv("BATCH_GENERATION_CONCURRENCY", "8"))
+
+CAMPAIGN_TEMPLATE_FIELDS = {"objective", "platform", "duration_seconds", "brand_tone", "cta_style", "product_intent"}
+
+class UnknownUsersError(LookupError):
+    def __init__(self, user_ids: List[int]):
+        super().__init__(f"Users not found: {', '.join(map(str, user_ids))}")
+        self.user_ids = user_ids
+
+def _missing_user_ids(user_ids: List[int], session: Session) -> List[int]:
+    requested = list(dict.fromkeys(user_ids))
+    found = set()
+    for chunk in chunks(requested):
+        found.update(session.exec(select(UserProfile.id).where(UserProfile.id.in_(chunk))).all())
+    return [user_id for user_id in requested if user_id not in found]
+
+def resolve_user_ids(batch: CampaignBatchCreate, session: Session) -> List[int]:
+    # Explicit user_ids must all exist; a filter may still narrow them down
+    statement = select(UserProfile.id)
+    if batch.user_ids is not None:
+        missing = _missing_user_ids(batch.user_ids, session)
+        if missing:
+            raise UnknownUsersError(missing)
+        statement = statement.where(UserProfile.id.in_(batch.user_ids))
+    if batch.filter:
+        statement = apply_user_filters(statement, batch.filter)
+    return list(session.exec(statement.order_by(UserProfile.id)).all())
+
+def insert_campaigns(batch: CampaignBatchCreate, user_ids: List[int], session: Session, segment_keys: Optional[Dict[int, str]] = None) -> List[Tuple[int, int]]:
+    if not user_ids:
+        return []
+    template = batch.model_dump(include=CAMPAIGN_TEMPLATE_FIELDS)
+    status = "processing" if batch.generate else "pending"
+    created_at = datetime.utcnow()
+    segment_keys = segment_keys or {}
+    rows = [
+        {
+            **template, "user_id": user_id, "product_id": batch.product_id, "status": status, "created_at": created_at,
+            "segment_key": segment_keys.get(user_id)
+        }
+        for user_id in user_ids
+    ]
+    # One multi-row INSERT ... RETURNING for the whole batch
+    result = session.execute(insert(Campaign).returning(Campaign.id, Campaign.user_id), rows)
+    campaigns = [(row.id, row.user_id) for row in result]
+    session.commit()
+    return campaigns
+
+def _mark_failed(campaign_id: int):
+    try:
+        with Session(engine) as session:
+            session.execute(update(Campaign).where(Campaign.id == campaign_id).values(status="failed"))
+            session.commit()
+    except Exception as e:
+        print(f"Error marking campaign {campaign_id} failed: {e}")
+
+def stream_batch(campaigns: List[Tuple[int, int]], generate: bool, force: bool = False) -> Iterator[str]:
+    # Yields one NDJSON line per campaign, in completion order
+    if not generate:
+        for campaign_id, user_id in campaigns:
+            yield CampaignGenerationResult(campaign_id=campaign_id, user_id=user_id, status="pending").model_dump_json() + "\n"
+        return
+
+    with ThreadPoolExecutor(max_workers=BATCH_GENERATION_CONCURRENCY, thread_name_prefix="batch") as executor:
+        futures = {executor.submit(run_generation, campaign_id, force=force): (campaign_id, user_id) for campaign_id, user_id in campaigns}
+        for future in as_completed(futures):
+            campaign_id, user_id = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # run_generation records LLM failures itself; this covers the
+                # DB failing underneath it. Only this campaign is affected.
+                print(f"Error generation: {e}")
+                _mark_failed(campaign_id)
+                result = CampaignGenerationResult(campaign_id=campaign_id, status="failed", error=str(e))
+            result.user_id = user_id
+            yield result.model_dump_json() + "\n"
+
+# --- Segment-level generation ---
+def save_group_result(campaign_ids: List[int], creative_persona=None, sora_prompt: Optional[str] = None, error: Optional[str] = None):
+    # The shared result lands on every member's campaign in one UPDATE per chunk
+    if error is None:
+        values = {"status": "completed", "creative_persona": creative_persona, "sora_prompt": sora_prompt}
+    else:
+        values = {"status": "failed"}
+    GENERATION_RESULTS.labels(values["status"]).inc(len(campaign_ids))
+    with Session(engine) as session:
+        for chunk in chunks(campaign_ids):
+            session.execute(update(Campaign).where(Campaign.id.in_(chunk)).values(**values))
+        session.commit()
+
+def run_group_generation(group: AudienceGroup, campaign_ids: List[int], force: bool = False) -> CampaignGenerationResult:
+    # Every campaign of a batch shares the product and template, so any
+    # member's campaign supplies the brief
+    with Session(engine) as session:
+        campaign = session.exec(select(Campaign).where(Campaign.id == campaign_ids[0]).options(*campaign_load_options())).first()
+        persona_user_prompt = generation.build_audience_persona_prompt(group.attributes, len(group.user_ids), campaign)
+        duration_seconds = campaign.duration_seconds
+
+    label = f"{group.key} ({len(campaign_ids)} campaigns)"
+    try:
+        creative_persona, sora_prompt = generation.generate_creative(persona_user_prompt, duration_seconds, force=force, label=label)
+    except Exception as e:
+        print(f"Error generation: {e}")
+        save_group_result(campaign_ids, error=str(e))
+        return CampaignGenerationResult(campaign_id=campaign_ids[0], status="failed", error=str(e))
+
+    save_group_result(campaign_ids, creative_persona=creative_persona, sora_prompt=sora_prompt)
+    return CampaignGenerationResult(campaign_id=campaign_ids[0], status="completed", creative_persona=creative_persona, sora_prompt=sora_prompt)
+
+def stream_grouped_batch(campaigns: List[Tuple[int, int]], groups: List[AudienceGroup], generate: bool, force: bool = False) -> Iterator[str]:
+    # Same NDJSON lines as stream_batch, emitted for all members of a group
+    # once its shared chain completes
+    campaign_ids = {user_id: campaign_id for campaign_id, user_id in campaigns}
+
+    def lines(group: AudienceGroup, result: CampaignGenerationResult) -> Iterator[str]:
+        for user_id in group.user_ids:
+            member = result.model_copy(update={"campaign_id": campaign_ids[user_id], "user_id": user_id, "segment_key": group.key})
+            yield member.model_dump_json() + "\n"
+
+    if not generate:
+        for group in groups:
+            yield from lines(group, CampaignGenerationResult(campaign_id=0, status="pending"))
+        return
+
+    with ThreadPoolExecutor(max_workers=BATCH_GENERATION_CONCURRENCY, thread_name_prefix="batch") as executor:
+        futures = {
+            executor.submit(run_group_generation, group, [campaign_ids[user_id] for user_id in group.user_ids], force=force): group
+            for group in groups
+        }
+        for future in as_completed(futures):
+            group = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error generation: {e}")
+                try:
+                    save_group_result([campaign_ids[user_id] for user_id in group.user_ids], error=str(e))
+                except Exception as save_error:
+                    print(f"Error marking group {group.key} failed: {save_error}")
+                result = CampaignGenerationResult(campaign_id=0, status="failed", error=str(e))
+            yield from lines(group, result)
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import tempfile
+import statistics
+import subprocess
+
+# Benchmarks the persona -> Sora prompt chain in each GENERATION_PIPELINE
+# mode: end-to-end latency and tokens per campaign, against mock_llm.py.
+#   python bench_generation.py [iterations]
+# The mock gets MOCK_LLM_LATENCY=fixed:300 (time to first token) and
+# MOCK_LLM_TOKEN_LATENCY_MS=15 (per word) unless they are already set.
+# Token counts are the mock's ~4 characters per token. Every call is forced,
+# so the LLM cache (on a throwaway SQLite file) is written but never read.
+os.environ.setdefault("MOCK_LLM_LATENCY", "fixed:300")
+os.environ.setdefault("MOCK_LLM_TOKEN_LATENCY_MS", "15")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_generation.db')}"
+os.environ["OPENAI_API_KEY"] = "mock"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.load_test import BACKEND_DIR, USER_PAYLOAD, PRODUCT_PAYLOAD, CAMPAIGN_PAYLOAD, _free_port, _wait_until_up
+
+MOCK_PORT = _free_port()
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{MOCK_PORT}/v1"
+
+from sqlmodel import SQLModel
+
+from backend import generation
+from backend.database import engine
+from backend.metrics import LLM_TOKENS
+from backend.models import (
+    Campaign, Product, UserProfile, UserDemographics, UserPsychographics, UserLifestyle, UserMediaPreferences
+)
+
+# The load test's campaign at the placements the frontend offers
+PLACEMENTS = [("instagram_reels", 15), ("tiktok", 30), ("youtube_shorts", 60)]
+
+def campaigns():
+    user = UserProfile(name="Bench User")
+    user.demographics = UserDemographics(**USER_PAYLOAD["demographics"])
+    user.psychographics = UserPsychographics(**USER_PAYLOAD["psychographics"])
+    user.lifestyle = UserLifestyle(**USER_PAYLOAD["lifestyle"])
+    user.media_preferences = UserMediaPreferences(**USER_PAYLOAD["media_preferences"])
+    product = Product(**PRODUCT_PAYLOAD)
+    return [
+        Campaign(**{**CAMPAIGN_PAYLOAD, "platform": platform, "duration_seconds": duration_seconds}, user=user, product=product)
+        for platform, duration_seconds in PLACEMENTS
+    ]
+
+def tokens() -> float:
+    return sum(sample.value for metric in LLM_TOKENS.collect() for sample in metric.samples if sample.name.endswith("_total"))
+
+def measure(mode: str, fixtures, iterations: int):
+    timings = []
+    before = tokens()
+    for i in range(iterations):
+        campaign = fixtures[i % len(fixtures)]
+        prompt = generation.build_persona_prompt(campaign)
+        start = time.perf_counter()
+        generation.generate_creative(prompt, campaign.duration_seconds, force=True, label=f"bench {mode}", mode=mode)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), (tokens() - before) / iterations
+
+def run(iterations: int = 6):
+    mock = subprocess.Popen(
+        [sys.executable, "mock_llm.py", "--port", str(MOCK_PORT)],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        _wait_until_up(f"http://127.0.0.1:{MOCK_PORT}/v1/models", mock)
+        SQLModel.metadata.create_all(engine)
+        fixtures = campaigns()
+        # Warm up the connection pool so the first mode isn't penalised
+        measure("two-call", fixtures, 1)
+        results = [(mode, *measure(mode, fixtures, iterations)) for mode in generation.PIPELINE_MODES]
+    finally:
+        mock.terminate()
+        mock.wait()
+    print(f"{iterations} generations per mode (MOCK_LLM_LATENCY={os.environ['MOCK_LLM_LATENCY']}, "
+          f"MOCK_LLM_TOKEN_LATENCY_MS={os.environ['MOCK_LLM_TOKEN_LATENCY_MS']})")
+    print(f"{'mode':<14}{'p50 ms':>10}{'tokens':>10}")
+    for mode, p50, spent in results:
+        print(f"{mode:<14}{p50:>10.0f}{spent:>10.0f}")
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:2]]
+    run(*args)
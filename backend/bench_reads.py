@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import tempfile
+import statistics
+
+# Benchmarks the profile read path: queries and latency per request for the
+# "selectin" (one query per relationship) and "joined" (single query) loaders.
+#   python bench_reads.py [users] [iterations]
+# Runs against a throwaway SQLite file unless BENCH_DATABASE_URL is set.
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL")
+if not BENCH_DATABASE_URL:
+    BENCH_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_reads.db')}"
+os.environ["DATABASE_URL"] = BENCH_DATABASE_URL
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel import Session
+
+from backend import queries
+from backend.database import engine
+from backend.main import app
+from backend.models import (
+    UserProfile, UserDemographics, UserPsychographics, UserLifestyle, UserMediaPreferences,
+    Product, Campaign
+)
+
+engine.echo = False
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+def seed(users: int):
+    with Session(engine) as session:
+        product = Product(name="EcoBottle Smart", description="A self-cleaning water bottle.", features=["UV-C Cleaning"])
+        session.add(product)
+        for i in range(users):
+            user = UserProfile(name=f"Bench User {i}")
+            user.demographics = UserDemographics(age_range="25-34", gender_identity="Female", country="USA", location_type="Urban")
+            user.psychographics = UserPsychographics(values=["Innovation"], personality_traits={"Openness": 80})
+            user.lifestyle = UserLifestyle(occupation="Designer", hobbies=["Yoga", "Hiking"])
+            user.media_preferences = UserMediaPreferences(preferred_platforms=["TikTok"])
+            session.add(user)
+            session.add(Campaign(user=user, product=product, platform="tiktok"))
+        session.commit()
+
+def measure(client: TestClient, counter: QueryCounter, path: str, iterations: int):
+    timings, counts = [], []
+    for _ in range(iterations):
+        counter.count = 0
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append((time.perf_counter() - start) * 1000)
+        counts.append(counter.count)
+        assert response.status_code == 200, response.text
+    return statistics.median(counts), statistics.median(timings)
+
+def run(users: int = 1000, iterations: int = 50):
+    endpoints = ["/users/1", "/campaigns/1", "/users?limit=100", "/campaigns?limit=100"]
+    counter = QueryCounter()
+    with TestClient(app) as client:
+        seed(users)
+        event.listen(engine, "before_cursor_execute", counter)
+        print(f"{users} users, {iterations} iterations per endpoint ({BENCH_DATABASE_URL})")
+        print(f"{'strategy':<10}{'endpoint':<24}{'queries':>8}{'p50 ms':>10}")
+        for name, loader in (("selectin", selectinload), ("joined", joinedload)):
+            queries.eager_load = loader
+            for path in endpoints:
+                count, p50 = measure(client, counter, path, iterations)
+                print(f"{name:<10}{path:<24}{count:>8.0f}{p50:>10.2f}")
+        event.remove(engine, "before_cursor_execute", counter)
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    run(*args)
@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import tempfile
+import statistics
+
+# Benchmarks PATCH /users/{id}: statements and latency per patch for the
+# previous ORM path (load, mutate, commit, reload) and the upsert path.
+#   python bench_writes.py [users] [iterations]
+# Runs against a throwaway SQLite file unless BENCH_DATABASE_URL is set.
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL")
+if not BENCH_DATABASE_URL:
+    BENCH_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_writes.db')}"
+os.environ["DATABASE_URL"] = BENCH_DATABASE_URL
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel
+
+from backend.database import engine
+from backend.main import load_user
+from backend.models import UserProfile, UserDemographics, UserPsychographics, UserLifestyle, UserMediaPreferences
+from backend.schemas import UserProfileUpdate
+from backend.segments import PROFILE_RELATIONS
+from backend.user_writes import patch_user
+
+engine.echo = False
+
+PATCHES = {
+    "name only": {"name": "Renamed"},
+    "one section": {"psychographics": {"values": ["Sustainability"]}},
+    "all sections": {
+        "name": "Renamed",
+        "demographics": {"age_range": "35-44", "gender_identity": "Male", "country": "Canada", "location_type": "Suburban"},
+        "psychographics": {"values": ["Family"], "risk_tolerance": "low"},
+        "lifestyle": {"occupation": "Teacher", "hobbies": ["Reading"]},
+        "media_preferences": {"preferred_platforms": ["YouTube"]},
+    },
+}
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+def seed(users: int):
+    with Session(engine) as session:
+        for i in range(users):
+            user = UserProfile(name=f"Bench User {i}")
+            user.demographics = UserDemographics(age_range="25-34", gender_identity="Female", country="USA", location_type="Urban")
+            user.psychographics = UserPsychographics(values=["Innovation"], personality_traits={"Openness": 80})
+            user.lifestyle = UserLifestyle(occupation="Designer", hobbies=["Yoga", "Hiking"])
+            user.media_preferences = UserMediaPreferences(preferred_platforms=["TikTok"])
+            session.add(user)
+        session.commit()
+
+def orm_patch(session: Session, user_id: int, patch: UserProfileUpdate):
+    # The handler as it was before the upsert path
+    user = load_user(session, user_id)
+    if patch.name is not None:
+        user.name = patch.name
+    session.add(user)
+    for relation, model in PROFILE_RELATIONS.items():
+        data, current = getattr(patch, relation), getattr(user, relation)
+        if data is None:
+            continue
+        if current:
+            for key, value in data.model_dump(exclude_unset=True).items():
+                setattr(current, key, value)
+            session.add(current)
+        else:
+            session.add(model(**data.model_dump(), user_id=user.id))
+    session.commit()
+    return load_user(session, user.id)
+
+def upsert_patch(session: Session, user_id: int, patch: UserProfileUpdate):
+    user = patch_user(session, user_id, patch)
+    session.commit()
+    return user
+
+def measure(counter: QueryCounter, write, patch: UserProfileUpdate, users: int, iterations: int):
+    timings, counts = [], []
+    for i in range(iterations):
+        with Session(engine) as session:
+            counter.count = 0
+            start = time.perf_counter()
+            write(session, i % users + 1, patch)
+            timings.append((time.perf_counter() - start) * 1000)
+            counts.append(counter.count)
+    return statistics.median(counts), statistics.median(timings)
+
+def run(users: int = 1000, iterations: int = 200):
+    SQLModel.metadata.create_all(engine)
+    seed(users)
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    print(f"{users} users, {iterations} patches per case ({BENCH_DATABASE_URL})")
+    print(f"{'path':<8}{'patch':<16}{'statements':>11}{'p50 ms':>10}")
+    for label, body in PATCHES.items():
+        patch = UserProfileUpdate.model_validate(body)
+        for name, write in (("orm", orm_patch), ("upsert", upsert_patch)):
+            count, p50 = measure(counter, write, patch, users, iterations)
+            print(f"{name:<8}{label:<16}{count:>11.0f}{p50:>10.2f}")
+    event.remove(engine, "before_cursor_execute", counter)
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    run(*args)
@@ -0,0 +1,284 @@
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union, get_args, get_origin
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+import orjson
+from sqlalchemy import Text, cast, func, or_, update
+from sqlmodel import Session, select
+
+try:
+    from backend.database import engine
+    from backend.models import Campaign, CampaignBase, Product, ProductBase, UserProfile, ExportJob
+    from backend.segments import PROFILE_RELATIONS
+except ImportError:
+    from database import engine
+    from models import Campaign, CampaignBase, Product, ProductBase, UserProfile, ExportJob
+    from segments import PROFILE_RELATIONS
+
+# Columnar export of campaigns for analytics: one flat row per campaign with
+# its product, the user's profile attributes and the creative_persona keys,
+# read through a server-side cursor and written EXPORT_CHUNK_SIZE rows at a
+# time as Parquet row groups or Arrow IPC record batches. Memory is bounded
+# by the chunk size, not the number of campaigns.
+#   python export.py campaigns.parquet [--format arrow] [--since 2026-01-01T00:00:00]
+
+# Rows per cursor fetch, and per row group / record batch
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "10000"))
+# Where POST /exports writes its files
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "exports"))
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "1"))
+EXPORT_PARQUET_COMPRESSION = os.getenv("EXPORT_PARQUET_COMPRESSION", "zstd")
+
+EXPORT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+ACTIVE_EXPORT_STATUSES = ("queued", "running")
+
+# The keys PERSONA_TASK asks for, as persona_* columns; the whole persona is
+# kept in creative_persona as JSON, so any other keys survive too
+PERSONA_KEYS = (
+    "protagonist_description", "setting", "mood_and_tone", "narrative_arc",
+    "camera_behavior", "lighting", "music_vibe", "pacing",
+)
+
+def _json_text(value: Optional[str]) -> Optional[str]:
+    # JSON columns are read as text, so dict fields are copied as they are stored
+    return None if value is None or value == "null" else value
+
+def _json_list(value: Optional[str]) -> Optional[List[str]]:
+    # List fields are List[str] on every model, validated on write
+    return None if value is None else orjson.loads(value)
+
+def _text(value: Any) -> Optional[str]:
+    # Persona values are usually strings; narrative_arc and the odd list are JSON
+    return value if value is None or isinstance(value, str) else orjson.dumps(value).decode("utf-8")
+
+def _column(name: str, expression, annotation) -> Tuple[str, Any, pa.DataType, Optional[Callable[[Any], Any]]]:
+    # (column, SQL expression, Arrow type, converter) for a model field. JSON
+    # fields are selected as text: lists are parsed with orjson, dicts are
+    # exported as JSON strings without a decode/encode round trip.
+    if get_origin(annotation) is Union:
+        annotation = next(arg for arg in get_args(annotation) if arg is not type(None))
+    origin = get_origin(annotation) or annotation
+    if origin is list:
+        return name, cast(expression, Text), pa.list_(pa.string()), _json_list
+    if origin is dict:
+        return name, cast(expression, Text), pa.string(), _json_text
+    types = {str: pa.string(), int: pa.int64(), float: pa.float64(), bool: pa.bool_(), datetime: pa.timestamp("us")}
+    return name, expression, types[origin], None
+
+def _version(model):
+    # As in http_cache: updated_at, or created_at for rows never updated
+    return func.coalesce(model.updated_at, model.created_at)
+
+def _model_columns(model, fields, prefix: str):
+    return [_column(f"{prefix}{name}", getattr(model, name), fields[name].annotation) for name in fields if name not in ("id", "user_id")]
+
+def export_columns() -> List[Tuple[str, Any, pa.DataType, Optional[Callable[[Any], Any]]]]:
+    # In file order
+    columns = [
+        ("campaign_id", Campaign.id, pa.int64(), None),
+        ("user_id", Campaign.user_id, pa.int64(), None),
+        ("product_id", Campaign.product_id, pa.int64(), None),
+        *_model_columns(Campaign, CampaignBase.model_fields, ""),
+        ("updated_at", _version(Campaign), pa.timestamp("us"), None),
+        *_model_columns(Product, ProductBase.model_fields, "product_"),
+        ("product_updated_at", _version(Product), pa.timestamp("us"), None),
+        ("user_name", UserProfile.name, pa.string(), None),
+        ("user_created_at", UserProfile.created_at, pa.timestamp("us"), None),
+        ("user_updated_at", _version(UserProfile), pa.timestamp("us"), None),
+    ]
+    for relation, model in PROFILE_RELATIONS.items():
+        columns += _model_columns(model, model.model_fields, f"{relation}_")
+    return columns
+
+EXPORT_COLUMNS = export_columns()
+# The versions `since` is compared with; the latest exported is exported_until
+VERSION_COLUMNS = ("updated_at", "product_updated_at", "user_updated_at")
+
+PERSONA_COLUMN = [name for name, _, _, _ in EXPORT_COLUMNS].index("creative_persona")
+
+SCHEMA = pa.schema(
+    [pa.field(name, arrow_type) for name, _, arrow_type, _ in EXPORT_COLUMNS]
+    + [pa.field(f"persona_{key}", pa.string()) for key in PERSONA_KEYS]
+)
+
+def export_statement(since: Optional[datetime] = None):
+    statement = (
+        select(*[expression.label(name) for name, expression, _, _ in EXPORT_COLUMNS])
+        .join(Product, Product.id == Campaign.product_id)
+        .join(UserProfile, UserProfile.id == Campaign.user_id)
+    )
+    for model in PROFILE_RELATIONS.values():
+        statement = statement.outerjoin(model, model.user_id == UserProfile.id)
+    if since is not None:
+        # A campaign row carries its user and product, so their changes count
+        statement = statement.where(or_(_version(Campaign) > since, _version(Product) > since, _version(UserProfile) > since))
+    return statement.order_by(Campaign.id)
+
+def record_batch(rows: List[Tuple]) -> pa.RecordBatch:
+    # Converts a chunk of cursor rows column by column
+    values = list(zip(*rows))
+    arrays = []
+    for (name, _, arrow_type, convert), column in zip(EXPORT_COLUMNS, values):
+        arrays.append(pa.array([convert(value) for value in column] if convert else column, type=arrow_type))
+    personas = [orjson.loads(persona) if persona else None for persona in values[PERSONA_COLUMN]]
+    for key in PERSONA_KEYS:
+        arrays.append(pa.array([_text(persona.get(key)) if isinstance(persona, dict) else None for persona in personas], type=pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, schema=SCHEMA)
+
+class _Writer:
+    # Parquet (one row group per chunk) or Arrow IPC file (one record batch per chunk)
+    def __init__(self, path: str, format: str):
+        if format == "parquet":
+            self._writer = pq.ParquetWriter(path, SCHEMA, compression=EXPORT_PARQUET_COMPRESSION)
+        else:
+            self._sink = pa.OSFile(path, "wb")
+            self._writer = ipc.new_file(self._sink, SCHEMA)
+        self.format = format
+
+    def write(self, batch: pa.RecordBatch):
+        if self.format == "parquet":
+            self._writer.write_batch(batch, row_group_size=batch.num_rows)
+        else:
+            self._writer.write_batch(batch)
+
+    def close(self):
+        self._writer.close()
+        if self.format != "parquet":
+            self._sink.close()
+
+def export_campaigns(path: str, format: str = "parquet", since: Optional[datetime] = None, chunk_size: int = EXPORT_CHUNK_SIZE) -> Dict[str, Any]:
+    # Written to a temporary file and renamed, so a reader never sees a partial export
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {format}")
+    start = time.perf_counter()
+    rows = row_groups = 0
+    exported_until = since
+    partial = f"{path}.partial"
+    writer = _Writer(partial, format)
+    try:
+        with engine.connect() as connection:
+            # stream_results: a named cursor on PostgreSQL, so rows arrive
+            # chunk_size at a time instead of all at once
+            result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(export_statement(since))
+            for chunk in result.partitions():
+                batch = record_batch(chunk)
+                writer.write(batch)
+                rows += batch.num_rows
+                row_groups += 1
+                latest = max(pc.max(batch.column(name)).as_py() for name in VERSION_COLUMNS)
+                exported_until = latest if exported_until is None else max(exported_until, latest)
+        writer.close()
+    except BaseException:
+        writer.close()
+        os.remove(partial)
+        raise
+    os.replace(partial, path)
+    print(f"Exported {rows} campaigns to {path} in {time.perf_counter() - start:.1f}s")
+    return {"path": path, "rows": rows, "row_groups": row_groups, "exported_until": exported_until}
+
+# --- Background exports (POST /exports) ---
+def export_path(job: ExportJob) -> str:
+    return os.path.join(EXPORT_DIR, f"campaigns-{job.id}{EXPORT_FORMATS[job.format]}")
+
+def _finish(job_id: int, **values):
+    with Session(engine) as session:
+        job = session.get(ExportJob, job_id)
+        for key, value in values.items():
+            setattr(job, key, value)
+        job.finished_at = datetime.utcnow()
+        session.add(job)
+        session.commit()
+
+def run_export(job_id: int):
+    with Session(engine) as session:
+        job = session.get(ExportJob, job_id)
+        if job is None or job.status != "queued":
+            return
+        job.status, job.started_at = "running", datetime.utcnow()
+        session.add(job)
+        session.commit()
+        path, format, since = export_path(job), job.format, job.since
+    try:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        summary = export_campaigns(path, format, since)
+    except Exception as e:
+        print(f"Error export {job_id}: {e}")
+        _finish(job_id, status="failed", error=str(e))
+        return
+    _finish(job_id, status="completed", **summary)
+
+class ExportQueue:
+    # Exports run on their own small pool so a long one never holds up
+    # campaign generation; each holds one connection for its duration
+    def __init__(self, max_workers: int = EXPORT_WORKERS):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: Set[Future] = set()
+
+    def start(self):
+        if self._executor:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="export")
+        with Session(engine) as session:
+            # An export interrupted by a restart starts over; the partial file is replaced
+            session.execute(update(ExportJob).where(ExportJob.status == "running").values(status="queued", started_at=None))
+            session.commit()
+            pending = session.exec(select(ExportJob.id).where(ExportJob.status == "queued").order_by(ExportJob.id)).all()
+        for job_id in pending:
+            self._dispatch(job_id)
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _dispatch(self, job_id: int):
+        if not self._executor:
+            return
+        future = self._executor.submit(run_export, job_id)
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+
+    def enqueue(self, session: Session, format: str, since: Optional[datetime]) -> ExportJob:
+        job = ExportJob(format=format, since=since)
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        self._dispatch(job.id)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with Session(engine) as session:
+            counts = dict(session.exec(
+                select(ExportJob.status, func.count())
+                .where(ExportJob.status.in_(ACTIVE_EXPORT_STATUSES))
+                .group_by(ExportJob.status)
+            ).all())
+        return {
+            "workers": self.max_workers,
+            "dispatched": len(self._futures),
+            **{status: counts.get(status, 0) for status in ACTIVE_EXPORT_STATUSES},
+        }
+
+export_queue = ExportQueue()
+
+def _timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export campaigns with their product, profile and persona as Parquet or Arrow IPC")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), help="defaults to the path's extension, else parquet")
+    parser.add_argument("--since", type=_timestamp, help="only campaigns whose row, user or product changed after this (ISO 8601, UTC)")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+    format = args.format or next((name for name, extension in EXPORT_FORMATS.items() if args.path.endswith(extension)), "parquet")
+    summary = export_campaigns(args.path, format, args.since, args.chunk_size)
+    if summary["exported_until"]:
+        print(f"Next incremental export: --since {summary['exported_until'].isoformat()}")
@@ -0,0 +1,298 @@
+import os
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+from dotenv import load_dotenv
+from openai import OpenAI, AsyncOpenAI
+
+try:
+    from backend.llm_cache import llm_cache, cache_key
+    from backend.llm_gateway import LLMGateway
+    from backend.prompts import (
+        build_persona_prompt, build_audience_persona_prompt, build_sora_prompt,
+        persona_messages, sora_messages, single_pass_messages, log_usage,
+        count_tokens, count_message_tokens
+    )
+except ImportError:
+    from llm_cache import llm_cache, cache_key
+    from llm_gateway import LLMGateway
+    from prompts import (
+        build_persona_prompt, build_audience_persona_prompt, build_sora_prompt,
+        persona_messages, sora_messages, single_pass_messages, log_usage,
+        count_tokens, count_message_tokens
+    )
+
+load_dotenv()
+
+# Configure OpenAI
+api_key = os.getenv("OPENAI_API_KEY")
+# Point at mock_llm.py (e.g. http://127.0.0.1:8100/v1) to run without OpenAI
+base_url = os.getenv("OPENAI_BASE_URL") or None
+# Retries are handled by the gateway, which also rate limits them
+client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0) if api_key else None
+async_client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0) if api_key else None
+
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+# Caps how many chat completions are in flight at once across all workers
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+gateway = LLMGateway(client, async_client, LLM_MAX_CONCURRENCY)
+
+# How a campaign's persona -> Sora prompt chain is run:
+#   two-call     persona, then the Sora prompt from it (the default)
+#   single-pass  one JSON completion holding both
+#   pipelined    the persona is streamed and the Sora request sent as soon
+#                as its JSON object closes; caching and usage logging for
+#                the persona overlap the second call
+GENERATION_PIPELINE = os.getenv("GENERATION_PIPELINE", "two-call")
+PIPELINE_MODES = ("two-call", "single-pass", "pipelined")
+if GENERATION_PIPELINE not in PIPELINE_MODES:
+    raise ValueError(f"GENERATION_PIPELINE must be one of {', '.join(PIPELINE_MODES)}, not {GENERATION_PIPELINE}")
+
+def _log_usage(label: Optional[str], step: str, response):
+    if response.usage is not None:
+        log_usage(label, step, response.usage.prompt_tokens, response.usage.completion_tokens)
+
+def generate_persona(persona_user_prompt: str, force: bool = False, label: Optional[str] = None) -> Dict[str, Any]:
+    # Step 1: Generate Creative Persona
+    messages = persona_messages(persona_user_prompt)
+    key = cache_key("persona", OPENAI_MODEL, messages)
+    cached = None if force else llm_cache.get(key)
+    if cached is not None:
+        return cached
+    persona_response = gateway.complete(
+        model=OPENAI_MODEL,
+        messages=messages,
+        response_format={"type": "json_object"}
+    )
+    _log_usage(label, "persona", persona_response)
+    creative_persona = json.loads(persona_response.choices[0].message.content)
+    llm_cache.set(key, "persona", OPENAI_MODEL, creative_persona)
+    return creative_persona
+
+def generate_sora_prompt(creative_persona: Dict[str, Any], duration_seconds: int, force: bool = False, label: Optional[str] = None, platform: Optional[str] = None) -> str:
+    # Step 2: Generate Sora Prompt
+    messages = sora_messages(creative_persona, duration_seconds, platform)
+    key = cache_key("sora_prompt", OPENAI_MODEL, messages)
+    cached = None if force else llm_cache.get(key)
+    if cached is not None:
+        return cached
+    sora_response = gateway.complete(
+        model=OPENAI_MODEL,
+        messages=messages
+    )
+    _log_usage(label, "sora_prompt", sora_response)
+    sora_prompt = sora_response.choices[0].message.content
+    llm_cache.set(key, "sora_prompt", OPENAI_MODEL, sora_prompt)
+    return sora_prompt
+
+# The cache's persistent tier uses the sync engine, so the async variants
+# look it up from a worker thread to keep the event loop free
+async def generate_persona_async(persona_user_prompt: str, force: bool = False, label: Optional[str] = None) -> Dict[str, Any]:
+    messages = persona_messages(persona_user_prompt)
+    key = cache_key("persona", OPENAI_MODEL, messages)
+    cached = None if force else await asyncio.to_thread(llm_cache.get, key)
+    if cached is not None:
+        return cached
+    persona_response = await gateway.complete_async(
+        model=OPENAI_MODEL,
+        messages=messages,
+        response_format={"type": "json_object"}
+    )
+    _log_usage(label, "persona", persona_response)
+    creative_persona = json.loads(persona_response.choices[0].message.content)
+    await asyncio.to_thread(llm_cache.set, key, "persona", OPENAI_MODEL, creative_persona)
+    return creative_persona
+
+async def generate_sora_prompt_async(creative_persona: Dict[str, Any], duration_seconds: int, force: bool = False, label: Optional[str] = None, platform: Optional[str] = None) -> str:
+    messages = sora_messages(creative_persona, duration_seconds, platform)
+    key = cache_key("sora_prompt", OPENAI_MODEL, messages)
+    cached = None if force else await asyncio.to_thread(llm_cache.get, key)
+    if cached is not None:
+        return cached
+    sora_response = await gateway.complete_async(
+        model=OPENAI_MODEL,
+        messages=messages
+    )
+    _log_usage(label, "sora_prompt", sora_response)
+    sora_prompt = sora_response.choices[0].message.content
+    await asyncio.to_thread(llm_cache.set, key, "sora_prompt", OPENAI_MODEL, sora_prompt)
+    return sora_prompt
+
+# --- Single-pass and pipelined chains ---
+def _parse_creative(content: str) -> Tuple[Dict[str, Any], str]:
+    data = json.loads(content)
+    creative_persona, sora_prompt = data.get("creative_persona"), data.get("sora_prompt")
+    if not isinstance(creative_persona, dict) or not isinstance(sora_prompt, str) or not sora_prompt.strip():
+        raise ValueError("Single-pass response is missing creative_persona or sora_prompt")
+    return creative_persona, sora_prompt
+
+class JSONObjectScanner:
+    # Tracks brace depth across streamed text (ignoring braces inside
+    # strings) to tell where the top-level JSON object closes
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str) -> int:
+        # Index just past the closing brace within `text`, or -1
+        for index, char in enumerate(text):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    return index + 1
+        return -1
+
+def _read_json_object(deltas: Iterator[str]) -> str:
+    # Stops reading, and closes the stream, once the object is complete
+    scanner, parts = JSONObjectScanner(), []
+    try:
+        for delta in deltas:
+            end = scanner.feed(delta)
+            if end != -1:
+                parts.append(delta[:end])
+                break
+            parts.append(delta)
+    finally:
+        deltas.close()
+    return "".join(parts)
+
+async def _read_json_object_async(deltas: AsyncIterator[str]) -> str:
+    scanner, parts = JSONObjectScanner(), []
+    try:
+        async for delta in deltas:
+            end = scanner.feed(delta)
+            if end != -1:
+                parts.append(delta[:end])
+                break
+            parts.append(delta)
+    finally:
+        await deltas.aclose()
+    return "".join(parts)
+
+def generate_single_pass(persona_user_prompt: str, duration_seconds: int, force: bool = False, label: Optional[str] = None) -> Tuple[Dict[str, Any], str]:
+    messages = single_pass_messages(persona_user_prompt, duration_seconds)
+    key = cache_key("creative", OPENAI_MODEL, messages)
+    cached = None if force else llm_cache.get(key)
+    if cached is not None:
+        return cached["creative_persona"], cached["sora_prompt"]
+    response = gateway.complete(
+        model=OPENAI_MODEL,
+        messages=messages,
+        response_format={"type": "json_object"}
+    )
+    _log_usage(label, "single_pass", response)
+    creative_persona, sora_prompt = _parse_creative(response.choices[0].message.content)
+    llm_cache.set(key, "creative", OPENAI_MODEL, {"creative_persona": creative_persona, "sora_prompt": sora_prompt})
+    return creative_persona, sora_prompt
+
+async def generate_single_pass_async(persona_user_prompt: str, duration_seconds: int, force: bool = False, label: Optional[str] = None) -> Tuple[Dict[str, Any], str]:
+    messages = single_pass_messages(persona_user_prompt, duration_seconds)
+    key = cache_key("creative", OPENAI_MODEL, messages)
+    cached = None if force else await asyncio.to_thread(llm_cache.get, key)
+    if cached is not None:
+        return cached["creative_persona"], cached["sora_prompt"]
+    response = await gateway.complete_async(
+        model=OPENAI_MODEL,
+        messages=messages,
+        response_format={"type": "json_object"}
+    )
+    _log_usage(label, "single_pass", response)
+    creative_persona, sora_prompt = _parse_creative(response.choices[0].message.content)
+    await asyncio.to_thread(llm_cache.set, key, "creative", OPENAI_MODEL, {"creative_persona": creative_persona, "sora_prompt": sora_prompt})
+    return creative_persona, sora_prompt
+
+# The pipelined persona uses the same messages, and so the same cache
+# entries, as generate_persona. Streams don't report usage, so it is estimated.
+def generate_pipelined(persona_user_prompt: str, duration_seconds: int, force: bool = False, label: Optional[str] = None) -> Tuple[Dict[str, Any], str]:
+    messages = persona_messages(persona_user_prompt)
+    key = cache_key("persona", OPENAI_MODEL, messages)
+    cached = None if force else llm_cache.get(key)
+    if cached is not None:
+        return cached, generate_sora_prompt(cached, duration_seconds, force, label)
+    content = _read_json_object(gateway.stream(OPENAI_MODEL, messages, response_format={"type": "json_object"}))
+    creative_persona = json.loads(content)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline") as executor:
+        sora_prompt = executor.submit(generate_sora_prompt, creative_persona, duration_seconds, force, label)
+        log_usage(label, "persona", count_message_tokens(messages), count_tokens(content), estimated=True)
+        llm_cache.set(key, "persona", OPENAI_MODEL, creative_persona)
+        return creative_persona, sora_prompt.result()
+
+async def generate_pipelined_async(persona_user_prompt: str, duration_seconds: int, force: bool = False, label: Optional[str] = None) -> Tuple[Dict[str, Any], str]:
+    messages = persona_messages(persona_user_prompt)
+    key = cache_key("persona", OPENAI_MODEL, messages)
+    cached = None if force else await asyncio.to_thread(llm_cache.get, key)
+    if cached is not None:
+        return cached, await generate_sora_prompt_async(cached, duration_seconds, force, label)
+    content = await _read_json_object_async(gateway.stream_async(OPENAI_MODEL, messages, response_format={"type": "json_object"}))
+    creative_persona = json.loads(content)
+    sora_prompt = asyncio.create_task(generate_sora_prompt_async(creative_persona, duration_seconds, force, label))
+    try:
+        log_usage(label, "persona", count_message_tokens(messages), count_tokens(content), estimated=True)
+        await asyncio.to_thread(llm_cache.set, key, "persona", OPENAI_MODEL, creative_persona)
+    except BaseException:
+        sora_prompt.cancel()
+        raise
+    return creative_persona, await sora_prompt
+
+def generate_creative(persona_user_prompt: str, duration_seconds: int, force: bool = False, label: Optional[str] = None, mode: Optional[str] = None) -> Tuple[Dict[str, Any], str]:
+    # The persona and Sora prompt in `mode` (GENERATION_PIPELINE by default)
+    mode = mode or GENERATION_PIPELINE
+    if mode == "single-pass":
+        return generate_single_pass(persona_user_prompt, duration_seconds, force, label)
+    if mode == "pipelined":
+        return generate_pipelined(persona_user_prompt, duration_seconds, force, label)
+    creative_persona = generate_persona(persona_user_prompt, force=force, label=label)
+    return creative_persona, generate_sora_prompt(creative_persona, duration_seconds, force=force, label=label)
+
+async def generate_creative_async(persona_user_prompt: str, duration_seconds: int, force: bool = False, label: Optional[str] = None, mode: Optional[str] = None) -> Tuple[Dict[str, Any], str]:
+    mode = mode or GENERATION_PIPELINE
+    if mode == "single-pass":
+        return await generate_single_pass_async(persona_user_prompt, duration_seconds, force, label)
+    if mode == "pipelined":
+        return await generate_pipelined_async(persona_user_prompt, duration_seconds, force, label)
+    creative_persona = await generate_persona_async(persona_user_prompt, force=force, label=label)
+    return creative_persona, await generate_sora_prompt_async(creative_persona, duration_seconds, force=force, label=label)
+
+# Variants: one persona, then a Sora prompt per (platform, duration_seconds)
+# placement, all requested at once. Each result is the prompt or the
+# exception that placement failed with; the others still complete.
+def generate_sora_prompts(creative_persona: Dict[str, Any], placements: List[Tuple[str, int]], force: bool = False, label: Optional[str] = None) -> List[Union[str, Exception]]:
+    with ThreadPoolExecutor(max_workers=len(placements), thread_name_prefix="variants") as executor:
+        futures = [
+            executor.submit(generate_sora_prompt, creative_persona, duration_seconds, force, f"{label} {platform}/{duration_seconds}s", platform)
+            for platform, duration_seconds in placements
+        ]
+    results: List[Union[str, Exception]] = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return results
+
+async def generate_sora_prompts_async(creative_persona: Dict[str, Any], placements: List[Tuple[str, int]], force: bool = False, label: Optional[str] = None) -> List[Union[str, Exception]]:
+    return await asyncio.gather(*[
+        generate_sora_prompt_async(creative_persona, duration_seconds, force, f"{label} {platform}/{duration_seconds}s", platform)
+        for platform, duration_seconds in placements
+    ], return_exceptions=True)
+
+def stream_completion(messages, **kwargs) -> Iterator[str]:
+    # Yields content deltas as they arrive
+    return gateway.stream(OPENAI_MODEL, messages, **kwargs)
+
+def stream_completion_async(messages, **kwargs) -> AsyncIterator[str]:
+    return gateway.stream_async(OPENAI_MODEL, messages, **kwargs)
@@ -0,0 +1,156 @@
+import os
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from sqlmodel import Session, select
+
+try:
+    from backend.database import engine
+    from backend.models import UserProfile
+    from backend.segments import PROFILE_RELATIONS, segment_index
+    from backend import generation
+except ImportError:
+    from database import engine
+    from models import UserProfile
+    from segments import PROFILE_RELATIONS, segment_index
+    import generation
+
+# Groups a batch's target users so the persona/Sora chain runs once per
+# group instead of once per user (see CampaignBatchCreate.group_by)
+
+# Attributes compared in "exact" mode unless the request names its own
+DEFAULT_GROUP_FIELDS = ["age_range", "gender_identity", "country", "location_type", "preferred_platforms"]
+# Users compared against the current group leaders at once in "similarity" mode
+SIMILARITY_BLOCK_SIZE = int(os.getenv("SIMILARITY_BLOCK_SIZE", "512"))
+# Bound on ids per IN (...) clause
+ID_CHUNK_SIZE = 10000
+
+# grouping_stats() field -> response header on grouped batches
+GROUPING_HEADERS = {
+    "audience_size": "X-Audience-Size",
+    "groups": "X-Groups",
+    "llm_calls": "X-LLM-Calls",
+    "llm_calls_saved": "X-LLM-Calls-Saved",
+    "dedup_ratio": "X-Dedup-Ratio",
+}
+
+# Profile attribute name -> (owning table, column)
+PROFILE_COLUMNS = {
+    name: (model, getattr(model, name))
+    for model in PROFILE_RELATIONS.values()
+    for name in model.model_fields if name not in ("id", "user_id")
+}
+
+@dataclass
+class AudienceGroup:
+    key: str
+    attributes: Dict[str, Any] # what the group's prompt is written for
+    user_ids: List[int] = field(default_factory=list)
+
+def chunks(items: Sequence, size: int = ID_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def profile_attributes(user_ids: List[int], fields: List[str]) -> Dict[int, Dict[str, Any]]:
+    # Selects only the requested attributes, joining only the tables that hold them
+    models = list(dict.fromkeys(PROFILE_COLUMNS[name][0] for name in fields))
+    statement = select(UserProfile.id, *[PROFILE_COLUMNS[name][1] for name in fields])
+    for model in models:
+        statement = statement.outerjoin(model, model.user_id == UserProfile.id)
+    attributes = {}
+    with Session(engine) as session:
+        for chunk in chunks(user_ids):
+            for user_id, *values in session.exec(statement.where(UserProfile.id.in_(chunk))):
+                attributes[user_id] = dict(zip(fields, values))
+    # Keep the caller's order so grouping is deterministic
+    return {user_id: attributes[user_id] for user_id in user_ids if user_id in attributes}
+
+def _canonical(value: Any) -> Any:
+    # Case, whitespace and list order don't separate otherwise equal users
+    if isinstance(value, str):
+        return value.strip().lower()
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted(_canonical(item) for item in value))
+    if isinstance(value, dict):
+        return tuple(sorted((key, _canonical(item)) for key, item in value.items()))
+    return value
+
+def _present(attributes: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: value for name, value in attributes.items() if value not in (None, "", [], {})}
+
+def group_by_attributes(user_ids: List[int], fields: List[str]) -> List[AudienceGroup]:
+    groups: Dict[tuple, AudienceGroup] = {}
+    for user_id, attributes in profile_attributes(user_ids, fields).items():
+        key = tuple(_canonical(attributes[name]) for name in fields)
+        group = groups.get(key)
+        if group is None:
+            digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:12]
+            group = groups[key] = AudienceGroup(key=f"exact:{digest}", attributes=_present(attributes))
+        group.user_ids.append(user_id)
+    return list(groups.values())
+
+def group_by_similarity(user_ids: List[int], threshold: float) -> List[AudienceGroup]:
+    # Greedy leader clustering: each user joins the most similar existing
+    # leader if its cosine similarity reaches the threshold, otherwise
+    # becomes a leader itself. Similarities to the leaders found so far are
+    # computed for a whole block of users in one matrix product.
+    found, vectors = segment_index.vectors(user_ids)
+    leaders = np.empty_like(vectors)
+    members: List[List[int]] = []
+    for start in range(0, len(found), SIMILARITY_BLOCK_SIZE):
+        block = vectors[start:start + SIMILARITY_BLOCK_SIZE]
+        known = len(members)
+        if known:
+            similarity = block @ leaders[:known].T
+            best = np.argmax(similarity, axis=1)
+            best_score = similarity[np.arange(len(block)), best]
+        else:
+            best, best_score = np.zeros(len(block), dtype=np.int64), np.full(len(block), -np.inf)
+        for offset, vector in enumerate(block):
+            leader, score = best[offset], best_score[offset]
+            if len(members) > known:
+                # Leaders created earlier in this block
+                recent = leaders[known:len(members)] @ vector
+                index = int(np.argmax(recent))
+                if recent[index] > score:
+                    leader, score = known + index, recent[index]
+            if score >= threshold:
+                members[leader].append(found[start + offset])
+            else:
+                leaders[len(members)] = vector
+                members.append([found[start + offset]])
+
+    # Users missing from the index can't be compared and generate alone
+    indexed = set(found)
+    members += [[user_id] for user_id in user_ids if user_id not in indexed]
+    # Each group's prompt describes its leader, minus anything identifying
+    leader_attributes = profile_attributes([group[0] for group in members], list(PROFILE_COLUMNS))
+    return [
+        AudienceGroup(key=f"similar:{group[0]}", attributes=_present(leader_attributes.get(group[0], {})), user_ids=group)
+        for group in members
+    ]
+
+def group_audience(user_ids: List[int], group_by: str, fields: Optional[List[str]] = None, threshold: float = 0.9) -> List[AudienceGroup]:
+    if group_by == "exact":
+        fields = fields or DEFAULT_GROUP_FIELDS
+        unknown = [name for name in fields if name not in PROFILE_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown group fields: {', '.join(unknown)}")
+        return group_by_attributes(user_ids, fields)
+    return group_by_similarity(user_ids, threshold)
+
+def llm_calls_per_chain() -> int:
+    # Completions behind one persona -> Sora prompt chain (see GENERATION_PIPELINE)
+    return 1 if generation.GENERATION_PIPELINE == "single-pass" else 2
+
+def grouping_stats(audience_size: int, groups: List[AudienceGroup]) -> Dict[str, Any]:
+    calls = llm_calls_per_chain()
+    return {
+        "audience_size": audience_size,
+        "groups": len(groups),
+        "llm_calls": len(groups) * calls,
+        "llm_calls_saved": (audience_size - len(groups)) * calls,
+        # Users served per chain; 1.0 means nothing was shared
+        "dedup_ratio": round(audience_size / len(groups), 2) if groups else 1.0,
+    }
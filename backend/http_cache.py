@@ -0,0 +1,124 @@
+import os
+import time
+import hashlib
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import func
+from sqlmodel import select
+
+try:
+    from backend.models import UserProfile, Product, Campaign, ProductBase
+    from backend.serialization import dumps, to_dict
+except ImportError:
+    from models import UserProfile, Product, Campaign, ProductBase
+    from serialization import dumps, to_dict
+
+# Conditional GETs for the endpoints the frontend polls. User and campaign
+# ETags are derived from updated_at (created_at for rows never updated), so a
+# revalidation reads one version row instead of loading and serializing the
+# whole object; the product list is served from an in-process TTL cache.
+
+# Seconds a browser may reuse a completed campaign without revalidating. 0
+# (the default) revalidates every use, since a campaign changes when its user
+# or product is edited, not only when it is regenerated
+CAMPAIGN_CACHE_MAX_AGE = int(os.getenv("CAMPAIGN_CACHE_MAX_AGE", "0"))
+# Seconds GET /products is served from memory; 0 disables the cache
+PRODUCT_CACHE_TTL_SECONDS = float(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "30"))
+
+# Anything still changing must be revalidated on every use
+REVALIDATE = "no-cache"
+# Users and campaigns carry profile data, so shared caches must not keep them
+PRIVATE_REVALIDATE = "private, no-cache"
+
+def make_etag(*parts: Any) -> str:
+    return '"' + hashlib.sha256(":".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:20] + '"'
+
+def has_validator(request: Request) -> bool:
+    return "if-none-match" in request.headers
+
+def matches(request: Request, etag: str) -> bool:
+    # Weak comparison, as If-None-Match requires
+    tags = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
+
+def version(row) -> datetime:
+    return row.updated_at or row.created_at
+
+def _version_column(model):
+    return func.coalesce(model.updated_at, model.created_at)
+
+# --- Users ---
+def user_version_statement(user_id: int):
+    return select(_version_column(UserProfile)).where(UserProfile.id == user_id)
+
+def user_headers(user_id: int, updated: datetime) -> Dict[str, str]:
+    return {"ETag": make_etag("user", user_id, updated), "Cache-Control": PRIVATE_REVALIDATE}
+
+# --- Campaigns ---
+def campaign_version_statement(campaign_id: int):
+    # A CampaignRead embeds the user and product, so their versions count too
+    return (
+        select(Campaign.status, _version_column(Campaign), _version_column(UserProfile), _version_column(Product))
+        .join(UserProfile, UserProfile.id == Campaign.user_id)
+        .join(Product, Product.id == Campaign.product_id)
+        .where(Campaign.id == campaign_id)
+    )
+
+def campaign_headers(campaign_id: int, status: str, *updated: datetime) -> Dict[str, str]:
+    cache_control = f"private, max-age={CAMPAIGN_CACHE_MAX_AGE}" if status == "completed" and CAMPAIGN_CACHE_MAX_AGE > 0 else PRIVATE_REVALIDATE
+    return {"ETag": make_etag("campaign", campaign_id, *updated), "Cache-Control": cache_control}
+
+def loaded_campaign_headers(campaign: Campaign) -> Dict[str, str]:
+    return campaign_headers(campaign.id, campaign.status, version(campaign), version(campaign.user), version(campaign.product))
+
+# --- Products ---
+class ProductListCache:
+    # The encoded GET /products body and its ETag. create_product calls
+    # invalidate(); other processes' inserts show up once the TTL runs out.
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entry: Optional[Tuple[float, str, bytes]] = None
+        # Bumped by invalidate() so a list read before an insert isn't stored after it
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            entry = self._entry
+            if entry is not None and time.monotonic() < entry[0]:
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+            return None
+
+    def set(self, generation: int, products: List[Product]) -> Tuple[str, bytes]:
+        body = dumps([to_dict(product, ProductBase) for product in products])
+        etag = make_etag("products", hashlib.sha256(body).hexdigest())
+        with self._lock:
+            if self.ttl > 0 and generation == self.generation:
+                self._entry = (time.monotonic() + self.ttl, etag, body)
+        return etag, body
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._entry = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ttl_seconds": self.ttl, "cached": self._entry is not None, "hits": self.hits, "misses": self.misses}
+
+product_cache = ProductListCache(PRODUCT_CACHE_TTL_SECONDS)
+
+def product_list_response(request: Request, etag: str, body: bytes) -> Response:
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE}
+    if matches(request, etag):
+        return not_modified(headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,146 @@
+import os
+import re
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Optional
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", str(365 * 24 * 60 * 60)))
+
+# Variant name -> longest edge in pixels; smaller sources are never upscaled
+IMAGE_VARIANTS = {"thumb": 160, "card": 480, "full": 1600}
+# URL extension -> (Pillow format, media type)
+IMAGE_FORMATS = {"webp": ("WEBP", "image/webp"), "jpg": ("JPEG", "image/jpeg")}
+DEFAULT_IMAGE_FORMAT = "webp"
+
+SOURCE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp", ".tif", ".tiff"}
+UPLOADS_PATH = "/static/uploads/"
+IMAGES_PATH = "/images/"
+
+_CONTENT_ADDRESS = re.compile(r"^[0-9a-f]{64}$")
+
+def is_image(filename: str) -> bool:
+    return os.path.splitext(filename)[1].lower() in SOURCE_EXTENSIONS
+
+def image_variant_urls(image_url: Optional[str]) -> Optional[Dict[str, str]]:
+    # Only files in our uploads directory have derivatives; remote images
+    # (e.g. the Unsplash URLs in seed.py) are left to their own CDN
+    if not image_url or UPLOADS_PATH not in image_url:
+        return None
+    base, filename = image_url.split(UPLOADS_PATH, 1)
+    if "/" in filename or not is_image(filename):
+        return None
+    return {variant: f"{base}{IMAGES_PATH}{filename}/{variant}.{DEFAULT_IMAGE_FORMAT}" for variant in IMAGE_VARIANTS}
+
+def render_variant(source_path: str, target_path: str, max_edge: int, image_format: str, quality: int) -> str:
+    # Runs in a worker process: decoding and resampling are CPU bound
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as source:
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        if image.mode == "P":
+            image = image.convert("RGBA")
+        if image_format == "JPEG" and image.mode in ("RGBA", "LA"):
+            # JPEG has no alpha channel: flatten onto white
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGB")
+
+        options = {"quality": quality}
+        if image_format == "WEBP":
+            options["method"] = 6
+        else:
+            options.update(optimize=True, progressive=True)
+        temp_path = f"{target_path}.{os.getpid()}.tmp"
+        image.save(temp_path, image_format, **options)
+
+    os.replace(temp_path, target_path)
+    return target_path
+
+class ImagePipeline:
+    """
+    Resizes uploaded product images into WebP/JPEG variants in a process
+    pool and caches them on disk. A derivative's name and ETag are derived
+    from the source version and the rendering parameters, so a cached file
+    never changes and can be served as immutable.
+    """
+
+    def __init__(self, uploads_dir: str, derivatives_dir: str, workers: int = IMAGE_WORKERS):
+        self.uploads_dir = uploads_dir
+        self.derivatives_dir = derivatives_dir
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        os.makedirs(derivatives_dir, exist_ok=True)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs worker threads is unsafe
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def source_path(self, filename: str) -> Optional[str]:
+        if os.path.basename(filename) != filename or not is_image(filename):
+            return None
+        path = os.path.join(self.uploads_dir, filename)
+        return path if os.path.isfile(path) else None
+
+    def _version(self, filename: str, source_path: str) -> str:
+        # Uploads are stored under their sha256, which already identifies the
+        # content; older files fall back to size and mtime
+        stem = os.path.splitext(filename)[0]
+        if _CONTENT_ADDRESS.match(stem):
+            return stem
+        stat = os.stat(source_path)
+        return f"{filename}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def etag(self, filename: str, source_path: str, variant: str, extension: str) -> str:
+        spec = f"{self._version(filename, source_path)}:{variant}:{IMAGE_VARIANTS[variant]}:{extension}:{IMAGE_QUALITY}"
+        return hashlib.sha256(spec.encode("utf-8")).hexdigest()[:32]
+
+    def derive(self, filename: str, source_path: str, variant: str, extension: str) -> Future:
+        # Returns a future for the derivative's path, rendering it at most once
+        etag = self.etag(filename, source_path, variant, extension)
+        target_path = os.path.join(self.derivatives_dir, f"{etag}.{extension}")
+        if os.path.exists(target_path):
+            done = Future()
+            done.set_result(target_path)
+            return done
+
+        with self._lock:
+            pending = self._pending.get(target_path)
+            if pending is not None:
+                return pending
+        image_format, _ = IMAGE_FORMATS[extension]
+        future = self._executor().submit(render_variant, source_path, target_path, IMAGE_VARIANTS[variant], image_format, IMAGE_QUALITY)
+        with self._lock:
+            future = self._pending.setdefault(target_path, future)
+        future.add_done_callback(lambda _: self._discard(target_path))
+        return future
+
+    def _discard(self, target_path: str):
+        with self._lock:
+            self._pending.pop(target_path, None)
+
+    def prewarm(self, filename: str):
+        # Queues every variant of a fresh upload without waiting for them
+        source_path = self.source_path(filename)
+        if source_path is None:
+            return
+        for variant in IMAGE_VARIANTS:
+            for extension in IMAGE_FORMATS:
+                self.derive(filename, source_path, variant, extension)
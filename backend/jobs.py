@@ -0,0 +1,437 @@
+import os
+import time
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+from sqlalchemy import delete, func, update
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+try:
+    from backend.database import IO_MODE, engine, async_engine
+    from backend.models import Campaign, CampaignVariant, GenerationJob
+    from backend.schemas import CampaignGenerationResult
+    from backend.queries import campaign_load_options
+    from backend.metrics import GENERATION_RESULTS, GENERATION_STAGE_SECONDS
+    from backend import generation
+except ImportError:
+    from database import IO_MODE, engine, async_engine
+    from models import Campaign, CampaignVariant, GenerationJob
+    from schemas import CampaignGenerationResult
+    from queries import campaign_load_options
+    from metrics import GENERATION_RESULTS, GENERATION_STAGE_SECONDS
+    import generation
+
+# "inprocess" runs jobs inside the API process (a thread pool in sync mode,
+# asyncio tasks in async mode), "external" only enqueues them for separate
+# `python jobs.py` workers
+JOB_BACKEND = os.getenv("JOB_BACKEND", "inprocess")
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "4"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1.0"))
+# A job still "running" this long after it was claimed is taken to belong to
+# a crashed or restarted process: it is requeued by the next worker or server
+# to start, and no longer blocks regenerating its campaign
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "900"))
+
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+def _claim_statement(job_id: int):
+    # Atomic queued -> running transition so a job only ever runs once,
+    # even with several API processes and workers polling the same table
+    return (
+        update(GenerationJob)
+        .where(GenerationJob.id == job_id, GenerationJob.status == "queued")
+        .values(status="running", stage="persona", started_at=datetime.utcnow())
+    )
+
+def _stale_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+
+def _is_stale(job: GenerationJob) -> bool:
+    return job.status == "running" and job.started_at is not None and job.started_at < _stale_before()
+
+def requeue_stale_jobs() -> int:
+    # Running jobs past their lease go back to queued; the claim statement
+    # still guarantees that only one worker picks each of them up
+    with Session(engine) as session:
+        result = session.execute(
+            update(GenerationJob)
+            .where(GenerationJob.status == "running", GenerationJob.started_at < _stale_before())
+            .values(status="queued", stage="queued", started_at=None)
+        )
+        session.commit()
+    if result.rowcount:
+        print(f"Requeued {result.rowcount} stale generation jobs")
+    return result.rowcount
+
+def _campaign_statement(campaign_id: int):
+    return select(Campaign).where(Campaign.id == campaign_id).options(*campaign_load_options())
+
+def _variants_statement(campaign_id: int):
+    return select(CampaignVariant).where(CampaignVariant.campaign_id == campaign_id).order_by(CampaignVariant.id)
+
+def _placements(campaign: Campaign, variants: List[CampaignVariant]) -> List[Tuple[str, int]]:
+    # The campaign's own placement first, then its variants', without repeats
+    return list(dict.fromkeys([
+        (campaign.platform, campaign.duration_seconds),
+        *[(variant.platform, variant.duration_seconds) for variant in variants]
+    ]))
+
+def _apply_variant_results(variants: List[CampaignVariant], prompts: Dict[Tuple[str, int], Union[str, Exception]], error: Optional[str]):
+    # A variant whose prompt came back is kept even if the campaign's own failed
+    for variant in variants:
+        prompt = prompts.get((variant.platform, variant.duration_seconds))
+        if isinstance(prompt, str):
+            variant.status, variant.sora_prompt, variant.error = "completed", prompt, None
+        else:
+            variant.status, variant.error = "failed", str(prompt) if prompt is not None else error
+
+def _apply_result(job: Optional[GenerationJob], campaign: Optional[Campaign], creative_persona=None, sora_prompt: Optional[str] = None, error: Optional[str] = None):
+    if job:
+        job.finished_at = datetime.utcnow()
+        job.status = "completed" if error is None else "failed"
+        job.stage = "done" if error is None else job.stage
+        job.error = error
+    if not campaign:
+        return
+    if error is None:
+        campaign.creative_persona = creative_persona
+        campaign.sora_prompt = sora_prompt
+        campaign.status = "completed"
+    else:
+        campaign.status = "failed"
+
+def _result(campaign_id: int, creative_persona=None, sora_prompt: Optional[str] = None, error: Optional[str] = None) -> CampaignGenerationResult:
+    return CampaignGenerationResult(
+        campaign_id=campaign_id,
+        status="completed" if error is None else "failed",
+        creative_persona=creative_persona,
+        sora_prompt=sora_prompt,
+        error=error
+    )
+
+def claim_job(job_id: int) -> bool:
+    with Session(engine) as session:
+        result = session.execute(_claim_statement(job_id))
+        session.commit()
+        return result.rowcount == 1
+
+def queued_job_ids(limit: int) -> List[int]:
+    with Session(engine) as session:
+        return list(session.exec(
+            select(GenerationJob.id)
+            .where(GenerationJob.status == "queued")
+            .order_by(GenerationJob.id)
+            .limit(limit)
+        ).all())
+
+def _set_stage(job_id: int, stage: str):
+    with Session(engine) as session:
+        job = session.get(GenerationJob, job_id)
+        job.stage = stage
+        session.add(job)
+        session.commit()
+
+def _count_result(error: Optional[str] = None, campaigns: int = 1):
+    GENERATION_RESULTS.labels("failed" if error else "completed").inc(campaigns)
+
+def _observe_queued(job: GenerationJob):
+    # Time between enqueue and a worker picking the job up
+    GENERATION_STAGE_SECONDS.labels("queued").observe((datetime.utcnow() - job.created_at).total_seconds())
+
+def save_result(campaign_id: int, job_id: Optional[int] = None, variant_prompts: Optional[Dict] = None, **result):
+    # Campaign, job and (for variant jobs) variants are updated in the same transaction
+    _count_result(result.get("error"))
+    with Session(engine) as session:
+        job = session.get(GenerationJob, job_id) if job_id else None
+        campaign = session.get(Campaign, campaign_id)
+        _apply_result(job, campaign, **result)
+        variants = list(session.exec(_variants_statement(campaign_id)).all()) if variant_prompts is not None else []
+        _apply_variant_results(variants, variant_prompts or {}, result.get("error"))
+        for row in (job, campaign, *variants):
+            if row:
+                session.add(row)
+        session.commit()
+
+def run_generation(campaign_id: int, job_id: Optional[int] = None, force: bool = False, variants: bool = False) -> CampaignGenerationResult:
+    # Any failure, loading the campaign included, marks the job and campaign
+    # failed so neither is left running
+    variant_prompts = {} if variants else None
+    try:
+        # Build the prompt inside a short-lived session; no connection is held
+        # while waiting on the LLM
+        with GENERATION_STAGE_SECONDS.labels("load").time(), Session(engine) as session:
+            campaign = session.exec(_campaign_statement(campaign_id)).first()
+            if not campaign:
+                save_result(campaign_id, job_id, error="Campaign not found")
+                return _result(campaign_id, error="Campaign not found")
+            # Variant jobs write one persona for every placement
+            placements = _placements(campaign, list(session.exec(_variants_statement(campaign_id)).all())) if variants else None
+            persona_user_prompt = generation.build_persona_prompt(campaign, placements)
+            duration_seconds = campaign.duration_seconds
+
+        label = f"campaign {campaign_id}"
+        if not variants and generation.GENERATION_PIPELINE != "two-call":
+            # Both steps run as one stage; the job never reports "sora_prompt"
+            with GENERATION_STAGE_SECONDS.labels(generation.GENERATION_PIPELINE).time():
+                creative_persona, sora_prompt = generation.generate_creative(persona_user_prompt, duration_seconds, force=force, label=label)
+        else:
+            with GENERATION_STAGE_SECONDS.labels("persona").time():
+                creative_persona = generation.generate_persona(persona_user_prompt, force=force, label=label)
+            if job_id:
+                _set_stage(job_id, "sora_prompt")
+            with GENERATION_STAGE_SECONDS.labels("sora_prompt").time():
+                if variants:
+                    variant_prompts.update(zip(placements, generation.generate_sora_prompts(creative_persona, placements, force=force, label=label)))
+                    sora_prompt = variant_prompts[placements[0]]
+                    if isinstance(sora_prompt, Exception):
+                        raise sora_prompt
+                else:
+                    sora_prompt = generation.generate_sora_prompt(creative_persona, duration_seconds, force=force, label=label)
+
+        with GENERATION_STAGE_SECONDS.labels("save").time():
+            save_result(campaign_id, job_id, variant_prompts, creative_persona=creative_persona, sora_prompt=sora_prompt)
+    except Exception as e:
+        print(f"Error generation: {e}")
+        save_result(campaign_id, job_id, variant_prompts, error=str(e))
+        return _result(campaign_id, error=str(e))
+    return _result(campaign_id, creative_persona=creative_persona, sora_prompt=sora_prompt)
+
+def run_job(job_id: int) -> CampaignGenerationResult:
+    with Session(engine) as session:
+        job = session.get(GenerationJob, job_id)
+        campaign_id, force, variants = job.campaign_id, job.force, job.variants
+        _observe_queued(job)
+    return run_generation(campaign_id, job_id, force=force, variants=variants)
+
+def _claim_and_run(job_id: int):
+    if claim_job(job_id):
+        run_job(job_id)
+
+# --- Async mode ---
+async def _set_stage_async(job_id: int, stage: str):
+    async with AsyncSession(async_engine) as session:
+        job = await session.get(GenerationJob, job_id)
+        job.stage = stage
+        session.add(job)
+        await session.commit()
+
+async def save_result_async(campaign_id: int, job_id: Optional[int] = None, variant_prompts: Optional[Dict] = None, **result):
+    _count_result(result.get("error"))
+    async with AsyncSession(async_engine) as session:
+        job = await session.get(GenerationJob, job_id) if job_id else None
+        campaign = await session.get(Campaign, campaign_id)
+        _apply_result(job, campaign, **result)
+        variants = list((await session.exec(_variants_statement(campaign_id))).all()) if variant_prompts is not None else []
+        _apply_variant_results(variants, variant_prompts or {}, result.get("error"))
+        for row in (job, campaign, *variants):
+            if row:
+                session.add(row)
+        await session.commit()
+
+async def run_job_async(job_id: int):
+    async with AsyncSession(async_engine) as session:
+        result = await session.execute(_claim_statement(job_id))
+        await session.commit()
+        if result.rowcount != 1:
+            return
+        job = await session.get(GenerationJob, job_id)
+        campaign_id, force, variants = job.campaign_id, job.force, job.variants
+        _observe_queued(job)
+
+    variant_prompts = {} if variants else None
+    try:
+        async with AsyncSession(async_engine) as session:
+            with GENERATION_STAGE_SECONDS.labels("load").time():
+                campaign = (await session.exec(_campaign_statement(campaign_id))).first()
+                if not campaign:
+                    await save_result_async(campaign_id, job_id, error="Campaign not found")
+                    return
+                placements = _placements(campaign, list((await session.exec(_variants_statement(campaign_id))).all())) if variants else None
+                persona_user_prompt = generation.build_persona_prompt(campaign, placements)
+                duration_seconds = campaign.duration_seconds
+
+        label = f"campaign {campaign_id}"
+        if not variants and generation.GENERATION_PIPELINE != "two-call":
+            with GENERATION_STAGE_SECONDS.labels(generation.GENERATION_PIPELINE).time():
+                creative_persona, sora_prompt = await generation.generate_creative_async(persona_user_prompt, duration_seconds, force=force, label=label)
+        else:
+            with GENERATION_STAGE_SECONDS.labels("persona").time():
+                creative_persona = await generation.generate_persona_async(persona_user_prompt, force=force, label=label)
+            await _set_stage_async(job_id, "sora_prompt")
+            with GENERATION_STAGE_SECONDS.labels("sora_prompt").time():
+                if variants:
+                    variant_prompts.update(zip(placements, await generation.generate_sora_prompts_async(creative_persona, placements, force=force, label=label)))
+                    sora_prompt = variant_prompts[placements[0]]
+                    if isinstance(sora_prompt, Exception):
+                        raise sora_prompt
+                else:
+                    sora_prompt = await generation.generate_sora_prompt_async(creative_persona, duration_seconds, force=force, label=label)
+
+        with GENERATION_STAGE_SECONDS.labels("save").time():
+            await save_result_async(campaign_id, job_id, variant_prompts, creative_persona=creative_persona, sora_prompt=sora_prompt)
+    except Exception as e:
+        print(f"Error generation: {e}")
+        await save_result_async(campaign_id, job_id, variant_prompts, error=str(e))
+
+class JobQueue:
+    def __init__(self, max_workers: int = GENERATION_WORKERS):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._futures: Set[Future] = set()
+        self._running = False
+
+    def start(self):
+        if JOB_BACKEND != "inprocess" or self._running:
+            return
+        self._running = True
+        if IO_MODE != "async":
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="generation")
+        # Pick up jobs left queued, or running past their lease, by a previous
+        # run of the server
+        requeue_stale_jobs()
+        for job_id in queued_job_ids(limit=1000):
+            self._dispatch(job_id)
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        for task in self._tasks:
+            task.cancel()
+        self._running = False
+
+    def _dispatch(self, job_id: int):
+        if not self._running:
+            return
+        if self._executor:
+            future = self._executor.submit(_claim_and_run, job_id)
+            self._futures.add(future)
+            future.add_done_callback(self._futures.discard)
+        else:
+            # Tasks are only weakly referenced by the loop, keep them alive here
+            task = asyncio.get_running_loop().create_task(run_job_async(job_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _new_job(self, campaign: Campaign, active: Optional[GenerationJob], force: bool, placements: Optional[List[Tuple[str, int]]]) -> Optional[GenerationJob]:
+        # Re-triggering a campaign that is already generating returns its active
+        # job, unless that job has gone stale: it is failed and replaced
+        if active and not _is_stale(active):
+            return None
+        if active:
+            _apply_result(active, None, error="Job timed out")
+        campaign.status = "processing"
+        return GenerationJob(campaign_id=campaign.id, force=force, variants=placements is not None)
+
+    def _variant_rows(self, campaign: Campaign, placements: List[Tuple[str, int]]) -> List[CampaignVariant]:
+        # One pending row per distinct placement
+        return [
+            CampaignVariant(campaign_id=campaign.id, platform=platform, duration_seconds=duration_seconds)
+            for platform, duration_seconds in dict.fromkeys(placements)
+        ]
+
+    def _active_job_statement(self, campaign_id: int):
+        return select(GenerationJob).where(
+            GenerationJob.campaign_id == campaign_id,
+            GenerationJob.status.in_(ACTIVE_JOB_STATUSES)
+        )
+
+    def enqueue(self, campaign: Campaign, session: Session, force: bool = False, placements: Optional[List[Tuple[str, int]]] = None) -> GenerationJob:
+        # placements: (platform, duration_seconds) to generate as CampaignVariant rows
+        active = session.exec(self._active_job_statement(campaign.id)).first()
+        job = self._new_job(campaign, active, force, placements)
+        if not job:
+            return active
+        if placements is not None:
+            session.execute(delete(CampaignVariant).where(CampaignVariant.campaign_id == campaign.id))
+            session.add_all(self._variant_rows(campaign, placements))
+        session.add(job)
+        session.add(campaign)
+        session.commit()
+        session.refresh(job)
+        self._dispatch(job.id)
+        return job
+
+    async def enqueue_async(self, campaign: Campaign, session: AsyncSession, force: bool = False, placements: Optional[List[Tuple[str, int]]] = None) -> GenerationJob:
+        active = (await session.exec(self._active_job_statement(campaign.id))).first()
+        job = self._new_job(campaign, active, force, placements)
+        if not job:
+            return active
+        if placements is not None:
+            await session.execute(delete(CampaignVariant).where(CampaignVariant.campaign_id == campaign.id))
+            session.add_all(self._variant_rows(campaign, placements))
+        session.add(job)
+        session.add(campaign)
+        await session.commit()
+        await session.refresh(job)
+        self._dispatch(job.id)
+        return job
+
+    def _streamed_job(self, job: GenerationJob) -> GenerationJob:
+        # The SSE endpoint runs the job itself, so it starts out running
+        job.status, job.stage, job.started_at = "running", "persona", datetime.utcnow()
+        return job
+
+    def start_streamed(self, campaign: Campaign, session: Session, force: bool = False) -> Tuple[GenerationJob, bool]:
+        # (job, created); an already active job is returned with created=False
+        active = session.exec(self._active_job_statement(campaign.id)).first()
+        job = self._new_job(campaign, active, force, None)
+        if not job:
+            return active, False
+        session.add(self._streamed_job(job))
+        session.add(campaign)
+        session.commit()
+        session.refresh(job)
+        return job, True
+
+    async def start_streamed_async(self, campaign: Campaign, session: AsyncSession, force: bool = False) -> Tuple[GenerationJob, bool]:
+        active = (await session.exec(self._active_job_statement(campaign.id))).first()
+        job = self._new_job(campaign, active, force, None)
+        if not job:
+            return active, False
+        session.add(self._streamed_job(job))
+        session.add(campaign)
+        await session.commit()
+        await session.refresh(job)
+        return job, True
+
+    def stats(self) -> Dict[str, Any]:
+        # Queued/running come from the table, so they include jobs handled by
+        # external workers; dispatched counts this process's pending jobs
+        with Session(engine) as session:
+            counts = dict(session.exec(
+                select(GenerationJob.status, func.count())
+                .where(GenerationJob.status.in_(ACTIVE_JOB_STATUSES))
+                .group_by(GenerationJob.status)
+            ).all())
+        return {
+            "workers": self.max_workers,
+            "dispatched": len(self._futures) + len(self._tasks),
+            **{status: counts.get(status, 0) for status in ACTIVE_JOB_STATUSES},
+        }
+
+job_queue = JobQueue()
+
+def run_worker():
+    print(f"Generation worker started with {GENERATION_WORKERS} threads")
+    inflight = set()
+    requeued_at = 0.0
+    with ThreadPoolExecutor(max_workers=GENERATION_WORKERS, thread_name_prefix="generation") as executor:
+        while True:
+            # Recover jobs whose worker died mid-run, here or in another process
+            if time.monotonic() - requeued_at > min(JOB_STALE_SECONDS, 60):
+                requeue_stale_jobs()
+                requeued_at = time.monotonic()
+            inflight = {future for future in inflight if not future.done()}
+            free = GENERATION_WORKERS - len(inflight)
+            claimed = [job_id for job_id in queued_job_ids(limit=free) if claim_job(job_id)] if free else []
+            for job_id in claimed:
+                inflight.add(executor.submit(run_job, job_id))
+            if not claimed:
+                time.sleep(WORKER_POLL_INTERVAL)
+
+if __name__ == "__main__":
+    run_worker()
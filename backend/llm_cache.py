@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+try:
+    from backend.database import engine
+    from backend.models import LLMCacheEntry
+except ImportError:
+    from database import engine
+    from models import LLMCacheEntry
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+# In-memory tier size; least recently used entries are evicted first
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+# 0 keeps entries until they are evicted or cleared
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "0"))
+# Database tier size; past it the oldest entries are pruned. 0 lets the
+# table grow without bound (expired entries are still pruned)
+LLM_CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "100000"))
+# Writes between two prunes of the database tier
+PRUNE_INTERVAL = 100
+
+def cache_key(kind: str, model: str, messages: List[Dict[str, str]]) -> str:
+    # The messages are hashed exactly as sent. prompts.py renders them
+    # without template indentation, so any whitespace left is part of the
+    # user and product values and can change the completion
+    normalized = [{"role": message["role"], "content": message["content"]} for message in messages]
+    payload = json.dumps({"kind": kind, "model": model, "messages": normalized}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    def __init__(
+        self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+        enabled: bool = LLM_CACHE_ENABLED, max_rows: int = LLM_CACHE_MAX_ROWS
+    ):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        # key -> (expires_at as epoch seconds or None, value)
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.pruned = 0
+        self._writes = 0
+
+    def _remember(self, key: str, expires_at: Optional[float], value: Any):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+
+        with Session(engine) as session:
+            row = session.get(LLMCacheEntry, key)
+        if row is None or (row.expires_at is not None and row.expires_at <= datetime.utcnow()):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        expires_at = None
+        if row.expires_at is not None:
+            expires_at = now + (row.expires_at - datetime.utcnow()).total_seconds()
+        self._remember(key, expires_at, row.value)
+        with self._lock:
+            self.db_hits += 1
+        return row.value
+
+    def set(self, key: str, kind: str, model: str, value: Any):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else None
+        self._remember(key, expires_at, value)
+        row = LLMCacheEntry(
+            key=key,
+            kind=kind,
+            model=model,
+            value=value,
+            expires_at=datetime.utcnow() + timedelta(seconds=self.ttl_seconds) if self.ttl_seconds else None
+        )
+        try:
+            with Session(engine) as session:
+                session.merge(row)
+                session.commit()
+        except IntegrityError:
+            # Another worker stored the same key first; identical inputs, keep theirs
+            pass
+        with self._lock:
+            self._writes += 1
+            due = self._writes % PRUNE_INTERVAL == 0
+        if due:
+            self.prune()
+
+    def prune(self) -> int:
+        # Drops expired rows, then the oldest rows past max_rows
+        with Session(engine) as session:
+            removed = session.execute(delete(LLMCacheEntry).where(LLMCacheEntry.expires_at <= datetime.utcnow())).rowcount
+            if self.max_rows:
+                excess = session.execute(select(func.count()).select_from(LLMCacheEntry)).scalar_one() - self.max_rows
+                if excess > 0:
+                    oldest = select(LLMCacheEntry.key).order_by(LLMCacheEntry.created_at).limit(excess)
+                    removed += session.execute(delete(LLMCacheEntry).where(LLMCacheEntry.key.in_(oldest))).rowcount
+            session.commit()
+        with self._lock:
+            self.pruned += removed
+        return removed
+
+    def clear(self, expired_only: bool = False) -> int:
+        with self._lock:
+            if expired_only:
+                now = time.time()
+                for key in [key for key, (expires_at, _) in self._entries.items() if expires_at is not None and expires_at <= now]:
+                    del self._entries[key]
+            else:
+                self._entries.clear()
+        statement = delete(LLMCacheEntry)
+        if expired_only:
+            statement = statement.where(LLMCacheEntry.expires_at <= datetime.utcnow())
+        with Session(engine) as session:
+            result = session.execute(statement)
+            session.commit()
+            return result.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "memory_entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "max_rows": self.max_rows,
+                "pruned": self.pruned,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+llm_cache = LLMCache()
@@ -0,0 +1,446 @@
+import os
+import re
+import time
+import random
+import asyncio
+import itertools
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+import openai
+
+try:
+    from backend.prompts import count_message_tokens
+except ImportError:
+    from prompts import count_message_tokens
+
+# Every chat completion goes through LLMGateway, which owns retries (the
+# OpenAI clients are built with max_retries=0), client-side rate limiting,
+# the circuit breaker and per-call timeouts
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+# Full jitter: attempt n sleeps uniform(0, min(max, base * 2^n)), or at least retry-after
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+# Quota per minute; 0 learns it from the x-ratelimit-limit-* response headers
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "0"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))
+# Reserved against the token bucket per call until the response reports usage
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "600"))
+# Consecutive 5xx/timeout/connection failures that open the circuit, and how long it stays open
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# 429s are retried but don't count against the breaker; the provider is up, we are just over quota
+RETRYABLE = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    # Seconds from "2", "1.5s", "20ms" or "6m0s" (the x-ratelimit-reset-* format)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    return sum(float(number) * _UNITS[unit] for number, unit in parts) if parts else None
+
+def _int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+def retry_after(headers) -> Optional[float]:
+    milliseconds = parse_duration(headers.get("retry-after-ms"))
+    return milliseconds / 1000 if milliseconds is not None else parse_duration(headers.get("retry-after"))
+
+class CircuitOpenError(Exception):
+    pass
+
+class TokenBucket:
+    # Refills continuously up to `limit` per minute. reserve() takes capacity
+    # up front, so concurrent callers queue behind each other, and returns how
+    # long the caller has to wait before using it.
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.level = float(limit)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if self.limit:
+            self.level = min(self.limit, self.level + (now - self.updated) * self.limit / 60)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        self._refill(now)
+        wait = max(self.blocked_until - now, 0)
+        if self.limit:
+            # A call larger than the whole quota still gets through, once the bucket is full
+            self.level -= min(amount, self.limit)
+            if self.level < 0:
+                wait = max(wait, -self.level * 60 / self.limit)
+        return wait
+
+    def adjust(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= amount
+
+    def observe(self, limit: Optional[int], remaining: Optional[int], reset: Optional[float], now: float):
+        # The provider's view wins whenever it is stricter than ours
+        self._refill(now)
+        if limit and not self.limit:
+            self.limit = limit
+            self.level = float(limit if remaining is None else remaining)
+        if remaining is not None and self.limit:
+            self.level = min(self.level, remaining)
+        if remaining == 0 and reset:
+            self.pause(reset, now)
+
+    def pause(self, seconds: float, now: float):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: int = LLM_RPM_LIMIT, tokens_per_minute: int = LLM_TPM_LIMIT):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            return max(self.requests.reserve(1, now), self.tokens.reserve(tokens, now))
+
+    def settle(self, reserved: int, used: int):
+        # Corrects the up-front estimate once actual usage is known
+        with self._lock:
+            self.tokens.adjust(used - reserved, time.monotonic())
+
+    def observe(self, headers):
+        with self._lock:
+            now = time.monotonic()
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                bucket.observe(
+                    _int(headers.get(f"x-ratelimit-limit-{kind}")),
+                    _int(headers.get(f"x-ratelimit-remaining-{kind}")),
+                    parse_duration(headers.get(f"x-ratelimit-reset-{kind}")),
+                    now,
+                )
+
+    def pause(self, seconds: float):
+        # After a 429 every caller waits, not just the one that was rejected
+        with self._lock:
+            now = time.monotonic()
+            self.requests.pause(seconds, now)
+            self.tokens.pause(seconds, now)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            stats = {}
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                bucket._refill(now)
+                stats[f"{kind}_per_minute"] = bucket.limit or None
+                stats[f"{kind}_available"] = round(bucket.level) if bucket.limit else None
+            stats["paused_for_seconds"] = round(max(self.requests.blocked_until - now, self.tokens.blocked_until - now, 0), 3)
+            return stats
+
+class CircuitBreaker:
+    # closed: calls flow. open: calls fail fast with CircuitOpenError until
+    # reset_seconds pass. half_open: one probe call decides whether to close
+    # again or reopen.
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started: Optional[float] = None
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open":
+                if now - self.opened_at < self.reset_seconds:
+                    raise CircuitOpenError(f"LLM provider unavailable; circuit open for another {self.reset_seconds - (now - self.opened_at):.1f}s")
+                self.state = "half_open"
+            if self.state == "half_open":
+                # A probe that never reported back doesn't keep the circuit stuck
+                if self.probe_started is not None and now - self.probe_started < self.reset_seconds:
+                    raise CircuitOpenError("LLM provider unavailable; waiting on a probe request")
+                self.probe_started = now
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self.probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.probe_started = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "open": self.state != "closed", "consecutive_failures": self.failures, "times_opened": self.times_opened}
+
+class ConcurrencyLimit:
+    # One cap on in-flight calls shared by worker threads and the event loop
+    # (SSE streams use the async client even in sync IO mode). Threads wait on
+    # a condition; coroutines wait on a future that release() hands the slot
+    # to, so the event loop is never blocked.
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._waiters: deque = deque() # (loop, future) of waiting coroutines
+
+    def _take(self):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+
+    def acquire(self):
+        with self._lock:
+            while self.in_flight >= self.limit:
+                self._available.wait()
+            self._take()
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self._take()
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+                    raise
+            # The slot was already handed over; pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def _grant(self, future: asyncio.Future):
+        # Runs on the waiter's loop; a waiter cancelled meanwhile passes the slot on
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # The slot moves straight to a waiting coroutine, in_flight unchanged
+                loop, future = self._waiters.popleft()
+                loop.call_soon_threadsafe(self._grant, future)
+                return
+            self.in_flight -= 1
+            self._available.notify()
+
+class LLMGateway:
+    def __init__(
+        self, client, async_client, max_concurrency: int,
+        timeout: float = LLM_TIMEOUT_SECONDS, max_retries: int = LLM_MAX_RETRIES,
+        limiter: Optional[RateLimiter] = None, breaker: Optional[CircuitBreaker] = None
+    ):
+        self.client = client
+        self.async_client = async_client
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.limiter = limiter or RateLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        # Caps how many chat completions are in flight at once across all
+        # workers, sync and async alike
+        self.slots = ConcurrencyLimit(max_concurrency)
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _estimate(self, messages: List[Dict[str, Any]], kwargs: Dict[str, Any]) -> int:
+        # Prompt tokens plus the expected completion
+        return count_message_tokens(messages) + (kwargs.get("max_tokens") or LLM_EXPECTED_COMPLETION_TOKENS)
+
+    def _admit(self, reserved: int) -> float:
+        # Returns how long to wait before sending
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self._count("rejected")
+            raise
+        self._count("calls")
+        return self.limiter.reserve(reserved)
+
+    def _succeeded(self, headers, reserved: int, usage=None):
+        self.breaker.record_success()
+        self.limiter.observe(headers)
+        if usage is not None:
+            self.limiter.settle(reserved, usage.total_tokens)
+
+    def _failed(self, error: Exception, reserved: int, attempt: int) -> Optional[float]:
+        # Returns the backoff before the next attempt, or None to give up
+        self.limiter.settle(reserved, 0)
+        wait = None
+        if isinstance(error, openai.APIStatusError):
+            self.limiter.observe(error.response.headers)
+            wait = retry_after(error.response.headers)
+        if isinstance(error, openai.RateLimitError):
+            self._count("rate_limited")
+            self.breaker.record_success()
+            if wait:
+                self.limiter.pause(wait)
+        elif isinstance(error, RETRYABLE):
+            self.breaker.record_failure()
+        else:
+            # Our request was wrong (4xx), the provider itself is fine
+            self.breaker.record_success()
+
+        if not isinstance(error, RETRYABLE) or attempt >= self.max_retries:
+            self._count("failures")
+            return None
+        self._count("retries")
+        backoff = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+        return max(backoff, wait or 0)
+
+    def complete(self, model: str, messages: List[Dict[str, Any]], **kwargs):
+        reserved = self._estimate(messages, kwargs)
+        for attempt in itertools.count():
+            time.sleep(self._admit(reserved))
+            try:
+                self.slots.acquire()
+                try:
+                    raw = self.client.chat.completions.with_raw_response.create(
+                        model=model, messages=messages, timeout=self.timeout, **kwargs
+                    )
+                finally:
+                    self.slots.release()
+                completion = raw.parse()
+            except openai.APIError as e:
+                backoff = self._failed(e, reserved, attempt)
+                if backoff is None:
+                    raise
+                time.sleep(backoff)
+                continue
+            self._succeeded(raw.headers, reserved, completion.usage)
+            return completion
+
+    async def complete_async(self, model: str, messages: List[Dict[str, Any]], **kwargs):
+        reserved = self._estimate(messages, kwargs)
+        for attempt in itertools.count():
+            await asyncio.sleep(self._admit(reserved))
+            try:
+                await self.slots.acquire_async()
+                try:
+                    raw = await self.async_client.chat.completions.with_raw_response.create(
+                        model=model, messages=messages, timeout=self.timeout, **kwargs
+                    )
+                finally:
+                    self.slots.release()
+                completion = raw.parse()
+            except openai.APIError as e:
+                backoff = self._failed(e, reserved, attempt)
+                if backoff is None:
+                    raise
+                await asyncio.sleep(backoff)
+                continue
+            self._succeeded(raw.headers, reserved, completion.usage)
+            return completion
+
+    # Streams are retried until they open; once deltas have been yielded a
+    # failure is raised to the caller, which has already forwarded them.
+    # The concurrency slot is held until the stream is exhausted or closed.
+    def stream(self, model: str, messages: List[Dict[str, Any]], **kwargs) -> Iterator[str]:
+        reserved = self._estimate(messages, kwargs)
+        for attempt in itertools.count():
+            time.sleep(self._admit(reserved))
+            self.slots.acquire()
+            try:
+                raw = self.client.chat.completions.with_raw_response.create(
+                    model=model, messages=messages, stream=True, timeout=self.timeout, **kwargs
+                )
+            except openai.APIError as e:
+                self.slots.release()
+                backoff = self._failed(e, reserved, attempt)
+                if backoff is None:
+                    raise
+                time.sleep(backoff)
+                continue
+            stream = raw.parse()
+            try:
+                self._succeeded(raw.headers, reserved)
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            except (openai.APIConnectionError, openai.InternalServerError):
+                self.breaker.record_failure()
+                raise
+            finally:
+                # A caller that stops early (close()) drops the connection too
+                stream.close()
+                self.slots.release()
+            return
+
+    async def stream_async(self, model: str, messages: List[Dict[str, Any]], **kwargs) -> AsyncIterator[str]:
+        reserved = self._estimate(messages, kwargs)
+        for attempt in itertools.count():
+            await asyncio.sleep(self._admit(reserved))
+            await self.slots.acquire_async()
+            try:
+                raw = await self.async_client.chat.completions.with_raw_response.create(
+                    model=model, messages=messages, stream=True, timeout=self.timeout, **kwargs
+                )
+            except openai.APIError as e:
+                self.slots.release()
+                backoff = self._failed(e, reserved, attempt)
+                if backoff is None:
+                    raise
+                await asyncio.sleep(backoff)
+                continue
+            stream = raw.parse()
+            try:
+                self._succeeded(raw.headers, reserved)
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            except (openai.APIConnectionError, openai.InternalServerError):
+                self.breaker.record_failure()
+                raise
+            finally:
+                await stream.close()
+                self.slots.release()
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {
+                "calls": self.calls, "retries": self.retries, "rate_limited": self.rate_limited,
+                "failures": self.failures, "rejected": self.rejected,
+            }
+        concurrency = {"in_flight": self.slots.in_flight, "max_concurrency": self.slots.limit}
+        return {**counters, **concurrency, "circuit": self.breaker.stats(), "rate_limit": self.limiter.stats()}
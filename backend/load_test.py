@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import argparse
+import threading
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import requests
+
+# End-to-end load test: each session creates a user, a product and a campaign,
+# then generates the ad and polls the job until it finishes.
+#   python load_test.py --spawn --sessions 50 --concurrency 10
+# --spawn starts mock_llm.py and the API on free ports against a throwaway
+# SQLite database, so it runs without network access (e.g. in CI). Without it
+# the harness targets --base-url. Mock latency and error injection are
+# configured with the MOCK_LLM_* variables, which the spawned mock inherits.
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+GENERATE_END_TO_END = "generate (end-to-end)"
+
+USER_PAYLOAD = {
+    "demographics": {"age_range": "25-34", "gender_identity": "Female", "country": "USA", "location_type": "Urban"},
+    "psychographics": {"values": ["sustainability", "innovation"], "personality_traits": {"openness": 9, "extraversion": 7}},
+    "lifestyle": {"occupation": "Architect", "hobbies": ["photography", "hiking"], "daily_environments": ["studio", "nature"]},
+    "media_preferences": {"preferred_platforms": ["Instagram", "Pinterest"], "visual_visual_style": "Cinematic"}
+}
+
+PRODUCT_PAYLOAD = {
+    "name": "EcoSmart Water Bottle",
+    "description": "A self-cleaning smart water bottle that tracks hydration.",
+    "features": ["UV-C cleaning", "App connectivity", "Insulated stainless steel"]
+}
+
+CAMPAIGN_PAYLOAD = {
+    "objective": "conversion",
+    "platform": "instagram_reels",
+    "duration_seconds": 15,
+    "product_intent": {"funnel_stage": "consideration"}
+}
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, ok: bool):
+        with self.lock:
+            self.latencies[name].append(seconds * 1000)
+            if not ok:
+                self.errors[name] += 1
+
+def percentile(values: List[float], q: float) -> float:
+    # Nearest-rank percentile on an already sorted list
+    if not values:
+        return 0.0
+    rank = max(int(round(q / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+_local = threading.local()
+
+def _session() -> requests.Session:
+    # One keep-alive connection pool per worker thread
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+def call(recorder: Recorder, name: str, method: str, url: str, expected=(200,), **kwargs) -> Optional[dict]:
+    start = time.perf_counter()
+    try:
+        response = _session().request(method, url, timeout=120, **kwargs)
+        ok = response.status_code in expected
+    except requests.RequestException:
+        response, ok = None, False
+    recorder.record(name, time.perf_counter() - start, ok)
+    return response.json() if ok else None
+
+def run_session(base_url: str, recorder: Recorder, number: int, poll_interval: float):
+    user = call(recorder, "POST /users", "POST", f"{base_url}/users", json={"name": f"Load User {number}", **USER_PAYLOAD})
+    product = call(recorder, "POST /products", "POST", f"{base_url}/products", json=PRODUCT_PAYLOAD)
+    if not user or not product:
+        return
+    campaign = call(recorder, "POST /campaigns", "POST", f"{base_url}/campaigns",
+                    json={"user_id": user["id"], "product_id": product["id"], **CAMPAIGN_PAYLOAD})
+    if not campaign:
+        return
+
+    start = time.perf_counter()
+    job = call(recorder, "POST /campaigns/{id}/generate", "POST", f"{base_url}/campaigns/{campaign['id']}/generate", expected=(202,))
+    while job and job["status"] in ("queued", "running"):
+        time.sleep(poll_interval)
+        job = call(recorder, "GET /jobs/{id}", "GET", f"{base_url}/jobs/{job['id']}")
+    recorder.record(GENERATE_END_TO_END, time.perf_counter() - start, bool(job) and job["status"] == "completed")
+
+def report(recorder: Recorder, elapsed: float) -> Dict[str, dict]:
+    results = {}
+    for name, values in recorder.latencies.items():
+        values = sorted(values)
+        results[name] = {
+            "count": len(values),
+            "errors": recorder.errors[name],
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(values[-1], 2),
+            "throughput_rps": round(len(values) / elapsed, 2),
+        }
+    print(f"{'endpoint':<32}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'req/s':>9}")
+    for name, row in results.items():
+        print(f"{name:<32}{row['count']:>7}{row['errors']:>8}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+              f"{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}{row['throughput_rps']:>9.1f}")
+    return results
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def spawn_stack() -> Tuple[str, List[subprocess.Popen]]:
+    # Mock LLM + API server on free ports, backed by a fresh SQLite file
+    mock_port, api_port = _free_port(), _free_port()
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+        "OPENAI_API_KEY": "mock",
+        "DATABASE_URL": os.getenv("LOAD_TEST_DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load_test.db')}",
+    }
+    mock = subprocess.Popen([sys.executable, "mock_llm.py", "--port", str(mock_port)], cwd=BACKEND_DIR, env=env)
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(api_port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    processes = [mock, api]
+    try:
+        _wait_until_up(f"http://127.0.0.1:{mock_port}/v1/models", mock)
+        _wait_until_up(f"http://127.0.0.1:{api_port}/health", api)
+    except RuntimeError:
+        stop(processes)
+        raise
+    return f"http://127.0.0.1:{api_port}", processes
+
+def stop(processes: List[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def check(results: Dict[str, dict], max_error_rate: float, max_p95: List[str]) -> List[str]:
+    failures = []
+    for name, row in results.items():
+        if row["errors"] / row["count"] > max_error_rate:
+            failures.append(f"{name}: error rate {row['errors']}/{row['count']} above {max_error_rate:.0%}")
+    for limit in max_p95:
+        name, _, ms = limit.rpartition("=")
+        row = results.get(name)
+        if row and row["p95_ms"] > float(ms):
+            failures.append(f"{name}: p95 {row['p95_ms']}ms above {ms}ms")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test for the campaign generation flow")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="start mock_llm.py and the API locally")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--max-error-rate", type=float, default=0.0)
+    parser.add_argument("--max-p95", action="append", default=[], metavar="ENDPOINT=MS",
+                        help=f'fail when an endpoint\'s p95 exceeds MS, e.g. "{GENERATE_END_TO_END}=2000"')
+    args = parser.parse_args()
+
+    base_url, processes = spawn_stack() if args.spawn else (args.base_url, [])
+    try:
+        recorder = Recorder()
+        print(f"{args.sessions} sessions at concurrency {args.concurrency} against {base_url}")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for future in [pool.submit(run_session, base_url, recorder, i, args.poll_interval) for i in range(args.sessions)]:
+                future.result()
+        elapsed = time.perf_counter() - start
+    finally:
+        stop(processes)
+
+    results = report(recorder, elapsed)
+    print(f"{args.sessions / elapsed:.2f} sessions/s over {elapsed:.2f}s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"sessions": args.sessions, "concurrency": args.concurrency, "elapsed_s": round(elapsed, 3), "endpoints": results}, f, indent=2)
+
+    failures = check(results, args.max_error_rate, args.max_p95)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,67 +1,117 @@
 import os
 import json
+import asyncio
+import threading
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Depends, File, UploadFile
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse, FileResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
 from sqlmodel import SQLModel, Session, select
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
-from openai import OpenAI
 
 try:
-    from backend.database import create_db_and_tables, get_session
+    from backend.database import IO_MODE, DB_POOL_SIZE, DB_MAX_OVERFLOW, engine, async_engine, get_session, pool_stats
+    from backend.migrate import migrate
     from backend.models import (
         UserProfile, UserDemographics, UserPsychographics, UserLifestyle, UserMediaPreferences,
-        Product, Campaign,
+        Product, Campaign, GenerationJob, ExportJob,
         UserProfileBase, UserDemographicsBase, UserPsychographicsBase, UserLifestyleBase, UserMediaPreferencesBase,
-        ProductBase, CampaignBase
+        ProductBase, CampaignBase, GenerationJobBase, CampaignVariant
     )
+    from backend.schemas import (
+        UserProfileCreate, UserProfileRead, UserProfileUpdate, CampaignRead, GenerationJobRead, CampaignBatchCreate,
+        UserProfileFilter, CampaignFilter, LookalikeRead, SegmentationRead, UserImportResult,
+        CampaignVariantsCreate, CampaignVariantRead, ExportCreate, ExportJobRead
+    )
+    from backend.queries import (
+        DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER,
+        user_load_options, campaign_load_options, user_list_statement, campaign_list_statement,
+        keyset_page, split_page, parse_fields, page_response, iter_pages
+    )
+    from backend.generation import client, gateway, build_persona_prompt
+    from backend.jobs import job_queue
+    from backend.export import export_queue
+    from backend.serialization import stream_response
+    from backend.http_cache import (
+        has_validator, matches, not_modified, version, user_version_statement, user_headers,
+        campaign_version_statement, campaign_headers, loaded_campaign_headers, product_cache, product_list_response
+    )
+    from backend.llm_cache import llm_cache
+    from backend.uploads import UPLOAD_MAX_BYTES, UPLOAD_FORM_OVERHEAD, UploadTooLargeError, store_upload, sweep_staging
+    from backend.images import IMAGE_VARIANTS, IMAGE_FORMATS, IMAGE_CACHE_MAX_AGE, ImagePipeline, is_image, image_variant_urls
+    from backend.streaming import stream_campaign_generation
+    from backend.segments import SEGMENT_INDEX_PRELOAD, segment_index
+    from backend.user_import import ImportFormatError, import_format, body_chunks, import_users
+    from backend.user_writes import patch_user, section_fields
+    from backend.batch import UnknownUsersError, resolve_user_ids, insert_campaigns, stream_batch, stream_grouped_batch
+    from backend.grouping import GROUPING_HEADERS, group_audience, grouping_stats
+    from backend.metrics import METRICS_ENABLED, MetricsMiddleware, instrument_engine, register_stats, render_metrics
+    from backend.async_api import router as async_router
 except ImportError:
-    from database import create_db_and_tables, get_session
+    from database import IO_MODE, DB_POOL_SIZE, DB_MAX_OVERFLOW, engine, async_engine, get_session, pool_stats
+    from migrate import migrate
     from models import (
         UserProfile, UserDemographics, UserPsychographics, UserLifestyle, UserMediaPreferences,
-        Product, Campaign,
+        Product, Campaign, GenerationJob, ExportJob,
         UserProfileBase, UserDemographicsBase, UserPsychographicsBase, UserLifestyleBase, UserMediaPreferencesBase,
-        ProductBase, CampaignBase
+        ProductBase, CampaignBase, GenerationJobBase, CampaignVariant
     )
-
-# --- Response Models ---
-class UserProfileCreate(UserProfileBase):
-    demographics: Optional[UserDemographicsBase] = None
-    psychographics: Optional[UserPsychographicsBase] = None
-    lifestyle: Optional[UserLifestyleBase] = None
-    media_preferences: Optional[UserMediaPreferencesBase] = None
-
-class UserProfileRead(UserProfileBase):
-    id: int
-    demographics: Optional[UserDemographicsBase] = None
-    psychographics: Optional[UserPsychographicsBase] = None
-    lifestyle: Optional[UserLifestyleBase] = None
-    media_preferences: Optional[UserMediaPreferencesBase] = None
-
-class CampaignRead(CampaignBase):
-    id: int
-    user: UserProfileRead
-    product: ProductBase
+    from schemas import (
+        UserProfileCreate, UserProfileRead, UserProfileUpdate, CampaignRead, GenerationJobRead, CampaignBatchCreate,
+        UserProfileFilter, CampaignFilter, LookalikeRead, SegmentationRead, UserImportResult,
+        CampaignVariantsCreate, CampaignVariantRead, ExportCreate, ExportJobRead
+    )
+    from queries import (
+        DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER,
+        user_load_options, campaign_load_options, user_list_statement, campaign_list_statement,
+        keyset_page, split_page, parse_fields, page_response, iter_pages
+    )
+    from generation import client, gateway, build_persona_prompt
+    from jobs import job_queue
+    from export import export_queue
+    from serialization import stream_response
+    from http_cache import (
+        has_validator, matches, not_modified, version, user_version_statement, user_headers,
+        campaign_version_statement, campaign_headers, loaded_campaign_headers, product_cache, product_list_response
+    )
+    from llm_cache import llm_cache
+    from uploads import UPLOAD_MAX_BYTES, UPLOAD_FORM_OVERHEAD, UploadTooLargeError, store_upload, sweep_staging
+    from images import IMAGE_VARIANTS, IMAGE_FORMATS, IMAGE_CACHE_MAX_AGE, ImagePipeline, is_image, image_variant_urls
+    from streaming import stream_campaign_generation
+    from segments import SEGMENT_INDEX_PRELOAD, segment_index
+    from user_import import ImportFormatError, import_format, body_chunks, import_users
+    from user_writes import patch_user, section_fields
+    from batch import UnknownUsersError, resolve_user_ids, insert_campaigns, stream_batch, stream_grouped_batch
+    from grouping import GROUPING_HEADERS, group_audience, grouping_stats
+    from metrics import METRICS_ENABLED, MetricsMiddleware, instrument_engine, register_stats, render_metrics
+    from async_api import router as async_router
 
 # Load environment variables
 load_dotenv()
 
-# Configure OpenAI
-api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=api_key) if api_key else None
-
 # Configuration
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Ensure tables are created
-    create_db_and_tables()
+    # Ensure tables are created and existing ones carry the current columns and indexes
+    migrate()
+    # Older versions staged uploads inside the served directory
+    sweep_staging(UPLOAD_STAGING_DIR, UPLOADS_DIR)
+    job_queue.start()
+    export_queue.start()
+    if SEGMENT_INDEX_PRELOAD:
+        threading.Thread(target=segment_index.ensure_loaded, daemon=True).start()
     yield
+    job_queue.shutdown()
+    export_queue.shutdown()
+    image_pipeline.shutdown()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -73,30 +123,106 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "X-Job-Id", *GROUPING_HEADERS.values()],
 )
 
+# Per-route latency and DB query histograms, served on /metrics
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+    if async_engine:
+        instrument_engine(async_engine.sync_engine)
+
+# In async mode the generation path and read endpoints are served by the
+# asyncio router; it is registered first so it takes precedence over the
+# sync handlers below
+if IO_MODE == "async":
+    app.include_router(async_router)
+
 # Mount static files
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 STATIC_DIR = os.path.join(BASE_DIR, "static")
 
 # Ensure uploads directory exists
-os.makedirs(os.path.join(STATIC_DIR, "uploads"), exist_ok=True)
+UPLOADS_DIR = os.path.join(STATIC_DIR, "uploads")
+os.makedirs(UPLOADS_DIR, exist_ok=True)
+# Partial uploads are written here, outside the /static mount, and moved into
+# UPLOADS_DIR once complete
+UPLOAD_STAGING_DIR = os.path.join(BASE_DIR, "upload_staging")
+os.makedirs(UPLOAD_STAGING_DIR, exist_ok=True)
+
+# Resized variants of uploaded images, rendered on upload or first request
+DERIVATIVES_DIR = os.path.join(STATIC_DIR, "derivatives")
+image_pipeline = ImagePipeline(UPLOADS_DIR, DERIVATIVES_DIR)
 
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
 # --- API Endpoints ---
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(request: Request):
+    # Multipart form: a `file` field. The body is parsed (and spooled) by hand
+    # so its declared size is checked first; the file's own bytes are checked
+    # against UPLOAD_MAX_BYTES again while it is stored
+    length = request.headers.get("content-length")
+    if length is None:
+        raise HTTPException(status_code=411, detail="Content-Length is required")
+    if not length.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid Content-Length")
+    if int(length) > UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {UPLOAD_MAX_BYTES} byte limit")
+    form = await request.form(max_files=1)
+    try:
+        file = form.get("file")
+        if not isinstance(file, UploadFile):
+            raise HTTPException(status_code=422, detail="Missing file field")
+        try:
+            # Hashing and disk writes run in a worker thread, off the event loop
+            stored = await run_in_threadpool(store_upload, file.file, file.filename, UPLOADS_DIR, UPLOAD_STAGING_DIR)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await form.close()
+
+    # Variants render in the background so the first page view finds them cached
+    if is_image(stored.filename):
+        image_pipeline.prewarm(stored.filename)
+
+    # Return the URL; identical content always maps to the same one
+    url = f"{API_URL}/static/uploads/{stored.filename}"
+    return {
+        "url": url,
+        "variants": image_variant_urls(url),
+        "sha256": stored.sha256,
+        "size": stored.size,
+        "existing": stored.existing
+    }
+
+@app.get("/images/{filename}/{variant}.{extension}")
+async def read_image_variant(filename: str, variant: str, extension: str, request: Request):
+    source_path = image_pipeline.source_path(filename)
+    if source_path is None or variant not in IMAGE_VARIANTS or extension not in IMAGE_FORMATS:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    # The ETag is known without rendering, so revalidations never touch the pool
+    etag = f'"{image_pipeline.etag(filename, source_path, variant, extension)}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={IMAGE_CACHE_MAX_AGE}, immutable"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
     try:
-        file_location = os.path.join(STATIC_DIR, "uploads", file.filename)
-        with open(file_location, "wb+") as file_object:
-            file_object.write(file.file.read())
-        
-        # Return the URL
-        return {"url": f"{API_URL}/static/uploads/{file.filename}"}
+        path = await asyncio.wrap_future(image_pipeline.derive(filename, source_path, variant, extension))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"Could not render image: {e}")
+    return FileResponse(path, media_type=IMAGE_FORMATS[extension][1], headers=headers)
+
+def load_user(session: Session, user_id: int) -> Optional[UserProfile]:
+    # Profile tables are joined in so the whole profile loads in one query;
+    # populate_existing refreshes objects already in the session after a commit
+    statement = select(UserProfile).where(UserProfile.id == user_id).options(*user_load_options())
+    return session.exec(statement.execution_options(populate_existing=True)).first()
 
 @app.post("/users", response_model=UserProfileRead)
 def create_user(user_data: UserProfileCreate, session: Session = Depends(get_session)):
@@ -124,98 +250,91 @@ def create_user(user_data: UserProfileCreate, session: Session = Depends(get_ses
         session.add(media)
 
     session.commit()
-    session.refresh(user)
+    user = load_user(session, user.id)
+    segment_index.upsert(user)
     return user
 
-class UserProfileUpdate(SQLModel):
-    name: Optional[str] = None
-    demographics: Optional[UserDemographicsBase] = None
-    psychographics: Optional[UserPsychographicsBase] = None
-    lifestyle: Optional[UserLifestyleBase] = None
-    media_preferences: Optional[UserMediaPreferencesBase] = None
-
-# ... (Response models remain)
-
-from sqlalchemy.orm import selectinload
+@app.post("/users/import", response_model=UserImportResult)
+async def import_user_profiles(request: Request, format: Optional[str] = None):
+    # NDJSON or CSV (text/csv, or ?format=csv) of UserProfileCreate records,
+    # inserted in batches as the body arrives; invalid rows are reported, not fatal
+    try:
+        import_type = import_format(format, request.headers.get("content-type"))
+        return await run_in_threadpool(import_users, body_chunks(request), import_type)
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/users/{user_id}", response_model=UserProfileRead)
-def read_user(user_id: int, session: Session = Depends(get_session)):
-    # Using selectinload to ensure relationships are loaded
-    statement = select(UserProfile).where(UserProfile.id == user_id).options(
-        selectinload(UserProfile.demographics),
-        selectinload(UserProfile.psychographics),
-        selectinload(UserProfile.lifestyle),
-        selectinload(UserProfile.media_preferences)
-    )
-    user = session.exec(statement).first()
+def read_user(user_id: int, request: Request, response: Response, session: Session = Depends(get_session)):
+    # Revalidations read only the row's version, not the whole profile
+    if has_validator(request):
+        updated = session.exec(user_version_statement(user_id)).first()
+        if updated is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        headers = user_headers(user_id, updated)
+        if matches(request, headers["ETag"]):
+            return not_modified(headers)
+    user = load_user(session, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    response.headers.update(user_headers(user_id, version(user)))
     return user
 
 @app.patch("/users/{user_id}", response_model=UserProfileRead)
 def update_user(user_id: int, user_data: UserProfileUpdate, session: Session = Depends(get_session)):
-    # Eager load here too to ensure we have the objects to update
-    statement = select(UserProfile).where(UserProfile.id == user_id).options(
-        selectinload(UserProfile.demographics),
-        selectinload(UserProfile.psychographics),
-        selectinload(UserProfile.lifestyle),
-        selectinload(UserProfile.media_preferences)
-    )
-    user = session.exec(statement).first()
-    
-    if not user:
+    # Only the statements this patch needs, with the response built from
+    # their RETURNING rows rather than a reload
+    user = patch_user(session, user_id, user_data)
+    if user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    if user_data.name is not None:
-        user.name = user_data.name
-    
-    session.add(user)
-    
-    # Helper to update or create 1:1 relation
-    def update_relation(current_rel, new_data, ModelClass):
-        if new_data is None:
-            return
-        if current_rel:
-            # Update existing
-            for key, value in new_data.model_dump(exclude_unset=True).items():
-                setattr(current_rel, key, value)
-            session.add(current_rel)
-        else:
-            # Create new
-            new_rel = ModelClass(**new_data.model_dump(), user_id=user.id)
-            session.add(new_rel)
-
-    update_relation(user.demographics, user_data.demographics, UserDemographics)
-    update_relation(user.psychographics, user_data.psychographics, UserPsychographics)
-    update_relation(user.lifestyle, user_data.lifestyle, UserLifestyle)
-    update_relation(user.media_preferences, user_data.media_preferences, UserMediaPreferences)
-
     session.commit()
-    session.refresh(user)
+    segment_index.upsert_many([(user_id, section_fields(user))])
     return user
 
 @app.get("/users", response_model=List[UserProfileRead])
-def read_users(session: Session = Depends(get_session)):
-    statement = select(UserProfile).options(
-        selectinload(UserProfile.demographics),
-        selectinload(UserProfile.psychographics),
-        selectinload(UserProfile.lifestyle),
-        selectinload(UserProfile.media_preferences)
-    )
-    users = session.exec(statement).all()
-    return users
+def read_users(
+    request: Request,
+    response: Response,
+    filters: UserProfileFilter = Depends(),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    stream: bool = False,
+    session: Session = Depends(get_session)
+):
+    # Newest first; pass the X-Next-Cursor response header back as `cursor` for the next page
+    projection = parse_fields(fields, UserProfileRead)
+    statement = user_list_statement(filters).options(*user_load_options(projection))
+    if stream:
+        # Every matching row from `cursor` on, as a chunked JSON array or NDJSON (Accept: application/x-ndjson)
+        return stream_response(iter_pages(statement, UserProfile, cursor, projection, UserProfileRead), request)
+    users, next_cursor = split_page(session.exec(keyset_page(statement, UserProfile, cursor, limit)).all(), limit)
+    return page_response(users, next_cursor, projection, UserProfileRead, response)
+
+@app.get("/users/{user_id}/lookalikes", response_model=List[LookalikeRead])
+def read_lookalikes(user_id: int, k: int = Query(10, ge=1, le=1000)):
+    # Most similar profiles first, by cosine similarity of their feature vectors
+    try:
+        matches = segment_index.lookalikes(user_id, k)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="User not found")
+    return [LookalikeRead(user_id=match, score=score) for match, score in matches]
 
 @app.post("/products", response_model=Product)
 def create_product(product: Product, session: Session = Depends(get_session)):
     session.add(product)
     session.commit()
+    product_cache.invalidate()
     session.refresh(product)
     return product
 
 @app.get("/products", response_model=List[ProductBase])
-def read_products(session: Session = Depends(get_session)):
-    products = session.exec(select(Product)).all()
-    return products
+def read_products(request: Request, session: Session = Depends(get_session)):
+    cached = product_cache.get()
+    if cached is None:
+        generation = product_cache.generation
+        cached = product_cache.set(generation, session.exec(select(Product)).all())
+    return product_list_response(request, *cached)
 
 @app.post("/campaigns", response_model=CampaignRead)
 def create_campaign(campaign: Campaign, session: Session = Depends(get_session)):
@@ -231,123 +350,245 @@ def create_campaign(campaign: Campaign, session: Session = Depends(get_session))
     campaign = session.exec(
         select(Campaign)
         .where(Campaign.id == campaign.id)
-        .options(selectinload(Campaign.user), selectinload(Campaign.product))
+        .options(*campaign_load_options())
     ).first()
     return campaign
 
+@app.post("/campaigns/batch")
+def create_campaign_batch(batch: CampaignBatchCreate, force: bool = False, session: Session = Depends(get_session)):
+    if not session.get(Product, batch.product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    if batch.user_ids is None and batch.filter is None:
+        raise HTTPException(status_code=400, detail="Provide user_ids or filter")
+    if batch.generate and not client:
+        raise HTTPException(status_code=500, detail="OpenAI API Key is not configured")
+
+    try:
+        user_ids = resolve_user_ids(batch, session)
+    except UnknownUsersError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if not batch.group_by:
+        campaigns = insert_campaigns(batch, user_ids, session)
+        # One NDJSON line per campaign as its generation completes
+        return StreamingResponse(stream_batch(campaigns, batch.generate, force=force), media_type="application/x-ndjson")
+
+    # Segment-level generation: one chain per group, shared by its members
+    try:
+        groups = group_audience(user_ids, batch.group_by, batch.group_fields, batch.similarity_threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    segment_keys = {user_id: group.key for group in groups for user_id in group.user_ids}
+    campaigns = insert_campaigns(batch, user_ids, session, segment_keys)
+    stats = grouping_stats(len(user_ids), groups)
+    headers = {GROUPING_HEADERS[name]: str(value) for name, value in stats.items()}
+    return StreamingResponse(stream_grouped_batch(campaigns, groups, batch.generate, force=force), media_type="application/x-ndjson", headers=headers)
+
 @app.get("/campaigns", response_model=List[CampaignRead])
-def read_campaigns(session: Session = Depends(get_session)):
-    return session.exec(select(Campaign).options(selectinload(Campaign.user), selectinload(Campaign.product))).all()
+def read_campaigns(
+    request: Request,
+    response: Response,
+    filters: CampaignFilter = Depends(),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    stream: bool = False,
+    session: Session = Depends(get_session)
+):
+    # e.g. fields=id,status,user.name,product.name skips the profile tables entirely
+    projection = parse_fields(fields, CampaignRead)
+    statement = campaign_list_statement(filters).options(*campaign_load_options(projection))
+    if stream:
+        # Every matching row from `cursor` on, as a chunked JSON array or NDJSON (Accept: application/x-ndjson)
+        return stream_response(iter_pages(statement, Campaign, cursor, projection, CampaignRead), request)
+    campaigns, next_cursor = split_page(session.exec(keyset_page(statement, Campaign, cursor, limit)).all(), limit)
+    return page_response(campaigns, next_cursor, projection, CampaignRead, response)
 
 @app.get("/campaigns/{campaign_id}", response_model=CampaignRead)
-def read_campaign(campaign_id: int, session: Session = Depends(get_session)):
+def read_campaign(campaign_id: int, request: Request, response: Response, session: Session = Depends(get_session)):
+    # Polls of an unchanged campaign cost one version lookup and a 304
+    if has_validator(request):
+        versions = session.exec(campaign_version_statement(campaign_id)).first()
+        if versions is None:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+        headers = campaign_headers(campaign_id, *versions)
+        if matches(request, headers["ETag"]):
+            return not_modified(headers)
     campaign = session.exec(
         select(Campaign)
         .where(Campaign.id == campaign_id)
-        .options(selectinload(Campaign.user), selectinload(Campaign.product))
+        .options(*campaign_load_options())
     ).first()
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
+    response.headers.update(loaded_campaign_headers(campaign))
     return campaign
 
-@app.post("/campaigns/{campaign_id}/generate", response_model=CampaignRead)
-def generate_ad(campaign_id: int, session: Session = Depends(get_session)):
-    campaign = session.exec(
-        select(Campaign)
-        .where(Campaign.id == campaign_id)
-        .options(selectinload(Campaign.user), selectinload(Campaign.product))
-    ).first()
-
+@app.post("/campaigns/{campaign_id}/generate", response_model=GenerationJobRead, status_code=202)
+def generate_ad(campaign_id: int, force: bool = False, session: Session = Depends(get_session)):
+    campaign = session.get(Campaign, campaign_id)
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
     
     if not client:
         raise HTTPException(status_code=500, detail="OpenAI API Key is not configured")
 
+    # The persona and Sora prompt steps run on the job queue; poll /jobs/{id} for progress.
+    # force=true skips the LLM cache and regenerates from scratch
+    return job_queue.enqueue(campaign, session, force=force)
+
+@app.post("/campaigns/{campaign_id}/variants", response_model=GenerationJobRead, status_code=202)
+def generate_variants(campaign_id: int, request: CampaignVariantsCreate, force: bool = False, session: Session = Depends(get_session)):
+    campaign = session.get(Campaign, campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+
+    if not client:
+        raise HTTPException(status_code=500, detail="OpenAI API Key is not configured")
+
+    # One persona for the campaign and every listed placement, then their Sora
+    # prompts concurrently; replaces the campaign's previous variants
+    placements = [(variant.platform, variant.duration_seconds) for variant in request.variants]
+    return job_queue.enqueue(campaign, session, force=force, placements=placements)
+
+@app.get("/campaigns/{campaign_id}/variants", response_model=List[CampaignVariantRead])
+def read_variants(campaign_id: int, session: Session = Depends(get_session)):
+    if not session.get(Campaign, campaign_id):
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return session.exec(select(CampaignVariant).where(CampaignVariant.campaign_id == campaign_id).order_by(CampaignVariant.id)).all()
+
+@app.get("/campaigns/{campaign_id}/generate/stream")
+def stream_generate_ad(campaign_id: int, request: Request, force: bool = False, session: Session = Depends(get_session)):
+    campaign = session.exec(select(Campaign).where(Campaign.id == campaign_id).options(*campaign_load_options())).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+
+    if not client:
+        raise HTTPException(status_code=500, detail="OpenAI API Key is not configured")
+
+    persona_user_prompt = build_persona_prompt(campaign)
+    duration_seconds = campaign.duration_seconds
+    # The stream runs as the campaign's job, so it can't race a queued one
+    job, created = job_queue.start_streamed(campaign, session, force=force)
+    if not created:
+        raise HTTPException(status_code=409, detail=f"Campaign is already generating (job {job.id})")
+
+    # Server-Sent Events: `persona`, then `token` for each Sora prompt delta, then `done` or `error`
+    return StreamingResponse(
+        stream_campaign_generation(request, campaign_id, job.id, persona_user_prompt, duration_seconds, force=force),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Job-Id": str(job.id)}
+    )
+
+@app.get("/jobs/{job_id}", response_model=GenerationJobRead)
+def read_job(job_id: int, session: Session = Depends(get_session)):
+    job = session.get(GenerationJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# --- Exports ---
+@app.post("/exports", response_model=ExportJobRead, status_code=202)
+def create_export(export: ExportCreate, session: Session = Depends(get_session)):
+    # Writes every campaign (or those changed after `since`) to a Parquet or
+    # Arrow IPC file in the background; poll /exports/{id}, then download it
+    return export_queue.enqueue(session, export.format, export.since)
+
+@app.get("/exports/{export_id}", response_model=ExportJobRead)
+def read_export(export_id: int, session: Session = Depends(get_session)):
+    job = session.get(ExportJob, export_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return job
+
+@app.get("/exports/{export_id}/download")
+def download_export(export_id: int, session: Session = Depends(get_session)):
+    job = session.get(ExportJob, export_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export not found")
+    if job.status != "completed" or not job.path or not os.path.exists(job.path):
+        raise HTTPException(status_code=409, detail=f"Export is {job.status}")
+    media_type = "application/vnd.apache.parquet" if job.format == "parquet" else "application/vnd.apache.arrow.file"
+    return FileResponse(job.path, media_type=media_type, filename=os.path.basename(job.path))
+
+# --- Audience segments ---
+def segmentation_response() -> SegmentationRead:
     try:
-        # Step 1: Generate Creative Persona
-        persona_system_prompt = "You are a world-class Creative Strategist. Analyze the user data and product details to create a detailed 'Creative Persona' and creative direction. Return valid JSON only."
-        
-        # Helper to dump model if it exists
-        def dump_if_exists(model):
-            return model.model_dump() if model else "Unknown"
-
-        persona_user_prompt = f"""
-        **User Data:**
-        Name: {campaign.user.name}
-        Demographics: {dump_if_exists(campaign.user.demographics)}
-        Psychographics: {dump_if_exists(campaign.user.psychographics)}
-        Lifestyle: {dump_if_exists(campaign.user.lifestyle)}
-        Media Preferences: {dump_if_exists(campaign.user.media_preferences)}
-
-        **Product:**
-        Name: {campaign.product.name}
-        Description: {campaign.product.description}
-        Features: {campaign.product.features}
-
-        **Campaign Context:**
-        Objective: {campaign.objective}
-        Platform: {campaign.platform}
-        Duration: {campaign.duration_seconds}s
-        Product Intent: {campaign.product_intent}
-
-        **Task:**
-        Synthesize this into a Creative Persona JSON with these keys:
-        - protagonist_description (visual details)
-        - setting (environment details)
-        - mood_and_tone
-        - narrative_arc (act 1, 2, 3)
-        - camera_behavior
-        - lighting
-        - music_vibe
-        - pacing
-        """
-        
-        persona_response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": persona_system_prompt},
-                {"role": "user", "content": persona_user_prompt}
-            ],
-            response_format={"type": "json_object"}
-        )
-        creative_persona_json = json.loads(persona_response.choices[0].message.content)
-        campaign.creative_persona = creative_persona_json
-        
-        # Step 2: Generate Sora Prompt
-        sora_system_prompt = "You are an expert film director specializing in AI video generation (OpenAI Sora). Create a cinematic, highly detailed prompt based on the creative persona."
-        sora_user_prompt = f"""
-        **Creative Persona / Brief:**
-        {json.dumps(creative_persona_json, indent=2)}
-
-        **Task:**
-        Write the final Sora prompt. It should be a single, cohesive paragraph describing the video visually. Focus on lighting, texture, camera movement, and subject action.
-        Ensure it fits a {campaign.duration_seconds} second duration.
-        """
-
-        sora_response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": sora_system_prompt},
-                {"role": "user", "content": sora_user_prompt}
-            ]
-        )
-        sora_prompt = sora_response.choices[0].message.content
-        
-        campaign.sora_prompt = sora_prompt
-        campaign.status = "completed"
-        
-        session.add(campaign)
-        session.commit()
-        session.refresh(campaign)
-        return campaign
-        
-    except Exception as e:
-        print(f"Error generation: {e}")
-        campaign.status = "failed"
-        session.add(campaign)
-        session.commit()
-        raise HTTPException(status_code=500, detail=str(e))
+        segments = segment_index.summary()
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    segmentation = segment_index.segmentation
+    return SegmentationRead(
+        k=segmentation.k, iterations=segmentation.iterations, elapsed_ms=segmentation.elapsed_ms,
+        created_at=segmentation.created_at, segments=segments
+    )
+
+@app.post("/segments", response_model=SegmentationRead)
+def create_segments(k: int = Query(8, ge=1, le=256), seed: int = 0, max_iter: int = Query(25, ge=1, le=100)):
+    # Clusters the whole audience; new and updated profiles join their nearest segment
+    try:
+        segment_index.cluster(k, seed=seed, max_iter=max_iter)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return segmentation_response()
+
+@app.get("/segments", response_model=SegmentationRead)
+def read_segments():
+    return segmentation_response()
+
+@app.get("/segments/{segment_id}/users", response_model=List[int])
+def read_segment_users(segment_id: int, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE * 100)):
+    try:
+        members = segment_index.members(segment_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return members[:limit].tolist()
+
+@app.get("/segments/index")
+def read_segment_index():
+    return segment_index.stats()
+
+@app.post("/segments/index/rebuild")
+def rebuild_segment_index():
+    # Picks up profiles written outside the API, e.g. by seed_audience.py
+    segment_index.rebuild()
+    return segment_index.stats()
+
+@app.get("/cache/llm")
+def read_llm_cache_stats():
+    return llm_cache.stats()
+
+@app.delete("/cache/llm")
+def clear_llm_cache(expired_only: bool = False):
+    return {"deleted": llm_cache.clear(expired_only=expired_only)}
+
+@app.get("/llm/gateway")
+def read_llm_gateway_stats():
+    # Retry/429 counters, circuit breaker state and remaining rate-limit budget
+    return gateway.stats()
+
+@app.get("/db/pool")
+def read_pool_stats():
+    # checkedout + overflow against pool_size + max_overflow shows how close
+    # each worker process gets to its connection limit
+    stats = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "sync": pool_stats(engine)}
+    if async_engine:
+        stats["async"] = pool_stats(async_engine.sync_engine)
+    return stats
+
+if METRICS_ENABLED:
+    # Gauges read from the existing stats at scrape time
+    register_stats("db_pool", read_pool_stats)
+    register_stats("job_queue", job_queue.stats)
+    register_stats("export_queue", export_queue.stats)
+    register_stats("llm_gateway", gateway.stats)
+    register_stats("llm_cache", llm_cache.stats)
+    register_stats("product_cache", product_cache.stats)
+
+    @app.get("/metrics")
+    def read_metrics():
+        # Prometheus text exposition format
+        content, content_type = render_metrics()
+        return Response(content=content, media_type=content_type)
 
 @app.get("/health")
 def health_check():
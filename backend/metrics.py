@@ -0,0 +1,136 @@
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+from sqlalchemy import event
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+# Prometheus metrics, served as text on GET /metrics. Request latency and the
+# per-request DB query counts come from MetricsMiddleware and
+# instrument_engine(); generation stages, LLM tokens and job outcomes are
+# recorded where they happen; pool, queue, gateway and cache figures are read
+# from their stats() at scrape time by StatsCollector.
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+HTTP_REQUESTS = Counter("signal_http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+HTTP_REQUEST_SECONDS = Histogram(
+    "signal_http_request_duration_seconds", "Time until the response body is fully sent",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "signal_db_queries_per_request", "SQL statements executed while serving a request",
+    ["method", "route"], buckets=QUERY_COUNT_BUCKETS
+)
+DB_QUERY_SECONDS_PER_REQUEST = Histogram(
+    "signal_db_query_duration_seconds_per_request", "Total time spent in SQL while serving a request",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+DB_QUERY_SECONDS = Histogram("signal_db_query_duration_seconds", "Duration of each SQL statement", buckets=LATENCY_BUCKETS)
+# Stages: queued (waiting for a worker), load, persona, sora_prompt, save;
+# single-pass or pipelined in place of persona and sora_prompt when
+# GENERATION_PIPELINE runs the chain as one step
+GENERATION_STAGE_SECONDS = Histogram(
+    "signal_generation_stage_duration_seconds", "Time spent in each stage of a campaign generation",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+GENERATION_RESULTS = Counter("signal_generation_results_total", "Finished campaign generations", ["status"])
+LLM_TOKENS = Counter("signal_llm_tokens_total", "LLM tokens by generation step", ["step", "kind"])
+
+class QueryStats:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+# Set by the middleware for the duration of a request; worker threads and
+# tasks inherit it through their copied context
+_request_queries: ContextVar[Optional[QueryStats]] = ContextVar("request_queries", default=None)
+
+def instrument_engine(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_query_start"].pop()
+        DB_QUERY_SECONDS.observe(elapsed)
+        queries = _request_queries.get()
+        if queries is not None:
+            queries.count += 1
+            queries.seconds += elapsed
+
+class MetricsMiddleware:
+    # Plain ASGI rather than BaseHTTPMiddleware so streamed responses are
+    # timed until their last chunk, and nothing is buffered
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        queries = QueryStats()
+        token = _request_queries.set(queries)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request_queries.reset(token)
+            # The route template keeps label cardinality bounded (/users/{user_id}, not /users/42)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            HTTP_REQUESTS.labels(method, path, str(status)).inc()
+            HTTP_REQUEST_SECONDS.labels(method, path).observe(time.perf_counter() - start)
+            DB_QUERIES_PER_REQUEST.labels(method, path).observe(queries.count)
+            DB_QUERY_SECONDS_PER_REQUEST.labels(method, path).observe(queries.seconds)
+
+def _flatten(stats: Dict[str, Any], prefix: str = "") -> Iterator[tuple]:
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{name}_")
+        elif isinstance(value, (int, float)):
+            yield f"{prefix}{name}", float(value)
+
+class StatsCollector(Collector):
+    # Exposes the numeric fields of an existing stats() dict as gauges,
+    # read at scrape time so nothing is tracked twice
+    def __init__(self, namespace: str, read: Callable[[], Dict[str, Any]]):
+        self.namespace = namespace
+        self.read = read
+
+    def describe(self):
+        # Nothing to declare up front; keeps registration from calling read()
+        return []
+
+    def collect(self):
+        try:
+            stats = self.read()
+        except Exception as e:
+            print(f"Metrics collection for {self.namespace} failed: {e}")
+            return
+        for name, value in _flatten(stats):
+            yield GaugeMetricFamily(f"signal_{self.namespace}_{name}", f"{self.namespace} {name.replace('_', ' ')}", value=value)
+
+def register_stats(namespace: str, read: Callable[[], Dict[str, Any]]):
+    REGISTRY.register(StatsCollector(namespace, read))
+
+def render_metrics():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,102 @@
+import argparse
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import SQLModel
+
+try:
+    from backend.models import * # Import all models to register them
+    from backend.database import engine
+except ImportError:
+    from models import *
+    from database import engine
+
+# Brings a database created by an older version of the models up to date.
+# Every step checks the live schema first, so it is safe to run repeatedly.
+
+def _add_missing_columns(conn, inspector, table):
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    preparer = conn.dialect.identifier_preparer
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(dialect=conn.dialect)
+        default = ""
+        if column.default is not None and column.default.is_scalar:
+            default = f" DEFAULT {column.type.literal_processor(conn.dialect)(column.default.arg)}"
+        print(f"Adding column {table.name}.{column.name}...")
+        conn.execute(text(f"ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {preparer.quote(column.name)} {column_type}{default}"))
+
+def _convert_json_to_jsonb(conn, inspector, table):
+    # Tables created before the JSONB variant hold the same data as json
+    preparer = conn.dialect.identifier_preparer
+    current = {column["name"]: column["type"] for column in inspector.get_columns(table.name)}
+    for column in table.columns:
+        if not isinstance(column.type.dialect_impl(conn.dialect), JSONB) or isinstance(current.get(column.name), JSONB):
+            continue
+        name = preparer.quote(column.name)
+        print(f"Converting {table.name}.{column.name} to JSONB...")
+        conn.execute(text(f"ALTER TABLE {preparer.quote(table.name)} ALTER COLUMN {name} TYPE JSONB USING {name}::jsonb"))
+
+def _make_indexes_unique(conn, inspector, table, dedupe):
+    # Indexes declared unique since they were created (the profile tables'
+    # user_id). Duplicate rows are only removed when asked for (--dedupe),
+    # keeping the newest row per key; otherwise the migration stops and
+    # reports them so nothing is deleted at startup
+    existing = {index["name"]: index for index in inspector.get_indexes(table.name)}
+    preparer = conn.dialect.identifier_preparer
+    for index in table.indexes:
+        if not index.unique or index.name not in existing or existing[index.name]["unique"] or "id" not in table.columns:
+            continue
+        name = preparer.quote(table.name)
+        columns = ", ".join(preparer.quote(column.name) for column in index.columns)
+        duplicates = conn.execute(text(
+            f"SELECT {columns}, COUNT(*) FROM {name} GROUP BY {columns} HAVING COUNT(*) > 1"
+        )).all()
+        if duplicates and not dedupe:
+            keys = ", ".join(str(tuple(row[:-1]) if len(row) > 2 else row[0]) for row in duplicates[:20])
+            more = f" and {len(duplicates) - 20} more" if len(duplicates) > 20 else ""
+            raise RuntimeError(
+                f"{table.name} has {len(duplicates)} duplicated {index.name} keys ({keys}{more}), "
+                f"so the index cannot be made unique. Resolve them by hand, or run "
+                f"`python migrate.py --dedupe` to keep only the newest row per key."
+            )
+        removed = 0
+        if duplicates:
+            removed = conn.execute(text(f"DELETE FROM {name} WHERE id NOT IN (SELECT MAX(id) FROM {name} GROUP BY {columns})")).rowcount
+        print(f"Rebuilding index {index.name} as unique ({removed} duplicate rows removed)...")
+        index.drop(conn)
+        index.create(conn)
+
+def _create_missing_indexes(conn, inspector, table):
+    existing = {index["name"] for index in inspector.get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name in existing:
+            continue
+        if index.dialect_options["postgresql"]["using"] == "gin" and conn.dialect.name != "postgresql":
+            continue
+        print(f"Creating index {index.name}...")
+        index.create(conn)
+
+def migrate(dedupe: bool = False):
+    print("Migrating database...")
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in SQLModel.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            _add_missing_columns(conn, inspector, table)
+            # Columns must be JSONB before their GIN indexes can be built
+            if conn.dialect.name == "postgresql":
+                _convert_json_to_jsonb(conn, inspector, table)
+            _make_indexes_unique(conn, inspector, table, dedupe)
+            _create_missing_indexes(conn, inspector, table)
+
+    # New tables are created outright, with their indexes
+    SQLModel.metadata.create_all(engine)
+    print("Migration complete.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bring the database schema up to date")
+    parser.add_argument("--dedupe", action="store_true", help="delete duplicate profile rows (keeping the newest) so their user_id indexes can be made unique")
+    migrate(dedupe=parser.parse_args().dedupe)
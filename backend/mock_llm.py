@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import itertools
+from typing import Any, Callable, Dict, List
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Local stand-in for the OpenAI chat-completions API, so the generation path
+# can be exercised and load tested without network access or cost:
+#   python mock_llm.py [--port 8100]
+#   OPENAI_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=mock uvicorn main:app
+# Responses depend only on the request messages; latency, errors and 429s
+# are drawn from a seeded RNG in arrival order.
+
+MOCK_LLM_SEED = int(os.getenv("MOCK_LLM_SEED", "0"))
+# fixed:MS | uniform:LOW_MS:HIGH_MS | normal:MEAN_MS:STDDEV_MS | lognormal:MEDIAN_MS:SIGMA
+MOCK_LLM_LATENCY = os.getenv("MOCK_LLM_LATENCY", "fixed:0")
+MOCK_LLM_TOKEN_LATENCY_MS = float(os.getenv("MOCK_LLM_TOKEN_LATENCY_MS", "0"))
+MOCK_LLM_ERROR_RATE = float(os.getenv("MOCK_LLM_ERROR_RATE", "0"))
+MOCK_LLM_RATE_LIMIT_RATE = float(os.getenv("MOCK_LLM_RATE_LIMIT_RATE", "0"))
+MOCK_LLM_RETRY_AFTER_SECONDS = float(os.getenv("MOCK_LLM_RETRY_AFTER_SECONDS", "1"))
+# Inline JSON or a path to a JSON file; replaces the built-in persona
+MOCK_LLM_PERSONA = os.getenv("MOCK_LLM_PERSONA")
+MOCK_LLM_SORA_PROMPT = os.getenv("MOCK_LLM_SORA_PROMPT")
+
+DEFAULT_PERSONA = {
+    "protagonist_description": "A focused urban professional in their early thirties, minimalist clothing, natural makeup",
+    "setting": "Sunlit loft apartment with concrete walls and indoor plants",
+    "mood_and_tone": "Calm, aspirational, quietly confident",
+    "narrative_arc": {
+        "act_1": "Morning routine interrupted by a small everyday frustration",
+        "act_2": "The product solves it effortlessly",
+        "act_3": "The protagonist heads out, energised"
+    },
+    "camera_behavior": "Slow dolly-in, handheld close-ups on the product",
+    "lighting": "Soft golden-hour window light",
+    "music_vibe": "Lo-fi electronic with a warm bass line",
+    "pacing": "Measured opening, quick cuts in the final act"
+}
+
+DEFAULT_SORA_PROMPT = (
+    "A sunlit loft at golden hour: soft window light rakes across concrete walls as a focused young professional "
+    "reaches for the product on a wooden counter. The camera dollies in slowly, then cuts to handheld close-ups of "
+    "textured surfaces and hands, before a wide shot follows them out the door into a bright city street."
+)
+
+def _load(value: str) -> Any:
+    if os.path.isfile(value):
+        with open(value) as f:
+            return json.load(f)
+    return json.loads(value)
+
+PERSONA = _load(MOCK_LLM_PERSONA) if MOCK_LLM_PERSONA else DEFAULT_PERSONA
+SORA_PROMPT = MOCK_LLM_SORA_PROMPT or DEFAULT_SORA_PROMPT
+
+def latency_sampler(spec: str) -> Callable[[random.Random], float]:
+    # Returns a function drawing a latency in seconds
+    kind, *params = spec.split(":")
+    values = [float(param) for param in params]
+    samplers = {
+        "fixed": lambda rng: values[0],
+        "uniform": lambda rng: rng.uniform(values[0], values[1]),
+        "normal": lambda rng: rng.gauss(values[0], values[1]),
+        "lognormal": lambda rng: values[0] * rng.lognormvariate(0, values[1]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution: {spec}")
+    return lambda rng: max(samplers[kind](rng), 0) / 1000
+
+sample_latency = latency_sampler(MOCK_LLM_LATENCY)
+_requests = itertools.count()
+
+def _fingerprint(messages: List[Dict[str, Any]]) -> str:
+    return hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+def _content(body: Dict[str, Any]) -> str:
+    # JSON mode is used for the persona step, and for single-pass generation
+    # when the system prompt asks for a "sora_prompt" key as well
+    messages = body.get("messages", [])
+    fingerprint = _fingerprint(messages)
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        persona = {**PERSONA, "mock_fingerprint": fingerprint}
+        system = " ".join(str(message.get("content", "")) for message in messages if message.get("role") == "system")
+        if '"sora_prompt"' in system:
+            return json.dumps({"creative_persona": persona, "sora_prompt": f"{SORA_PROMPT} [{fingerprint}]"})
+        return json.dumps(persona)
+    return f"{SORA_PROMPT} [{fingerprint}]"
+
+def _words(content: str) -> List[str]:
+    return content.split(" ")
+
+def _tokens(text: str) -> int:
+    # Rough count (~4 characters per token), enough for usage accounting
+    return max(1, len(text) // 4)
+
+def _usage(body: Dict[str, Any], content: str) -> Dict[str, int]:
+    prompt_tokens = sum(_tokens(str(message.get("content", ""))) for message in body.get("messages", []))
+    completion_tokens = _tokens(content)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+def _error(status_code: int, message: str, error_type: str, headers: Dict[str, str] = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": message, "type": error_type, "param": None, "code": None}},
+        headers=headers,
+    )
+
+def _chunk(completion_id: str, model: str, delta: Dict[str, Any], finish_reason=None) -> str:
+    payload = {
+        "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+async def _stream(completion_id: str, model: str, content: str):
+    yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+    # Paced against the start time so per-sleep overshoot doesn't add up
+    start = time.monotonic()
+    for number, word in enumerate(_words(content), 1):
+        if MOCK_LLM_TOKEN_LATENCY_MS:
+            await asyncio.sleep(max(start + number * MOCK_LLM_TOKEN_LATENCY_MS / 1000 - time.monotonic(), 0))
+        yield _chunk(completion_id, model, {"content": f"{word} "})
+    yield _chunk(completion_id, model, {}, finish_reason="stop")
+    yield "data: [DONE]\n\n"
+
+app = FastAPI(title="Mock LLM")
+
+@app.get("/v1/models")
+def list_models():
+    return {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "created": 0, "owned_by": "mock"}]}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    number = next(_requests)
+    rng = random.Random(f"{MOCK_LLM_SEED}:{number}")
+    await asyncio.sleep(sample_latency(rng))
+
+    if rng.random() < MOCK_LLM_RATE_LIMIT_RATE:
+        return _error(429, "Rate limit reached (mock)", "rate_limit_exceeded", headers={
+            "retry-after": str(MOCK_LLM_RETRY_AFTER_SECONDS),
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": f"{MOCK_LLM_RETRY_AFTER_SECONDS}s",
+        })
+    if rng.random() < MOCK_LLM_ERROR_RATE:
+        return _error(500, "The server had an error while processing your request (mock)", "server_error")
+
+    model = body.get("model", "gpt-4o-mini")
+    content = _content(body)
+    completion_id = f"chatcmpl-mock-{number}"
+    if body.get("stream"):
+        return StreamingResponse(_stream(completion_id, model, content), media_type="text/event-stream")
+    # Generation takes as long whether or not the response is streamed
+    if MOCK_LLM_TOKEN_LATENCY_MS:
+        await asyncio.sleep(len(_words(content)) * MOCK_LLM_TOKEN_LATENCY_MS / 1000)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": _usage(body, content),
+    }
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Deterministic mock of the OpenAI chat-completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -1,67 +1,91 @@
 from typing import Optional, List, Dict, Any
+from pydantic import computed_field
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column, JSON
+from sqlalchemy import Column, JSON, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 
+try:
+    from backend.images import image_variant_urls
+except ImportError:
+    from images import image_variant_urls
+
+# JSONB on PostgreSQL so profile attributes can be GIN-indexed and queried
+# with @>, plain JSON (stored as text) elsewhere
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+def gin_index(table: str, column: str) -> Index:
+    # jsonb_path_ops only supports @>, which is all the audience queries use,
+    # and is much smaller than the default GIN opclass
+    return Index(
+        f"ix_{table}_{column}_gin", column,
+        postgresql_using="gin", postgresql_ops={column: "jsonb_path_ops"}
+    ).ddl_if(dialect="postgresql")
+
 # --- Demographics ---
 class UserDemographicsBase(SQLModel):
-    age_range: str # e.g., "18-24", "25-34"
+    age_range: str = Field(index=True) # e.g., "18-24", "25-34"
     gender_identity: str
     language: str = "English"
-    country: str
+    country: str = Field(index=True)
     region: Optional[str] = None
     location_type: str # urban, suburban, rural
 
 class UserDemographics(UserDemographicsBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="userprofile.id")
+    user_id: int = Field(foreign_key="userprofile.id", index=True, unique=True)
     user: "UserProfile" = Relationship(back_populates="demographics")
 
 # --- Psychographics ---
 class UserPsychographicsBase(SQLModel):
-    values: List[str] = Field(default=[], sa_column=Column(JSON))
-    motivations: List[str] = Field(default=[], sa_column=Column(JSON))
-    personality_traits: Dict[str, int] = Field(default={}, sa_column=Column(JSON))
+    values: List[str] = Field(default=[], sa_column=Column(JSONType))
+    motivations: List[str] = Field(default=[], sa_column=Column(JSONType))
+    personality_traits: Dict[str, int] = Field(default={}, sa_column=Column(JSONType))
     decision_making_style: Optional[str] = None
     risk_tolerance: Optional[str] = None
 
 class UserPsychographics(UserPsychographicsBase, table=True):
+    __table_args__ = (gin_index("userpsychographics", "values"), gin_index("userpsychographics", "motivations"))
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="userprofile.id")
+    user_id: int = Field(foreign_key="userprofile.id", index=True, unique=True)
     user: "UserProfile" = Relationship(back_populates="psychographics")
 
 # --- Lifestyle ---
 class UserLifestyleBase(SQLModel):
     occupation: Optional[str] = None
     industry: Optional[str] = None
-    hobbies: List[str] = Field(default=[], sa_column=Column(JSON))
-    daily_environments: List[str] = Field(default=[], sa_column=Column(JSON))
+    hobbies: List[str] = Field(default=[], sa_column=Column(JSONType))
+    daily_environments: List[str] = Field(default=[], sa_column=Column(JSONType))
     tech_savviness: str = "average"
 
 class UserLifestyle(UserLifestyleBase, table=True):
+    __table_args__ = (gin_index("userlifestyle", "hobbies"), gin_index("userlifestyle", "daily_environments"))
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="userprofile.id")
+    user_id: int = Field(foreign_key="userprofile.id", index=True, unique=True)
     user: "UserProfile" = Relationship(back_populates="lifestyle")
 
 # --- Media Preferences ---
 class UserMediaPreferencesBase(SQLModel):
-    preferred_platforms: List[str] = Field(default=[], sa_column=Column(JSON))
+    preferred_platforms: List[str] = Field(default=[], sa_column=Column(JSONType))
     visual_visual_style: Optional[str] = None
-    music_preferences: List[str] = Field(default=[], sa_column=Column(JSON))
+    music_preferences: List[str] = Field(default=[], sa_column=Column(JSONType))
     ad_duration_preference: Optional[str] = None
 
 class UserMediaPreferences(UserMediaPreferencesBase, table=True):
+    __table_args__ = (gin_index("usermediapreferences", "preferred_platforms"), gin_index("usermediapreferences", "music_preferences"))
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="userprofile.id")
+    user_id: int = Field(foreign_key="userprofile.id", index=True, unique=True)
     user: "UserProfile" = Relationship(back_populates="media_preferences")
 
 # --- User Profile ---
 class UserProfileBase(SQLModel):
     name: str
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
 
 class UserProfile(UserProfileBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    # Bumped on every write; NULL until the first one (see http_cache.version)
+    updated_at: Optional[datetime] = Field(default=None, sa_column_kwargs={"onupdate": datetime.utcnow})
     
     # 1:1 Relationships
     demographics: Optional[UserDemographics] = Relationship(back_populates="user", sa_relationship_kwargs={"uselist": False})
@@ -77,10 +101,17 @@ class ProductBase(SQLModel):
     description: str
     image_url: Optional[str] = None
     features: List[str] = Field(default=[], sa_column=Column(JSON))
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+    @computed_field
+    @property
+    def image_variants(self) -> Optional[Dict[str, str]]:
+        # Resized thumb/card/full URLs for uploaded images (None for remote ones)
+        return image_variant_urls(self.image_url)
 
 class Product(ProductBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    updated_at: Optional[datetime] = Field(default=None, sa_column_kwargs={"onupdate": datetime.utcnow})
     campaigns: List["Campaign"] = Relationship(back_populates="product")
 
 # --- Campaign ---
@@ -91,15 +122,76 @@ class CampaignBase(SQLModel):
     brand_tone: Optional[str] = None
     cta_style: Optional[str] = None
     product_intent: Dict[str, str] = Field(default={}, sa_column=Column(JSON))
-    status: str = "pending"
+    status: str = Field(default="pending", index=True)
     creative_persona: Optional[Dict] = Field(default=None, sa_column=Column(JSON))
     sora_prompt: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Set when the result was generated once for a group of similar users
+    segment_key: Optional[str] = Field(default=None, index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
 
 class Campaign(CampaignBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: int = Field(foreign_key="userprofile.id")
-    product_id: int = Field(foreign_key="product.id")
+    user_id: int = Field(foreign_key="userprofile.id", index=True)
+    product_id: int = Field(foreign_key="product.id", index=True)
+    updated_at: Optional[datetime] = Field(default=None, sa_column_kwargs={"onupdate": datetime.utcnow})
     
     user: UserProfile = Relationship(back_populates="campaigns")
     product: Product = Relationship(back_populates="campaigns")
+
+# --- Campaign Variant ---
+# The same creative persona cut for another platform/duration; written by a
+# variant job (POST /campaigns/{id}/variants)
+class CampaignVariantBase(SQLModel):
+    platform: str
+    duration_seconds: int = 15
+    status: str = "pending" # pending, completed, failed
+    sora_prompt: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class CampaignVariant(CampaignVariantBase, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    campaign_id: int = Field(foreign_key="campaign.id", index=True)
+
+# --- Generation Job ---
+class GenerationJobBase(SQLModel):
+    campaign_id: int = Field(foreign_key="campaign.id", index=True)
+    status: str = Field(default="queued", index=True) # queued, running, completed, failed
+    stage: str = "queued" # queued, persona, sora_prompt, done
+    error: Optional[str] = None
+    force: bool = False # bypass the LLM cache
+    variants: bool = False # also write the campaign's pending CampaignVariant rows
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class GenerationJob(GenerationJobBase, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+# --- Export Job ---
+# A columnar export of campaigns (POST /exports or python export.py)
+class ExportJobBase(SQLModel):
+    format: str = "parquet" # parquet, arrow (Arrow IPC file)
+    since: Optional[datetime] = None # only campaigns whose row, user or product changed after this
+    status: str = Field(default="queued", index=True) # queued, running, completed, failed
+    path: Optional[str] = None
+    rows: int = 0
+    row_groups: int = 0
+    # Latest change included; the `since` of the next incremental export
+    exported_until: Optional[datetime] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class ExportJob(ExportJobBase, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+# --- LLM Cache ---
+class LLMCacheEntry(SQLModel, table=True):
+    key: str = Field(primary_key=True) # sha256 of kind, model and messages (llm_cache.cache_key)
+    kind: str # persona, sora_prompt, creative (single-pass)
+    model: str
+    value: Any = Field(sa_column=Column(JSON))
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True) # oldest are pruned first
+    expires_at: Optional[datetime] = None
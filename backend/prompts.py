@@ -0,0 +1,212 @@
+import os
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+import tiktoken
+
+try:
+    from backend.metrics import LLM_TOKENS
+except ImportError:
+    from metrics import LLM_TOKENS
+
+logger = logging.getLogger("signal.llm")
+
+# Prompt construction for both generation steps. Profile, product and persona
+# data are serialized compactly (no ids, no empty fields, no Python reprs or
+# indentation), and persona prompts are held to PROMPT_TOKEN_BUDGET input
+# tokens by dropping low-priority fields.
+
+# Input tokens (system + user message) per persona prompt; 0 disables trimming
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+# tiktoken encoding used for counting (o200k_base is the gpt-4o family's)
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "o200k_base")
+
+# Dropped in this order while a persona prompt is over budget; anything not
+# listed is always sent. Names are unique across the profile sections.
+TRIM_ORDER = [
+    "ad_duration_preference", "tech_savviness", "language", "region", "industry",
+    "risk_tolerance", "decision_making_style", "music_preferences", "daily_environments",
+    "personality_traits", "motivations", "hobbies", "features",
+]
+
+PROFILE_SECTIONS = {
+    "demographics": "Demographics",
+    "psychographics": "Psychographics",
+    "lifestyle": "Lifestyle",
+    "media_preferences": "Media Preferences",
+}
+
+PERSONA_SYSTEM_PROMPT = "You are a world-class Creative Strategist. Analyze the user data and product details to create a detailed 'Creative Persona' and creative direction. Return valid JSON only."
+
+SORA_SYSTEM_PROMPT = "You are an expert film director specializing in AI video generation (OpenAI Sora). Create a cinematic, highly detailed prompt based on the creative persona."
+
+PERSONA_TASK = (
+    "Synthesize this into a Creative Persona JSON with these keys: protagonist_description (visual details), "
+    "setting (environment details), mood_and_tone, narrative_arc (act_1, act_2, act_3), camera_behavior, "
+    "lighting, music_vibe, pacing"
+)
+
+SORA_TASK = (
+    "Write the final Sora prompt. It should be a single, cohesive paragraph describing the video visually. "
+    "Focus on lighting, texture, camera movement, and subject action."
+)
+
+# Single-pass generation: persona and Sora prompt in one JSON response
+SINGLE_PASS_SYSTEM_PROMPT = (
+    "You are a world-class Creative Strategist and an expert film director specializing in AI video generation (OpenAI Sora). "
+    "Analyze the user data and product details to create a detailed 'Creative Persona', then write a cinematic, highly detailed "
+    "Sora prompt based on it. Return valid JSON only, with two keys: \"creative_persona\" (the persona object) and "
+    "\"sora_prompt\" (a string)."
+)
+
+_encoding = None
+_encoding_loaded = False
+
+def _get_encoding():
+    # tiktoken downloads its BPE file on first use; without it (e.g. offline)
+    # counts fall back to ~4 characters per token
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            _encoding = tiktoken.get_encoding(PROMPT_TOKENIZER)
+        except Exception as e:
+            print(f"Tokenizer {PROMPT_TOKENIZER} unavailable, estimating token counts: {e}")
+        _encoding_loaded = True
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    # Content plus the chat format's per-message and reply-priming overhead
+    return sum(count_tokens(str(message.get("content", ""))) + 4 for message in messages) + 3
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+def is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+def _value(value: Any) -> str:
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{key}: {_value(item)}" for key, item in value.items() if not is_empty(item)) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_value(item) for item in value) + "]"
+    return str(value)
+
+def compact(fields: Dict[str, Any]) -> str:
+    # "name: value; name: value" with empty fields left out
+    return "; ".join(f"{name}: {_value(value)}" for name, value in fields.items() if not is_empty(value))
+
+def profile_sections(user) -> Dict[str, Dict[str, Any]]:
+    sections = {}
+    for relation, label in PROFILE_SECTIONS.items():
+        related = getattr(user, relation)
+        if related is not None:
+            sections[label] = related.model_dump(exclude={"id", "user_id"})
+    return sections
+
+def _placements(placements: List[Tuple[str, int]]) -> str:
+    return ", ".join(f"{platform} ({duration_seconds}s)" for platform, duration_seconds in placements)
+
+def _render(audience: Dict[str, Dict[str, Any]], product: Dict[str, Any], campaign, placements: Optional[List[Tuple[str, int]]] = None) -> str:
+    lines = []
+    for label, fields in audience.items():
+        serialized = compact(fields)
+        if serialized:
+            lines.append(f"{label}: {serialized}")
+    lines += ["", f"**Product:** {product['name']}"]
+    if product["description"]:
+        lines.append(product["description"])
+    if not is_empty(product.get("features")):
+        lines.append(f"Features: {_value(product['features'])}")
+    # A persona shared by several placements is written for all of them
+    placement = {"Platforms": _placements(placements)} if placements else {
+        "Platform": campaign.platform,
+        "Duration": f"{campaign.duration_seconds}s",
+    }
+    context = compact({"Objective": campaign.objective, **placement, "Product Intent": campaign.product_intent})
+    lines += ["", f"**Campaign Context:** {context}", "", f"**Task:** {PERSONA_TASK}"]
+    return "\n".join(lines)
+
+def _fit(header: str, audience: Dict[str, Dict[str, Any]], campaign, placements: Optional[List[Tuple[str, int]]] = None) -> str:
+    product = {"name": campaign.product.name, "description": campaign.product.description, "features": campaign.product.features}
+
+    def render() -> str:
+        return f"{header}\n{_render(audience, product, campaign, placements)}"
+
+    def tokens(prompt: str) -> int:
+        return count_message_tokens(persona_messages(prompt))
+
+    prompt = render()
+    if not PROMPT_TOKEN_BUDGET or tokens(prompt) <= PROMPT_TOKEN_BUDGET:
+        return prompt
+
+    over = tokens(prompt)
+    dropped = []
+    for name in TRIM_ORDER:
+        if tokens(prompt) <= PROMPT_TOKEN_BUDGET:
+            break
+        for fields in (*audience.values(), product):
+            if not is_empty(fields.get(name)):
+                fields[name] = None
+                dropped.append(name)
+        prompt = render()
+    # Last resort: the product description is the only free-form text left
+    excess = tokens(prompt) - PROMPT_TOKEN_BUDGET
+    if excess > 0:
+        product["description"] = truncate_tokens(product["description"], max(count_tokens(product["description"]) - excess, 0))
+        dropped.append("description (truncated)")
+        prompt = render()
+    logger.info("Persona prompt over budget (%d > %d tokens), now %d; dropped %s", over, PROMPT_TOKEN_BUDGET, tokens(prompt), ", ".join(dropped))
+    return prompt
+
+def build_persona_prompt(campaign, placements: Optional[List[Tuple[str, int]]] = None) -> str:
+    # placements: (platform, duration_seconds) pairs when the persona feeds variants
+    return _fit(f"**User Data:** {campaign.user.name}", profile_sections(campaign.user), campaign, placements)
+
+def build_audience_persona_prompt(attributes: Dict[str, Any], audience_size: int, campaign) -> str:
+    # One prompt for a whole group of users who share these profile attributes
+    return _fit(f"**Audience Segment ({audience_size} users):**", {"Shared Attributes": dict(attributes)}, campaign)
+
+def build_sora_prompt(creative_persona: Dict[str, Any], duration_seconds: int, platform: Optional[str] = None) -> str:
+    # The platform is only named for variants, so single-campaign prompts
+    # (and their cache keys) are unchanged
+    video = f"{duration_seconds} second {platform} video" if platform else f"{duration_seconds} second duration"
+    return (
+        f"**Creative Persona / Brief:** {json.dumps(creative_persona, separators=(',', ':'), ensure_ascii=False)}\n\n"
+        f"**Task:** {SORA_TASK} Ensure it fits a {video}."
+    )
+
+def persona_messages(persona_user_prompt: str):
+    return [
+        {"role": "system", "content": PERSONA_SYSTEM_PROMPT},
+        {"role": "user", "content": persona_user_prompt}
+    ]
+
+def sora_messages(creative_persona: Dict[str, Any], duration_seconds: int, platform: Optional[str] = None):
+    return [
+        {"role": "system", "content": SORA_SYSTEM_PROMPT},
+        {"role": "user", "content": build_sora_prompt(creative_persona, duration_seconds, platform)}
+    ]
+
+def single_pass_messages(persona_user_prompt: str, duration_seconds: int):
+    # The persona brief with the Sora task appended, so the model writes the
+    # prompt from the persona it has just produced
+    return [
+        {"role": "system", "content": SINGLE_PASS_SYSTEM_PROMPT},
+        {"role": "user", "content": f"{persona_user_prompt}\n\n**Then:** {SORA_TASK} Ensure it fits a {duration_seconds} second duration."}
+    ]
+
+def log_usage(label: Optional[str], step: str, prompt_tokens: int, completion_tokens: int, estimated: bool = False):
+    LLM_TOKENS.labels(step, "prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(step, "completion").inc(completion_tokens)
+    source = "estimated" if estimated else "reported"
+    logger.debug("Token usage [%s] %s: %d prompt + %d completion (%s)", label or "unlabelled", step, prompt_tokens, completion_tokens, source)
@@ -0,0 +1,208 @@
+import os
+import json
+import base64
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+from fastapi import HTTPException
+from pydantic import TypeAdapter
+from sqlalchemy import and_, or_, exists, func, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import joinedload, selectinload
+from sqlmodel import Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+try:
+    from backend.database import engine, async_engine
+    from backend.serialization import FAST_JSON, STREAM_BATCH_SIZE, json_response, to_dict
+    from backend.models import UserProfile, UserDemographics, UserPsychographics, UserLifestyle, UserMediaPreferences, Campaign
+    from backend.schemas import UserProfileFilter, CampaignFilter
+except ImportError:
+    from database import engine, async_engine
+    from serialization import FAST_JSON, STREAM_BATCH_SIZE, json_response, to_dict
+    from models import UserProfile, UserDemographics, UserPsychographics, UserLifestyle, UserMediaPreferences, Campaign
+    from schemas import UserProfileFilter, CampaignFilter
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# 1:1 profile tables nested into every user response
+USER_RELATIONS = (
+    UserProfile.demographics,
+    UserProfile.psychographics,
+    UserProfile.lifestyle,
+    UserProfile.media_preferences,
+)
+
+# The profile tables are 1:1 and the campaign's user and product are
+# many-to-one, so LEFT OUTER JOINs fetch a full profile or campaign in one
+# round trip without multiplying rows. "selectin" issues one extra query
+# per relationship instead and is kept for comparison (see bench_reads.py).
+PROFILE_LOAD_STRATEGY = os.getenv("PROFILE_LOAD_STRATEGY", "joined")
+eager_load = joinedload if PROFILE_LOAD_STRATEGY == "joined" else selectinload
+
+# Parsed `fields=` projection: top-level field -> nested fields (None = all)
+Projection = Dict[str, Optional[Set[str]]]
+
+def user_load_options(projection: Optional[Projection] = None):
+    if projection is None:
+        return [eager_load(relation) for relation in USER_RELATIONS]
+    return [eager_load(relation) for relation in USER_RELATIONS if relation.key in projection]
+
+def campaign_load_options(projection: Optional[Projection] = None):
+    # Loads the nested user profile eagerly as well, which AsyncSession
+    # requires since it cannot lazy load on attribute access
+    if projection is None:
+        return [eager_load(Campaign.user).options(*user_load_options()), eager_load(Campaign.product)]
+    options = []
+    if "user" in projection:
+        user_fields = projection["user"]
+        relations = [relation for relation in USER_RELATIONS if user_fields is None or relation.key in user_fields]
+        options.append(eager_load(Campaign.user).options(*[eager_load(relation) for relation in relations]))
+    if "product" in projection:
+        options.append(eager_load(Campaign.product))
+    return options
+
+# --- Filters ---
+DEMOGRAPHIC_FILTERS = ("country", "age_range", "gender_identity", "location_type")
+
+# Filter name -> (profile table, JSON list column)
+LIST_FILTERS = {
+    "value": (UserPsychographics, UserPsychographics.values),
+    "hobby": (UserLifestyle, UserLifestyle.hobbies),
+    "preferred_platform": (UserMediaPreferences, UserMediaPreferences.preferred_platforms),
+}
+
+def json_array_contains(column, value: str):
+    if engine.dialect.name == "postgresql":
+        # JSONB containment, served by the jsonb_path_ops GIN index
+        return column.op("@>")(type_coerce([value], JSONB))
+    # Portable fallback: scan the array with json_each (SQLite)
+    elements = func.json_each(column).table_valued("value")
+    return exists().select_from(elements).where(elements.c.value == value)
+
+def apply_user_filters(statement, filters: UserProfileFilter):
+    criteria = filters.model_dump(exclude_none=True)
+    demographics = {field: criteria[field] for field in DEMOGRAPHIC_FILTERS if field in criteria}
+    if demographics:
+        statement = statement.join(UserDemographics, UserDemographics.user_id == UserProfile.id)
+        for field, value in demographics.items():
+            statement = statement.where(getattr(UserDemographics, field) == value)
+    for name, (table, column) in LIST_FILTERS.items():
+        if name in criteria:
+            statement = statement.join(table, table.user_id == UserProfile.id).where(json_array_contains(column, criteria[name]))
+    return statement
+
+def user_list_statement(filters: UserProfileFilter):
+    return apply_user_filters(select(UserProfile), filters)
+
+def campaign_list_statement(filters: CampaignFilter):
+    statement = select(Campaign)
+    for field, value in filters.model_dump(exclude_none=True).items():
+        statement = statement.where(getattr(Campaign, field) == value)
+    return statement
+
+# --- Keyset pagination ---
+def encode_cursor(created_at: datetime, id: int) -> str:
+    payload = json.dumps([created_at.isoformat(), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_page(statement, model, cursor: Optional[str], limit: int):
+    # Newest first; (created_at, id) is unique and stable under inserts,
+    # unlike OFFSET which rescans every skipped row
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        statement = statement.where(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < id)
+        ))
+    # One extra row tells us whether there is a next page
+    return statement.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+def split_page(rows: List[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = list(rows[:limit])
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+# --- Projection ---
+def parse_fields(fields: Optional[str], schema) -> Optional[Projection]:
+    if not fields:
+        return None
+    projection: Projection = {}
+    for field in (f.strip() for f in fields.split(",")):
+        if not field:
+            continue
+        name, _, nested = field.partition(".")
+        if name not in schema.model_fields:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+        if not nested:
+            projection[name] = None
+        elif name in projection and projection[name] is None:
+            continue
+        else:
+            projection.setdefault(name, set()).add(nested)
+    return projection
+
+@lru_cache(maxsize=None)
+def _field_adapter(schema, field: str) -> TypeAdapter:
+    return TypeAdapter(schema.model_fields[field].annotation)
+
+def _dump(schema, field: str, value: Any, nested: Optional[Set[str]]) -> Any:
+    if nested is None:
+        # Whole field: same shape the response_model would produce
+        adapter = _field_adapter(schema, field)
+        return adapter.dump_python(adapter.validate_python(value, from_attributes=True), mode="json")
+    if value is None:
+        return None
+    return {
+        key: sub.model_dump() if isinstance(sub, SQLModel) else sub
+        for key, sub in ((key, getattr(value, key, None)) for key in nested)
+    }
+
+def project(row: SQLModel, projection: Projection, schema) -> Dict[str, Any]:
+    return {field: _dump(schema, field, getattr(row, field, None), nested) for field, nested in projection.items()}
+
+def serialize_row(row: SQLModel, projection: Optional[Projection], schema) -> Dict[str, Any]:
+    return to_dict(row, schema) if projection is None else project(row, projection, schema)
+
+def page_response(rows: List[Any], next_cursor: Optional[str], projection: Optional[Projection], schema, response):
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    if projection is None and not FAST_JSON:
+        response.headers.update(headers)
+        return rows
+    # Returning a response skips response_model validation: the dicts are
+    # already in its shape, and projected rows lack the relationships the
+    # caller chose not to load
+    return json_response([serialize_row(row, projection, schema) for row in rows], headers=headers)
+
+# --- Streaming ---
+# Every row matching the statement from `cursor` on, one keyset page of
+# STREAM_BATCH_SIZE at a time. Each page uses its own short session, so the
+# identity map stays small and no connection is held while the client reads.
+def iter_pages(statement, model, cursor: Optional[str], projection: Optional[Projection], schema) -> Iterator[List[Dict[str, Any]]]:
+    while True:
+        with Session(engine) as session:
+            rows, cursor = split_page(session.exec(keyset_page(statement, model, cursor, STREAM_BATCH_SIZE)).all(), STREAM_BATCH_SIZE)
+            page = [serialize_row(row, projection, schema) for row in rows]
+        yield page
+        if cursor is None:
+            return
+
+async def iter_pages_async(statement, model, cursor: Optional[str], projection: Optional[Projection], schema) -> AsyncIterator[List[Dict[str, Any]]]:
+    while True:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            rows, cursor = split_page((await session.exec(keyset_page(statement, model, cursor, STREAM_BATCH_SIZE))).all(), STREAM_BATCH_SIZE)
+            page = [serialize_row(row, projection, schema) for row in rows]
+        yield page
+        if cursor is None:
+            return
@@ -0,0 +1,136 @@
+from typing import Optional, List, Dict, Literal
+from datetime import datetime
+
+try:
+    from backend.models import (
+        UserProfileBase, UserDemographicsBase, UserPsychographicsBase, UserLifestyleBase, UserMediaPreferencesBase,
+        ProductBase, CampaignBase, CampaignVariantBase, GenerationJobBase, ExportJobBase
+    )
+except ImportError:
+    from models import (
+        UserProfileBase, UserDemographicsBase, UserPsychographicsBase, UserLifestyleBase, UserMediaPreferencesBase,
+        ProductBase, CampaignBase, CampaignVariantBase, GenerationJobBase, ExportJobBase
+    )
+from sqlmodel import SQLModel, Field
+
+# --- Response Models ---
+class UserProfileCreate(UserProfileBase):
+    demographics: Optional[UserDemographicsBase] = None
+    psychographics: Optional[UserPsychographicsBase] = None
+    lifestyle: Optional[UserLifestyleBase] = None
+    media_preferences: Optional[UserMediaPreferencesBase] = None
+
+class UserProfileRead(UserProfileBase):
+    id: int
+    demographics: Optional[UserDemographicsBase] = None
+    psychographics: Optional[UserPsychographicsBase] = None
+    lifestyle: Optional[UserLifestyleBase] = None
+    media_preferences: Optional[UserMediaPreferencesBase] = None
+
+class UserProfileUpdate(SQLModel):
+    name: Optional[str] = None
+    demographics: Optional[UserDemographicsBase] = None
+    psychographics: Optional[UserPsychographicsBase] = None
+    lifestyle: Optional[UserLifestyleBase] = None
+    media_preferences: Optional[UserMediaPreferencesBase] = None
+
+class CampaignRead(CampaignBase):
+    id: int
+    user: UserProfileRead
+    product: ProductBase
+
+class CampaignVariantRead(CampaignVariantBase):
+    id: int
+    campaign_id: int
+
+class GenerationJobRead(GenerationJobBase):
+    id: int
+
+class ExportCreate(SQLModel):
+    format: Literal["parquet", "arrow"] = "parquet"
+    since: Optional[datetime] = None
+
+class ExportJobRead(ExportJobBase):
+    id: int
+
+class CampaignGenerationResult(SQLModel):
+    campaign_id: int
+    user_id: Optional[int] = None
+    status: str
+    creative_persona: Optional[Dict] = None
+    sora_prompt: Optional[str] = None
+    error: Optional[str] = None
+    segment_key: Optional[str] = None
+
+class UserImportError(SQLModel):
+    line: int # 1-based line in the uploaded file
+    error: str
+
+class UserImportResult(SQLModel):
+    received: int # non-blank records read
+    imported: int
+    failed: int
+    errors: List[UserImportError] # the first IMPORT_MAX_ERRORS failures
+    errors_truncated: bool = False
+
+class LookalikeRead(SQLModel):
+    user_id: int
+    score: float # cosine similarity, 1.0 = identical profile
+
+class SegmentRead(SQLModel):
+    id: int
+    size: int
+    top_features: List[str]
+    sample_user_ids: List[int]
+
+class SegmentationRead(SQLModel):
+    k: int
+    iterations: int
+    elapsed_ms: float
+    created_at: datetime
+    segments: List[SegmentRead]
+
+# --- Filter Models ---
+class UserProfileFilter(SQLModel):
+    # Demographics, exact match
+    country: Optional[str] = None
+    age_range: Optional[str] = None
+    gender_identity: Optional[str] = None
+    location_type: Optional[str] = None
+    # List attributes, matched when the list contains the value
+    value: Optional[str] = None
+    hobby: Optional[str] = None
+    preferred_platform: Optional[str] = None
+
+class CampaignFilter(SQLModel):
+    status: Optional[str] = None
+    platform: Optional[str] = None
+    user_id: Optional[int] = None
+    product_id: Optional[int] = None
+
+class CampaignBatchCreate(SQLModel):
+    product_id: int
+    # Target users, either listed explicitly or selected by demographics
+    user_ids: Optional[List[int]] = None
+    filter: Optional[UserProfileFilter] = None
+    objective: str = "awareness"
+    platform: str = "instagram"
+    duration_seconds: int = 15
+    brand_tone: Optional[str] = None
+    cta_style: Optional[str] = None
+    product_intent: Dict[str, str] = {}
+    generate: bool = True
+    # Segment-level generation: one persona/Sora chain per group of users,
+    # either with equal `group_fields` ("exact") or whose profile vectors
+    # are at least `similarity_threshold` alike ("similarity")
+    group_by: Optional[Literal["exact", "similarity"]] = None
+    group_fields: Optional[List[str]] = None
+    similarity_threshold: float = Field(default=0.9, ge=0, le=1)
+
+class CampaignVariantSpec(SQLModel):
+    platform: str = Field(min_length=1)
+    duration_seconds: int = Field(default=15, ge=1)
+
+class CampaignVariantsCreate(SQLModel):
+    # One persona for the campaign, then a Sora prompt per placement
+    variants: List[CampaignVariantSpec] = Field(min_length=1, max_length=10)
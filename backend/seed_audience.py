@@ -0,0 +1,264 @@
+import io
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from bisect import bisect
+from itertools import accumulate
+from typing import Any, Dict, List, Sequence, Tuple
+from sqlalchemy import func, select, text
+
+try:
+    from backend.database import engine
+    from backend.migrate import migrate
+    from backend.models import UserProfile, UserDemographics, UserPsychographics, UserLifestyle, UserMediaPreferences
+except ImportError:
+    from database import engine
+    from migrate import migrate
+    from models import UserProfile, UserDemographics, UserPsychographics, UserLifestyle, UserMediaPreferences
+
+# Seeds synthetic audiences for load and query testing:
+#   python seed_audience.py --profiles 1000000 --workers 4
+# Every profile gets all four 1:1 tables. Values are drawn from the same
+# vocabulary as seed.py, and each batch has its own RNG derived from --seed
+# and its index, so a given seed and batch size produce the same data for
+# any number of workers. PostgreSQL is loaded with COPY, other databases with executemany
+# INSERTs; each batch is one transaction.
+
+# Weighted vocabularies (value -> relative weight)
+AGE_RANGES = {"18-24": 22, "25-34": 30, "35-44": 22, "45-54": 14, "55-64": 8, "65+": 4}
+GENDER_IDENTITIES = {"Female": 48, "Male": 48, "Non-binary": 3, "Prefer not to say": 1}
+LOCATION_TYPES = {"Urban": 55, "Suburban": 33, "Rural": 12}
+# Country -> (weight, language, regions)
+COUNTRIES = {
+    "USA": (30, "English", ["San Francisco, CA", "New York, NY", "Austin, TX", "Chicago, IL", "Seattle, WA"]),
+    "UK": (12, "English", ["London", "Manchester", "Edinburgh", "Bristol"]),
+    "Spain": (8, "English / Spanish", ["Barcelona", "Madrid", "Valencia", "Seville"]),
+    "Nigeria": (8, "English", ["Lagos", "Abuja", "Port Harcourt"]),
+    "Germany": (10, "German", ["Berlin", "Munich", "Hamburg"]),
+    "India": (14, "English / Hindi", ["Bengaluru", "Mumbai", "Delhi"]),
+    "Brazil": (10, "Portuguese", ["São Paulo", "Rio de Janeiro", "Belo Horizonte"]),
+    "Japan": (8, "Japanese", ["Tokyo", "Osaka", "Fukuoka"]),
+}
+
+VALUES = ["Innovation", "Efficiency", "Growth", "Sustainability", "Creativity", "Community", "Family", "Security",
+          "Reliability", "Wealth", "Status", "Ambition", "Wellness", "Adventure", "Authenticity", "Tradition"]
+MOTIVATIONS = ["Staying ahead of trends", "Productivity", "Expressing individuality", "Helping the planet",
+               "Providing for family", "Saving time", "Building a legacy", "Financial freedom", "Feeling healthy",
+               "Social recognition", "Learning new skills"]
+PERSONALITY_TRAITS = ["Openness", "Conscientiousness", "Extraversion", "Agreeableness", "Neuroticism"]
+DECISION_MAKING_STYLES = {"Analytical": 30, "Intuitive": 25, "Deliberate": 25, "Bold": 12, "Impulsive": 8}
+RISK_TOLERANCES = {"Low": 25, "Moderate": 40, "High": 25, "Very High": 10}
+
+# Occupation -> industry
+OCCUPATIONS = {
+    "Software Engineer": "Tech", "Product Manager": "Tech", "Data Scientist": "Tech",
+    "Graphic Designer": "Design", "Architect": "Design", "HR Manager": "Corporate", "Accountant": "Finance",
+    "Entrepreneur": "Fintech", "Teacher": "Education", "Nurse": "Healthcare", "Student": "Education",
+    "Sales Associate": "Retail", "Chef": "Hospitality", "Marketing Manager": "Marketing",
+}
+HOBBIES = ["Coding", "Hiking", "Gaming", "Painting", "Yoga", "Thrifting", "Gardening", "Cooking", "Reading",
+           "Networking", "Traveling", "Fitness", "Photography", "Running", "Music", "Cycling"]
+DAILY_ENVIRONMENTS = ["Home Office", "Co-working spaces", "Art Studio", "Cafes", "Office", "Home",
+                      "Business District", "Gym", "Campus", "Outdoors"]
+TECH_SAVVINESS = {"Low": 10, "Average": 45, "High": 45}
+
+PLATFORMS = {"Instagram": 30, "TikTok": 25, "YouTube": 20, "Facebook": 12, "Twitter": 6, "LinkedIn": 4, "Reddit": 2, "Pinterest": 1}
+VISUAL_STYLES = ["Minimalist", "Artistic", "Warm & Inviting", "Professional", "Cinematic", "Playful", "Retro"]
+MUSIC_PREFERENCES = ["Lo-fi", "Electronic", "Indie", "Alternative", "Pop", "Soft Rock", "Afrobeats", "Hip Hop",
+                     "Jazz", "Classical", "Latin"]
+AD_DURATION_PREFERENCES = ["Short < 15s", "Visual-heavy", "Informative", "Direct"]
+
+FIRST_NAMES = ["Alex", "Maya", "Sarah", "David", "Priya", "Lucas", "Amara", "Kenji", "Sofia", "Omar", "Hannah",
+               "Mateo", "Chloe", "Tunde", "Aisha", "Leon", "Yuki", "Carlos", "Emma", "Ravi"]
+LAST_NAMES = ["Chen", "Rodriguez", "Jenkins", "Okafor", "Sharma", "Müller", "Silva", "Tanaka", "Garcia", "Smith",
+              "Haddad", "Nguyen", "Adeyemi", "Rossi", "Kim", "Patel", "Johnson", "Fernández", "Schmidt", "Ito"]
+
+SUB_TABLES = (UserDemographics, UserPsychographics, UserLifestyle, UserMediaPreferences)
+
+def _weighted(options: Dict[str, Any]) -> Tuple[List[str], List[float]]:
+    keys = list(options)
+    weights = [value[0] if isinstance(value, tuple) else value for value in options.values()]
+    cumulative = list(accumulate(weights))
+    return keys, [weight / cumulative[-1] for weight in cumulative]
+
+_AGE_RANGES = _weighted(AGE_RANGES)
+_GENDER_IDENTITIES = _weighted(GENDER_IDENTITIES)
+_LOCATION_TYPES = _weighted(LOCATION_TYPES)
+_COUNTRIES = _weighted(COUNTRIES)
+_DECISION_MAKING_STYLES = _weighted(DECISION_MAKING_STYLES)
+_RISK_TOLERANCES = _weighted(RISK_TOLERANCES)
+_TECH_SAVVINESS = _weighted(TECH_SAVVINESS)
+_PLATFORMS = _weighted(PLATFORMS)
+_OCCUPATIONS = list(OCCUPATIONS)
+
+# The helpers below draw from rng.random() directly: choices()/randint() are
+# several times slower and generation would dominate the load time
+def _pick(rng: random.Random, weighted: Tuple[List[str], List[float]]) -> str:
+    keys, cumulative = weighted
+    return keys[bisect(cumulative, rng.random())]
+
+def _one(rng: random.Random, population: Sequence[str]) -> str:
+    return population[int(rng.random() * len(population))]
+
+def _count(rng: random.Random, low: int, high: int) -> int:
+    return low + int(rng.random() * (high - low + 1))
+
+def _some(rng: random.Random, population: Sequence[str], low: int, high: int) -> List[str]:
+    # Distinct draws by rejection; cheap since k is small next to the population
+    count = _count(rng, low, high)
+    chosen = {}
+    while len(chosen) < count:
+        chosen[_one(rng, population)] = None
+    return list(chosen)
+
+def _platforms(rng: random.Random) -> List[str]:
+    # Weighted draws without repeats, so popular platforms dominate audiences
+    return list(dict.fromkeys(_pick(rng, _PLATFORMS) for _ in range(_count(rng, 1, 4))))
+
+def generate_batch(seed: int, batch: int, first_id: int, count: int, anchor: datetime, days: int) -> Dict[str, List[Dict[str, Any]]]:
+    rng = random.Random(f"{seed}:{batch}")
+    rows = {table.__tablename__: [] for table in (UserProfile, *SUB_TABLES)}
+    for user_id in range(first_id, first_id + count):
+        country = _pick(rng, _COUNTRIES)
+        _, language, regions = COUNTRIES[country]
+        occupation = _one(rng, _OCCUPATIONS)
+        rows["userprofile"].append({
+            "id": user_id,
+            "name": f"{_one(rng, FIRST_NAMES)} {_one(rng, LAST_NAMES)}",
+            "created_at": anchor - timedelta(seconds=rng.uniform(0, days * 86400)),
+        })
+        rows["userdemographics"].append({
+            "user_id": user_id,
+            "age_range": _pick(rng, _AGE_RANGES),
+            "gender_identity": _pick(rng, _GENDER_IDENTITIES),
+            "language": language,
+            "country": country,
+            "region": _one(rng, regions),
+            "location_type": _pick(rng, _LOCATION_TYPES),
+        })
+        rows["userpsychographics"].append({
+            "user_id": user_id,
+            "values": _some(rng, VALUES, 2, 4),
+            "motivations": _some(rng, MOTIVATIONS, 1, 3),
+            "personality_traits": {trait: _count(rng, 20, 99) for trait in _some(rng, PERSONALITY_TRAITS, 2, 3)},
+            "decision_making_style": _pick(rng, _DECISION_MAKING_STYLES),
+            "risk_tolerance": _pick(rng, _RISK_TOLERANCES),
+        })
+        rows["userlifestyle"].append({
+            "user_id": user_id,
+            "occupation": occupation,
+            "industry": OCCUPATIONS[occupation],
+            "hobbies": _some(rng, HOBBIES, 1, 4),
+            "daily_environments": _some(rng, DAILY_ENVIRONMENTS, 1, 3),
+            "tech_savviness": _pick(rng, _TECH_SAVVINESS),
+        })
+        rows["usermediapreferences"].append({
+            "user_id": user_id,
+            "preferred_platforms": _platforms(rng),
+            "visual_visual_style": _one(rng, VISUAL_STYLES),
+            "music_preferences": _some(rng, MUSIC_PREFERENCES, 1, 3),
+            "ad_duration_preference": _one(rng, AD_DURATION_PREFERENCES),
+        })
+    return rows
+
+def _copy(cursor, table: str, rows: List[Dict[str, Any]]):
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([json.dumps(value) if isinstance(value, (list, dict)) else value for value in row.values()])
+    buffer.seek(0)
+    quoted = ", ".join(f'"{column}"' for column in columns)
+    cursor.copy_expert(f'COPY "{table}" ({quoted}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+def write_batch(rows: Dict[str, List[Dict[str, Any]]]):
+    if engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2":
+        connection = engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                for table, table_rows in rows.items():
+                    _copy(cursor, table, table_rows)
+            connection.commit()
+        finally:
+            connection.close()
+        return
+    tables = {table.__tablename__: table.__table__ for table in (UserProfile, *SUB_TABLES)}
+    with engine.begin() as conn:
+        for table, table_rows in rows.items():
+            conn.execute(tables[table].insert(), table_rows)
+
+def seed_batch(seed: int, batch: int, first_id: int, count: int, anchor: datetime, days: int) -> int:
+    write_batch(generate_batch(seed, batch, first_id, count, anchor, days))
+    return count
+
+def _reset_sequence():
+    # Profile ids were assigned explicitly, so move the serial past them
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        conn.execute(text("SELECT setval(pg_get_serial_sequence('userprofile', 'id'), (SELECT MAX(id) FROM userprofile))"))
+
+def _progress(done: int, total: int, started: float):
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed else 0
+    eta = (total - done) / rate if rate else 0
+    sys.stderr.write(f"\r{done:>{len(str(total))}}/{total} profiles  {rate:,.0f} profiles/s  "
+                     f"{rate * (1 + len(SUB_TABLES)):,.0f} rows/s  ETA {eta:,.0f}s ")
+    sys.stderr.flush()
+
+def seed_audience(profiles: int, batch_size: int = 10000, workers: int = 1, seed: int = 42, days: int = 365):
+    migrate()
+    # SQLite allows a single writer, so its workers only generate batches and
+    # the parent writes them; elsewhere each worker writes its own batches
+    parallel_writes = engine.dialect.name != "sqlite"
+
+    # Ids are assigned up front so sub-table rows can reference them without
+    # a RETURNING round trip, and so batches can be written in any order
+    with engine.connect() as conn:
+        first_id = (conn.execute(select(func.max(UserProfile.id))).scalar() or 0) + 1
+    anchor = datetime.utcnow()
+    batches = [
+        (seed, batch, first_id + offset, min(batch_size, profiles - offset), anchor, days)
+        for batch, offset in enumerate(range(0, profiles, batch_size))
+    ]
+
+    print(f"Seeding {profiles} profiles in {len(batches)} batches across {workers} worker(s) (seed {seed})...")
+    started = time.perf_counter()
+    done = 0
+    if workers == 1:
+        for batch in batches:
+            done += seed_batch(*batch)
+            _progress(done, profiles, started)
+    else:
+        # spawn: each worker opens its own connections instead of sharing the parent's pool
+        task = seed_batch if parallel_writes else generate_batch
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for future in as_completed([pool.submit(task, *batch) for batch in batches]):
+                result = future.result()
+                if not parallel_writes:
+                    write_batch(result)
+                    result = len(result["userprofile"])
+                done += result
+                _progress(done, profiles, started)
+    elapsed = time.perf_counter() - started
+    sys.stderr.write("\n")
+
+    _reset_sequence()
+    rows = profiles * (1 + len(SUB_TABLES))
+    print(f"Seeded {profiles} profiles ({rows} rows) in {elapsed:.1f}s: {rows / elapsed:,.0f} rows/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed synthetic user profiles in bulk")
+    parser.add_argument("--profiles", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=365, help="spread created_at over this many past days")
+    args = parser.parse_args()
+    seed_audience(args.profiles, args.batch_size, args.workers, args.seed, args.days)
@@ -0,0 +1,392 @@
+import os
+import math
+import time
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from sqlmodel import Session, select
+
+try:
+    from backend.database import engine
+    from backend.models import UserProfile, UserDemographics, UserPsychographics, UserLifestyle, UserMediaPreferences
+except ImportError:
+    from database import engine
+    from models import UserProfile, UserDemographics, UserPsychographics, UserLifestyle, UserMediaPreferences
+
+# Build the index in the background at startup instead of on first use
+SEGMENT_INDEX_PRELOAD = os.getenv("SEGMENT_INDEX_PRELOAD", "false").lower() == "true"
+SEGMENT_LOAD_BATCH_SIZE = int(os.getenv("SEGMENT_LOAD_BATCH_SIZE", "10000"))
+# Clusters are fitted on a random sample, then every profile is assigned
+SEGMENT_SAMPLE_SIZE = int(os.getenv("SEGMENT_SAMPLE_SIZE", "100000"))
+# Distinct values that get a feature column, per attribute. Free-text
+# attributes (occupation, hobbies, ...) can have thousands; values past the
+# limit are left out of the vector so the matrix stays a bounded width
+SEGMENT_MAX_VALUES_PER_FIELD = int(os.getenv("SEGMENT_MAX_VALUES_PER_FIELD", "64"))
+
+# Profile attributes that make up the feature vector, with their weight.
+# Single-valued fields are one-hot, list fields multi-hot; each field is
+# scaled to unit length first so long lists don't outweigh single values.
+CATEGORICAL_FIELDS = {
+    "age_range": (UserDemographics.age_range, 1.0),
+    "gender_identity": (UserDemographics.gender_identity, 0.5),
+    "country": (UserDemographics.country, 1.0),
+    "location_type": (UserDemographics.location_type, 0.5),
+    "decision_making_style": (UserPsychographics.decision_making_style, 0.5),
+    "risk_tolerance": (UserPsychographics.risk_tolerance, 0.5),
+    "occupation": (UserLifestyle.occupation, 0.5),
+    "industry": (UserLifestyle.industry, 0.5),
+    "tech_savviness": (UserLifestyle.tech_savviness, 0.5),
+    "visual_visual_style": (UserMediaPreferences.visual_visual_style, 0.5),
+    "ad_duration_preference": (UserMediaPreferences.ad_duration_preference, 0.5),
+}
+LIST_FIELDS = {
+    "values": (UserPsychographics.values, 1.0),
+    "motivations": (UserPsychographics.motivations, 0.75),
+    "hobbies": (UserLifestyle.hobbies, 0.75),
+    "daily_environments": (UserLifestyle.daily_environments, 0.5),
+    "preferred_platforms": (UserMediaPreferences.preferred_platforms, 1.0),
+    "music_preferences": (UserMediaPreferences.music_preferences, 0.5),
+}
+# Scores are centred on the midpoint, so a missing trait counts as neutral
+TRAITS_FIELD = ("personality_traits", UserPsychographics.personality_traits, 1.0)
+
+PROFILE_RELATIONS = {
+    "demographics": UserDemographics,
+    "psychographics": UserPsychographics,
+    "lifestyle": UserLifestyle,
+    "media_preferences": UserMediaPreferences,
+}
+
+def profile_fields(user: UserProfile) -> Dict[str, Any]:
+    # Flattens a loaded profile into the attribute names used above
+    fields = {}
+    for relation in PROFILE_RELATIONS:
+        related = getattr(user, relation)
+        if related is not None:
+            fields.update(related.model_dump())
+    return fields
+
+def _normalize(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip().lower()
+    return value or None
+
+def _trait_scores(traits: Optional[Dict[str, Any]]) -> Dict[str, float]:
+    # Profiles use both 0-10 and 0-100 scales
+    scores = {_normalize(name): float(score) for name, score in (traits or {}).items() if isinstance(score, (int, float))}
+    scale = 10.0 if scores and max(scores.values()) <= 10 else 100.0
+    return {name: min(max(score / scale, 0.0), 1.0) - 0.5 for name, score in scores.items() if name}
+
+@dataclass
+class Segmentation:
+    k: int
+    centroids: np.ndarray
+    iterations: int
+    elapsed_ms: float
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+class SegmentIndex:
+    """
+    Keeps every profile as a row of a float32 matrix of L2-normalised feature
+    vectors, so cosine similarity is a single matrix-vector product. Feature
+    columns are allocated as new attribute values appear, up to
+    SEGMENT_MAX_VALUES_PER_FIELD per attribute; rows and columns grow
+    geometrically so single upserts stay cheap.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._columns: Dict[Tuple[str, str], int] = {}
+        self._field_values: Dict[str, int] = {}
+        self._raw_columns: Dict[Tuple[str, Any], Optional[int]] = {}
+        self._matrix = np.zeros((1024, 64), dtype=np.float32)
+        self._user_ids = np.zeros(1024, dtype=np.int64)
+        self._labels = np.full(1024, -1, dtype=np.int32)
+        self._rows: Dict[int, int] = {}
+        self._size = 0
+        self._state = "empty" # empty -> loading -> ready
+        self._ready = threading.Event()
+        self._pending: List[Tuple[int, Dict[str, Any]]] = []
+        self.segmentation: Optional[Segmentation] = None
+
+    # --- Encoding ---
+    def _column(self, group: str, raw: Any) -> Optional[int]:
+        # Cached on the raw value, so repeated values skip normalisation
+        key = (group, raw)
+        if key in self._raw_columns:
+            return self._raw_columns[key]
+        value = _normalize(raw)
+        column = None
+        if value is not None:
+            column = self._columns.get((group, value))
+            if column is None and self._field_values.get(group, 0) < SEGMENT_MAX_VALUES_PER_FIELD:
+                column = self._columns[(group, value)] = len(self._columns)
+                self._field_values[group] = self._field_values.get(group, 0) + 1
+                if column >= self._matrix.shape[1]:
+                    self._matrix = np.pad(self._matrix, ((0, 0), (0, self._matrix.shape[1])))
+            if column is None:
+                # Values past the cap are not cached, so the cache stays bounded by the columns
+                return None
+        self._raw_columns[key] = column
+        return column
+
+    def _encode(self, fields: Dict[str, Any]) -> Tuple[List[int], List[float]]:
+        # Sparse (columns, weights) for one profile, before normalisation
+        columns, weights = [], []
+        for name, (_, weight) in CATEGORICAL_FIELDS.items():
+            value = fields.get(name)
+            column = self._column(name, value) if value is not None else None
+            if column is not None:
+                columns.append(column)
+                weights.append(weight)
+        for name, (_, weight) in LIST_FIELDS.items():
+            values = {self._column(name, value) for value in fields.get(name) or [] if value is not None} - {None}
+            if values:
+                columns.extend(values)
+                weights.extend([weight / math.sqrt(len(values))] * len(values))
+        name, _, weight = TRAITS_FIELD
+        for trait, score in _trait_scores(fields.get(name)).items():
+            column = self._column(name, trait)
+            if column is not None:
+                columns.append(column)
+                weights.append(weight * score)
+        return columns, weights
+
+    def _grow_rows(self, needed: int):
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        extra = capacity - self._matrix.shape[0]
+        self._matrix = np.pad(self._matrix, ((0, extra), (0, 0)))
+        self._user_ids = np.pad(self._user_ids, (0, extra))
+        self._labels = np.pad(self._labels, (0, extra), constant_values=-1)
+
+    def _write(self, profiles: List[Tuple[int, Dict[str, Any]]]) -> np.ndarray:
+        # Encodes a batch of profiles into their rows with a few array operations
+        self._grow_rows(self._size + len(profiles))
+        rows, entry_rows, entry_columns, entry_weights = [], [], [], []
+        for user_id, fields in profiles:
+            row = self._rows.get(user_id)
+            if row is None:
+                row = self._rows[user_id] = self._size
+                self._user_ids[row] = user_id
+                self._size += 1
+            columns, weights = self._encode(fields)
+            rows.append(row)
+            entry_rows.extend([row] * len(columns))
+            entry_columns.extend(columns)
+            entry_weights.extend(weights)
+        rows = np.asarray(rows, dtype=np.int64)
+        self._matrix[rows] = 0
+        self._matrix[entry_rows, entry_columns] = entry_weights
+        norms = np.linalg.norm(self._matrix[rows], axis=1)
+        self._matrix[rows] /= np.where(norms == 0, 1, norms)[:, None]
+        return rows
+
+    # --- Loading and updates ---
+    def _profile_rows(self):
+        columns = [column for column, _ in CATEGORICAL_FIELDS.values()] + [column for column, _ in LIST_FIELDS.values()]
+        statement = select(UserProfile.id, *columns, TRAITS_FIELD[1])
+        for model in PROFILE_RELATIONS.values():
+            statement = statement.outerjoin(model, model.user_id == UserProfile.id)
+        with Session(engine) as session:
+            result = session.exec(statement.execution_options(yield_per=SEGMENT_LOAD_BATCH_SIZE))
+            names = ["id", *CATEGORICAL_FIELDS, *LIST_FIELDS, TRAITS_FIELD[0]]
+            for row in result:
+                yield dict(zip(names, row))
+
+    def ensure_loaded(self):
+        # Builds the matrix from the database once; concurrent callers wait
+        with self._lock:
+            if self._state == "ready":
+                return
+            loading = self._state == "loading"
+            self._state = "loading"
+            ready = self._ready
+        if loading:
+            ready.wait()
+            if self._state != "ready":
+                raise RuntimeError("Segment index failed to load")
+            return
+
+        start = time.perf_counter()
+        print("Building segment index...")
+        try:
+            batch = []
+            for fields in self._profile_rows():
+                batch.append((fields["id"], fields))
+                if len(batch) == SEGMENT_LOAD_BATCH_SIZE:
+                    with self._lock:
+                        self._write(batch)
+                    batch = []
+            with self._lock:
+                # Profiles written while the load was running may be newer than what it read
+                self._write(batch + self._pending)
+                self._pending.clear()
+                self._state = "ready"
+        except Exception:
+            # Back to empty so the next call retries; waiters are released
+            # with the old event and see the load failed
+            with self._lock:
+                self._reset()
+            raise
+        finally:
+            ready.set()
+        print(f"Segment index ready: {self._size} profiles, {len(self._columns)} features in {time.perf_counter() - start:.1f}s")
+
+    def upsert(self, user: UserProfile):
+        # Call after a profile is created or changed
+        self.upsert_many([(user.id, profile_fields(user))])
+
+    def upsert_many(self, profiles: List[Tuple[int, Dict[str, Any]]]):
+        # (user id, profile_fields()-style attributes) for each written profile
+        if not profiles:
+            return
+        with self._lock:
+            if self._state == "loading":
+                self._pending.extend(profiles)
+            elif self._state == "ready":
+                rows = self._write(profiles)
+                if self.segmentation is not None:
+                    self._labels[rows] = self._assign(self._matrix[rows])
+            # Not loaded yet: the load will read it from the database
+
+    def rebuild(self):
+        with self._lock:
+            if self._state == "loading":
+                return
+            self._reset()
+        self.ensure_loaded()
+
+    def _snapshot(self, user_id: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, Optional[int]]:
+        with self._lock:
+            # Unused columns are zero, so a row slice gives the same dot products
+            # and stays contiguous. The row of user_id is read under the same lock,
+            # so it indexes this matrix even if a reload swaps it afterwards
+            return self._matrix[:self._size], self._user_ids[:self._size], self._rows.get(user_id)
+
+    # --- Queries ---
+    def vectors(self, user_ids: List[int]) -> Tuple[List[int], np.ndarray]:
+        # Feature rows of the given users that are indexed, in the given order
+        self.ensure_loaded()
+        with self._lock:
+            found = [user_id for user_id in user_ids if user_id in self._rows]
+            return found, self._matrix[[self._rows[user_id] for user_id in found]]
+
+    def lookalikes(self, user_id: int, k: int = 10) -> List[Tuple[int, float]]:
+        self.ensure_loaded()
+        matrix, user_ids, row = self._snapshot(user_id)
+        if row is None:
+            raise KeyError(user_id)
+        scores = matrix @ matrix[row]
+        scores[row] = -np.inf
+        k = min(k, len(scores) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(int(user_ids[i]), float(scores[i])) for i in top]
+
+    def _assign(self, rows: np.ndarray, chunk: int = 100000) -> np.ndarray:
+        # Nearest centroid by cosine similarity, in chunks to bound memory
+        centroids = self.segmentation.centroids
+        width = min(rows.shape[1], centroids.shape[1])
+        labels = np.empty(len(rows), dtype=np.int32)
+        for start in range(0, len(rows), chunk):
+            labels[start:start + chunk] = np.argmax(rows[start:start + chunk, :width] @ centroids[:, :width].T, axis=1)
+        return labels
+
+    def cluster(self, k: int, seed: int = 0, max_iter: int = 25, sample_size: int = SEGMENT_SAMPLE_SIZE) -> Segmentation:
+        # Spherical k-means (cosine) with k-means++ seeding
+        self.ensure_loaded()
+        matrix, _, _ = self._snapshot()
+        if len(matrix) < k:
+            raise ValueError(f"Need at least {k} profiles to build {k} segments")
+        start = time.perf_counter()
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(len(matrix), min(len(matrix), sample_size), replace=False)] if len(matrix) > sample_size else matrix
+
+        centroids = np.empty((k, sample.shape[1]), dtype=np.float32)
+        centroids[0] = sample[rng.integers(len(sample))]
+        distance = 1 - sample @ centroids[0]
+        for i in range(1, k):
+            weights = np.maximum(distance, 0) ** 2
+            total = weights.sum()
+            index = rng.choice(len(sample), p=weights / total) if total > 0 else rng.integers(len(sample))
+            centroids[i] = sample[index]
+            distance = np.minimum(distance, 1 - sample @ centroids[i])
+
+        labels = None
+        for iterations in range(1, max_iter + 1):
+            similarity = sample @ centroids.T
+            new_labels = np.argmax(similarity, axis=1)
+            if labels is not None and np.array_equal(labels, new_labels):
+                break
+            labels = new_labels
+            # Per-cluster sums as one (k x n) @ (n x d) product
+            membership = np.zeros((k, len(sample)), dtype=np.float32)
+            membership[labels, np.arange(len(sample))] = 1
+            sums = membership @ sample
+            empty = ~membership.any(axis=1)
+            if empty.any():
+                # Re-seed empty clusters with the worst-fitting points
+                worst = np.argsort(similarity[np.arange(len(sample)), labels])[:empty.sum()]
+                sums[empty] = sample[worst]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.where(norms == 0, 1, norms)
+
+        segmentation = Segmentation(k=k, centroids=centroids, iterations=iterations, elapsed_ms=0.0)
+        with self._lock:
+            self.segmentation = segmentation
+            self._labels[:self._size] = self._assign(self._matrix[:self._size])
+        segmentation.elapsed_ms = (time.perf_counter() - start) * 1000
+        return segmentation
+
+    def _require_segmentation(self) -> Segmentation:
+        if self.segmentation is None:
+            raise LookupError("No segmentation has been computed")
+        return self.segmentation
+
+    def members(self, segment: int) -> np.ndarray:
+        self._require_segmentation()
+        with self._lock:
+            return self._user_ids[:self._size][self._labels[:self._size] == segment]
+
+    def summary(self, top_features: int = 5, sample_members: int = 10) -> List[Dict[str, Any]]:
+        segmentation = self._require_segmentation()
+        names = {column: f"{group}={value}" for (group, value), column in self._columns.items() if group != TRAITS_FIELD[0]}
+        with self._lock:
+            labels = self._labels[:self._size]
+            user_ids = self._user_ids[:self._size]
+            sizes = np.bincount(labels[labels >= 0], minlength=segmentation.k)
+        segments = []
+        for segment, centroid in enumerate(segmentation.centroids):
+            # Only attributes the segment leans towards, not ones its members lack
+            ranked = [column for column in np.argsort(centroid)[::-1] if column in names and centroid[column] > 0][:top_features]
+            segments.append({
+                "id": segment,
+                "size": int(sizes[segment]),
+                "top_features": [names[column] for column in ranked],
+                "sample_user_ids": user_ids[labels == segment][:sample_members].tolist(),
+            })
+        return segments
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "profiles": self._size,
+                "features": len(self._columns),
+                "matrix_bytes": int(self._size * self._matrix.shape[1] * self._matrix.itemsize),
+                "segments": self.segmentation.k if self.segmentation else None,
+            }
+
+segment_index = SegmentIndex()
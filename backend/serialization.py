@@ -0,0 +1,95 @@
+import os
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union, get_args, get_origin
+import orjson
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+
+# List endpoints build plain dicts in the response_model's shape straight from
+# the loaded rows and encode them with orjson, instead of FastAPI validating
+# every row against the response_model and encoding it again with json.
+# FAST_JSON=false falls back to the response_model path.
+
+FAST_JSON = os.getenv("FAST_JSON", "true").lower() == "true"
+# Rows fetched per query when a list is streamed (?stream=true)
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def _model(annotation) -> Optional[type]:
+    # X or Optional[X] where X is a model, else None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    if get_origin(annotation) is Union:
+        for arg in get_args(annotation):
+            if isinstance(arg, type) and issubclass(arg, BaseModel):
+                return arg
+    return None
+
+@lru_cache(maxsize=None)
+def _plan(schema) -> Tuple[Tuple[str, Optional[type], bool], ...]:
+    # (field, nested schema, computed) for every field the schema serializes
+    fields = [(name, _model(field.annotation), False) for name, field in schema.model_fields.items()]
+    fields += [(name, None, True) for name in schema.model_computed_fields]
+    return tuple(fields)
+
+def to_dict(row: Any, schema) -> Dict[str, Any]:
+    # Loaded columns and relationships sit in the instance __dict__; reading
+    # them there skips the ORM attribute descriptors. Anything not loaded yet
+    # (and computed fields) goes through getattr as usual.
+    state = row.__dict__
+    result = {}
+    for name, nested, computed in _plan(schema):
+        value = state[name] if not computed and name in state else getattr(row, name, None)
+        if nested is not None and value is not None:
+            value = to_dict(value, nested)
+        result[name] = value
+    return result
+
+def dumps(content: Any) -> bytes:
+    # Naive datetimes come out as "YYYY-MM-DDTHH:MM:SS[.ffffff]", like Pydantic's
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+def json_response(content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(content=dumps(content), media_type="application/json", headers=headers)
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def _json_array(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    # One chunk per batch: "[" row, row ... "]"
+    separator = b"["
+    for batch in batches:
+        if batch:
+            yield separator + b",".join(dumps(row) for row in batch)
+            separator = b","
+    yield b"[]" if separator == b"[" else b"]"
+
+def _ndjson(batches: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    for batch in batches:
+        if batch:
+            yield b"".join(dumps(row) + b"\n" for row in batch)
+
+async def _json_array_async(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    separator = b"["
+    async for batch in batches:
+        if batch:
+            yield separator + b",".join(dumps(row) for row in batch)
+            separator = b","
+    yield b"[]" if separator == b"[" else b"]"
+
+async def _ndjson_async(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        if batch:
+            yield b"".join(dumps(row) + b"\n" for row in batch)
+
+def stream_response(batches, request: Request) -> StreamingResponse:
+    # A chunked JSON array, or NDJSON when the client accepts it; only one
+    # batch of rows is held in memory at a time. `batches` may be sync or async.
+    is_async = hasattr(batches, "__aiter__")
+    if wants_ndjson(request):
+        body = _ndjson_async(batches) if is_async else _ndjson(batches)
+        return StreamingResponse(body, media_type=NDJSON_MEDIA_TYPE)
+    body = _json_array_async(batches) if is_async else _json_array(batches)
+    return StreamingResponse(body, media_type="application/json")
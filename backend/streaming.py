@@ -0,0 +1,86 @@
+import json
+import asyncio
+from typing import Any, AsyncIterator
+from fastapi import Request
+
+try:
+    from backend.database import async_engine
+    from backend.llm_cache import llm_cache, cache_key
+    from backend.prompts import count_message_tokens, count_tokens, log_usage
+    from backend.jobs import save_result, save_result_async, _set_stage, _set_stage_async
+    from backend import generation
+except ImportError:
+    from database import async_engine
+    from llm_cache import llm_cache, cache_key
+    from prompts import count_message_tokens, count_tokens, log_usage
+    from jobs import save_result, save_result_async, _set_stage, _set_stage_async
+    import generation
+
+STREAM_CLOSED_ERROR = "Stream closed before generation finished"
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# The same generator serves both IO modes: LLM calls always go through the
+# async client, and in sync mode the database writes run in a worker thread
+async def _save(campaign_id: int, job_id: int, **result):
+    if async_engine is not None:
+        await save_result_async(campaign_id, job_id, **result)
+    else:
+        await asyncio.to_thread(save_result, campaign_id, job_id, **result)
+
+async def _stage(job_id: int, stage: str):
+    if async_engine is not None:
+        await _set_stage_async(job_id, stage)
+    else:
+        await asyncio.to_thread(_set_stage, job_id, stage)
+
+async def stream_campaign_generation(request: Request, campaign_id: int, job_id: int, persona_user_prompt: str, duration_seconds: int, force: bool = False) -> AsyncIterator[str]:
+    # Runs job `job_id` (created running by JobQueue.start_streamed) and emits
+    # a `persona` event once step 1 is parsed, the Sora prompt as `token`
+    # events, then `done` or `error`; the result is persisted before either.
+    # A client that goes away stops the generation, and the job and campaign
+    # are marked failed straight away rather than left processing.
+    label = f"campaign {campaign_id}"
+    result = {"error": STREAM_CLOSED_ERROR}
+    deltas = None
+    try:
+        creative_persona = await generation.generate_persona_async(persona_user_prompt, force=force, label=label)
+        if await request.is_disconnected():
+            return
+        yield sse_event("persona", creative_persona)
+        await _stage(job_id, "sora_prompt")
+
+        messages = generation.sora_messages(creative_persona, duration_seconds)
+        key = cache_key("sora_prompt", generation.OPENAI_MODEL, messages)
+        sora_prompt = None if force else await asyncio.to_thread(llm_cache.get, key)
+        if sora_prompt is not None:
+            yield sse_event("token", {"text": sora_prompt})
+        else:
+            parts = []
+            deltas = generation.stream_completion_async(messages)
+            async for delta in deltas:
+                if await request.is_disconnected():
+                    return
+                parts.append(delta)
+                yield sse_event("token", {"text": delta})
+            sora_prompt = "".join(parts)
+            # Streamed responses carry no usage, so count locally
+            log_usage(label, "sora_prompt", count_message_tokens(messages), count_tokens(sora_prompt), estimated=True)
+            await asyncio.to_thread(llm_cache.set, key, "sora_prompt", generation.OPENAI_MODEL, sora_prompt)
+        result = {"creative_persona": creative_persona, "sora_prompt": sora_prompt}
+    except Exception as e:
+        print(f"Error generation: {e}")
+        result = {"error": str(e)}
+    finally:
+        # Releases the gateway slot and the provider connection now, not when
+        # the generator is garbage-collected
+        if deltas is not None:
+            await deltas.aclose()
+        # Shielded so a cancelled (disconnected) response still records the outcome
+        await asyncio.shield(_save(campaign_id, job_id, **result))
+
+    if "error" in result:
+        yield sse_event("error", {"detail": result["error"]})
+    else:
+        yield sse_event("done", {"campaign_id": campaign_id, "status": "completed"})
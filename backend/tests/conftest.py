@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+import subprocess
+
+# Settings are read when the backend modules are imported, so the throwaway
+# database and the external job backend (enqueue only, nothing runs in the
+# background) are set up first
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'tests.db')}"
+os.environ["JOB_BACKEND"] = "external"
+os.environ["OPENAI_API_KEY"] = "mock"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest
+from sqlmodel import SQLModel, Session
+
+from backend.database import engine
+from backend.load_test import BACKEND_DIR, USER_PAYLOAD, PRODUCT_PAYLOAD, CAMPAIGN_PAYLOAD, _free_port, _wait_until_up
+from backend.models import (
+    Campaign, Product, UserProfile, UserDemographics, UserPsychographics, UserLifestyle, UserMediaPreferences
+)
+
+@pytest.fixture(autouse=True)
+def database():
+    SQLModel.metadata.create_all(engine)
+    yield
+    SQLModel.metadata.drop_all(engine)
+
+@pytest.fixture
+def session():
+    with Session(engine) as session:
+        yield session
+
+def make_user(session: Session, name: str = "Test User") -> UserProfile:
+    user = UserProfile(name=name)
+    user.demographics = UserDemographics(**USER_PAYLOAD["demographics"])
+    user.psychographics = UserPsychographics(**USER_PAYLOAD["psychographics"])
+    user.lifestyle = UserLifestyle(**USER_PAYLOAD["lifestyle"])
+    user.media_preferences = UserMediaPreferences(**USER_PAYLOAD["media_preferences"])
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    return user
+
+def make_campaign(session: Session, user: UserProfile = None, product: Product = None) -> Campaign:
+    campaign = Campaign(**CAMPAIGN_PAYLOAD, user=user or make_user(session), product=product or Product(**PRODUCT_PAYLOAD))
+    session.add(campaign)
+    session.commit()
+    session.refresh(campaign)
+    return campaign
+
+@pytest.fixture
+def campaign(session) -> Campaign:
+    return make_campaign(session)
+
+@pytest.fixture(scope="session")
+def mock_llm():
+    # start(**MOCK_LLM_* overrides) runs a mock_llm.py and returns its base URL
+    processes = []
+
+    def start(**settings) -> str:
+        port = _free_port()
+        process = subprocess.Popen(
+            [sys.executable, "mock_llm.py", "--port", str(port)],
+            cwd=BACKEND_DIR, env={**os.environ, **{name: str(value) for name, value in settings.items()}},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        processes.append(process)
+        _wait_until_up(f"http://127.0.0.1:{port}/v1/models", process)
+        return f"http://127.0.0.1:{port}/v1"
+
+    yield start
+    for process in processes:
+        process.terminate()
+        process.wait()
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import update
+
+from backend import export
+from backend.export import PERSONA_KEYS, export_campaigns, run_export
+from backend.models import Campaign, ExportJob, Product, UserProfile
+from conftest import make_campaign
+
+T0 = datetime(2026, 1, 1)
+
+@pytest.fixture
+def campaigns(session):
+    # Three campaigns, all last changed at T0; the first has a persona
+    campaigns = [make_campaign(session) for _ in range(3)]
+    for model in (Campaign, Product, UserProfile):
+        session.execute(update(model).values(created_at=T0, updated_at=None))
+    session.execute(update(Campaign).where(Campaign.id == campaigns[0].id).values(creative_persona={"setting": "A rooftop", "pacing": "fast"}, updated_at=None))
+    session.commit()
+    return [campaign.id for campaign in campaigns]
+
+def touch(session, model, row_id: int, at: datetime):
+    session.execute(update(model).where(model.id == row_id).values(updated_at=at))
+    session.commit()
+
+def exported_ids(path: str):
+    return pq.read_table(path).column("campaign_id").to_pylist()
+
+def test_full_export(tmp_path, campaigns):
+    path = str(tmp_path / "campaigns.parquet")
+    summary = export_campaigns(path, chunk_size=2)
+    assert (summary["rows"], summary["row_groups"], summary["exported_until"]) == (3, 2, T0)
+    assert pq.ParquetFile(path).metadata.num_row_groups == 2
+    table = pq.read_table(path)
+    assert table.column("campaign_id").to_pylist() == campaigns
+    assert table.column("persona_setting").to_pylist() == ["A rooftop", None, None]
+    assert {f"persona_{key}" for key in PERSONA_KEYS} <= set(table.column_names)
+    assert not (tmp_path / "campaigns.parquet.partial").exists()
+
+def test_arrow_export(tmp_path, campaigns):
+    path = str(tmp_path / "campaigns.arrow")
+    export_campaigns(path, format="arrow", chunk_size=2)
+    with ipc.open_file(path) as reader:
+        assert reader.num_record_batches == 2
+        assert reader.read_all().column("campaign_id").to_pylist() == campaigns
+
+def test_unknown_format(tmp_path, campaigns):
+    with pytest.raises(ValueError):
+        export_campaigns(str(tmp_path / "campaigns.csv"), format="csv")
+
+def test_incremental_export_without_changes(tmp_path, campaigns):
+    summary = export_campaigns(str(tmp_path / "next.parquet"), since=T0)
+    # Nothing after `since`, which is handed back for the next run
+    assert (summary["rows"], summary["exported_until"]) == (0, T0)
+    assert exported_ids(summary["path"]) == []
+
+def test_incremental_export_picks_up_changes(tmp_path, session, campaigns):
+    first, second, third = campaigns
+    touch(session, Campaign, second, T0 + timedelta(hours=1))
+    summary = export_campaigns(str(tmp_path / "1.parquet"), since=T0)
+    assert exported_ids(summary["path"]) == [second]
+    assert summary["exported_until"] == T0 + timedelta(hours=1)
+
+    # A changed product or user re-exports the campaigns that embed them
+    product_id = session.get(Campaign, third).product_id
+    user_id = session.get(Campaign, first).user_id
+    touch(session, Product, product_id, T0 + timedelta(hours=2))
+    touch(session, UserProfile, user_id, T0 + timedelta(hours=3))
+    summary = export_campaigns(str(tmp_path / "2.parquet"), since=summary["exported_until"])
+    assert exported_ids(summary["path"]) == [first, third]
+    assert summary["exported_until"] == T0 + timedelta(hours=3)
+
+    summary = export_campaigns(str(tmp_path / "3.parquet"), since=summary["exported_until"])
+    assert summary["rows"] == 0
+
+def test_export_job(tmp_path, session, campaigns, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_DIR", str(tmp_path))
+    job = ExportJob(format="parquet", since=T0 - timedelta(days=1))
+    session.add(job)
+    session.commit()
+    run_export(job.id)
+    session.expire_all()
+    job = session.get(ExportJob, job.id)
+    assert (job.status, job.rows, job.exported_until, job.error) == ("completed", 3, T0, None)
+    assert exported_ids(job.path) == campaigns
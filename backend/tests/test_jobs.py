@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import select
+
+from backend import generation, jobs
+from backend.jobs import JobQueue, claim_job, queued_job_ids, requeue_stale_jobs, run_job
+from backend.models import Campaign, GenerationJob
+
+PERSONA = {"name": "Test Persona"}
+
+@pytest.fixture
+def queue():
+    # JOB_BACKEND=external: enqueue only writes the job
+    return JobQueue()
+
+@pytest.fixture
+def llm(monkeypatch):
+    monkeypatch.setattr(generation, "GENERATION_PIPELINE", "two-call")
+    monkeypatch.setattr(generation, "generate_persona", lambda *args, **kwargs: PERSONA)
+    monkeypatch.setattr(generation, "generate_sora_prompt", lambda *args, **kwargs: "A sora prompt")
+
+def _job(session, job_id: int) -> GenerationJob:
+    session.expire_all()
+    return session.get(GenerationJob, job_id)
+
+def test_enqueue_returns_the_active_job(session, campaign, queue):
+    first = queue.enqueue(campaign, session)
+    second = queue.enqueue(campaign, session)
+    assert second.id == first.id
+    assert len(session.exec(select(GenerationJob)).all()) == 1
+    assert session.get(Campaign, campaign.id).status == "processing"
+
+def test_enqueue_after_completion_creates_a_job(session, campaign, queue, llm):
+    first = queue.enqueue(campaign, session)
+    assert claim_job(first.id)
+    run_job(first.id)
+    second = queue.enqueue(session.get(Campaign, campaign.id), session)
+    assert second.id != first.id
+    assert second.status == "queued"
+
+def test_job_is_claimed_once(session, campaign, queue):
+    job = queue.enqueue(campaign, session)
+    assert queued_job_ids(limit=10) == [job.id]
+    assert claim_job(job.id)
+    assert not claim_job(job.id)
+    job = _job(session, job.id)
+    assert (job.status, job.stage) == ("running", "persona")
+    assert job.started_at is not None
+    assert queued_job_ids(limit=10) == []
+
+def test_run_job_saves_the_result(session, campaign, queue, llm):
+    job = queue.enqueue(campaign, session)
+    claim_job(job.id)
+    result = run_job(job.id)
+    assert result.status == "completed"
+    job = _job(session, job.id)
+    assert (job.status, job.stage, job.error) == ("completed", "done", None)
+    campaign = session.get(Campaign, campaign.id)
+    assert campaign.status == "completed"
+    assert campaign.creative_persona == PERSONA
+    assert campaign.sora_prompt == "A sora prompt"
+
+def test_llm_failure_fails_the_job(session, campaign, queue, llm, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("provider down")
+    monkeypatch.setattr(generation, "generate_sora_prompt", fail)
+    job = queue.enqueue(campaign, session)
+    claim_job(job.id)
+    assert run_job(job.id).error == "provider down"
+    job = _job(session, job.id)
+    assert (job.status, job.stage, job.error) == ("failed", "sora_prompt", "provider down")
+    assert session.get(Campaign, campaign.id).status == "failed"
+
+def test_prompt_failure_fails_the_job(session, campaign, queue, llm, monkeypatch):
+    # Raised while loading, before any LLM call
+    def fail(*args, **kwargs):
+        raise ValueError("bad profile")
+    monkeypatch.setattr(generation, "build_persona_prompt", fail)
+    job = queue.enqueue(campaign, session)
+    claim_job(job.id)
+    assert run_job(job.id).status == "failed"
+    job = _job(session, job.id)
+    assert (job.status, job.error) == ("failed", "bad profile")
+    assert session.get(Campaign, campaign.id).status == "failed"
+
+def test_missing_campaign_fails_the_job(session, campaign, queue):
+    job = GenerationJob(campaign_id=campaign.id + 1)
+    session.add(job)
+    session.commit()
+    claim_job(job.id)
+    assert run_job(job.id).error == "Campaign not found"
+    assert _job(session, job.id).status == "failed"
+
+def _running_job(session, campaign, started_at: datetime) -> GenerationJob:
+    job = GenerationJob(campaign_id=campaign.id, status="running", stage="persona", started_at=started_at)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+def test_stale_running_jobs_are_requeued(session, campaign):
+    stale = _running_job(session, campaign, datetime.utcnow() - timedelta(seconds=jobs.JOB_STALE_SECONDS + 60))
+    fresh = _running_job(session, campaign, datetime.utcnow())
+    assert requeue_stale_jobs() == 1
+    stale = _job(session, stale.id)
+    assert (stale.status, stale.stage, stale.started_at) == ("queued", "queued", None)
+    assert _job(session, fresh.id).status == "running"
+    # Requeued jobs go through the normal claim
+    assert claim_job(stale.id)
+
+def test_stale_job_does_not_block_regeneration(session, campaign, queue):
+    stale = _running_job(session, campaign, datetime.utcnow() - timedelta(seconds=jobs.JOB_STALE_SECONDS + 60))
+    job = queue.enqueue(campaign, session)
+    assert job.id != stale.id
+    stale = _job(session, stale.id)
+    assert (stale.status, stale.error) == ("failed", "Job timed out")
+
+def test_running_job_blocks_regeneration(session, campaign, queue):
+    running = _running_job(session, campaign, datetime.utcnow())
+    assert queue.enqueue(campaign, session).id == running.id
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlmodel import select
+
+from backend import llm_cache as cache_module
+from backend.llm_cache import LLMCache, cache_key
+from backend.models import LLMCacheEntry
+
+def messages(content: str):
+    return [{"role": "system", "content": "Write an ad."}, {"role": "user", "content": content}]
+
+def test_key_keeps_whitespace_inside_values():
+    one_line = cache_key("persona", "gpt-4o-mini", messages("**Product:** Bottle\nKeeps drinks cold.  All day."))
+    spaced = cache_key("persona", "gpt-4o-mini", messages("**Product:** Bottle\nKeeps drinks cold.\nAll day."))
+    assert one_line != spaced
+    assert one_line == cache_key("persona", "gpt-4o-mini", messages("**Product:** Bottle\nKeeps drinks cold.  All day."))
+    assert one_line != cache_key("sora_prompt", "gpt-4o-mini", messages("**Product:** Bottle\nKeeps drinks cold.  All day."))
+
+def test_get_falls_back_to_the_database():
+    cache = LLMCache(max_entries=1)
+    cache.set("a", "persona", "gpt-4o-mini", {"setting": "beach"})
+    cache.set("b", "persona", "gpt-4o-mini", {"setting": "city"})
+    assert cache.get("a") == {"setting": "beach"}
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["db_hits"], stats["evictions"]) == (0, 1, 2)
+
+def test_prune_keeps_the_newest_rows(session):
+    cache = LLMCache(max_rows=3)
+    for i in range(5):
+        cache.set(f"key-{i}", "persona", "gpt-4o-mini", i)
+        session.execute(update(LLMCacheEntry).where(LLMCacheEntry.key == f"key-{i}").values(created_at=datetime(2026, 1, 1) + timedelta(minutes=i)))
+        session.commit()
+    assert cache.prune() == 2
+    assert sorted(session.exec(select(LLMCacheEntry.key)).all()) == ["key-2", "key-3", "key-4"]
+    assert cache.stats()["pruned"] == 2
+
+def test_prune_removes_expired_rows(session):
+    cache = LLMCache(max_rows=0)
+    cache.set("fresh", "persona", "gpt-4o-mini", 1)
+    cache.set("stale", "persona", "gpt-4o-mini", 2)
+    session.execute(update(LLMCacheEntry).where(LLMCacheEntry.key == "stale").values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    session.commit()
+    assert cache.prune() == 1
+    assert session.exec(select(LLMCacheEntry.key)).all() == ["fresh"]
+
+def test_writes_prune_periodically(session, monkeypatch):
+    monkeypatch.setattr(cache_module, "PRUNE_INTERVAL", 4)
+    cache = LLMCache(max_rows=2)
+    for i in range(4):
+        cache.set(f"key-{i}", "persona", "gpt-4o-mini", i)
+    assert len(session.exec(select(LLMCacheEntry.key)).all()) == 2
@@ -0,0 +1,162 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import pytest
+from openai import OpenAI, AsyncOpenAI
+
+from backend import llm_gateway
+from backend.llm_gateway import CircuitBreaker, CircuitOpenError, LLMGateway, RateLimiter
+
+MESSAGES = [{"role": "user", "content": "Write a short ad."}]
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "LLM_BACKOFF_BASE_SECONDS", 0.01)
+
+@pytest.fixture(scope="module")
+def healthy(mock_llm):
+    return mock_llm()
+
+@pytest.fixture(scope="module")
+def failing(mock_llm):
+    return mock_llm(MOCK_LLM_ERROR_RATE=1)
+
+@pytest.fixture(scope="module")
+def rate_limited(mock_llm):
+    return mock_llm(MOCK_LLM_RATE_LIMIT_RATE=1, MOCK_LLM_RETRY_AFTER_SECONDS=0.05)
+
+def gateway(base_url: str, max_retries: int = 0, breaker: CircuitBreaker = None) -> LLMGateway:
+    # The gateway owns retries, so the clients never retry on their own
+    return LLMGateway(
+        OpenAI(api_key="mock", base_url=base_url, max_retries=0),
+        AsyncOpenAI(api_key="mock", base_url=base_url, max_retries=0),
+        max_concurrency=2, timeout=10, max_retries=max_retries,
+        limiter=RateLimiter(0, 0), breaker=breaker or CircuitBreaker(failure_threshold=100, reset_seconds=30)
+    )
+
+def test_complete(healthy):
+    llm = gateway(healthy)
+    completion = llm.complete("gpt-4o-mini", MESSAGES)
+    assert completion.choices[0].message.content
+    assert (llm.calls, llm.retries, llm.failures) == (1, 0, 0)
+
+def test_server_errors_are_retried_then_raised(failing):
+    llm = gateway(failing, max_retries=2)
+    with pytest.raises(openai.InternalServerError):
+        llm.complete("gpt-4o-mini", MESSAGES)
+    assert (llm.calls, llm.retries, llm.failures) == (3, 2, 1)
+    assert llm.breaker.failures == 3
+
+def test_async_server_errors_are_retried_then_raised(failing):
+    llm = gateway(failing, max_retries=2)
+    with pytest.raises(openai.InternalServerError):
+        asyncio.run(llm.complete_async("gpt-4o-mini", MESSAGES))
+    assert (llm.calls, llm.retries, llm.failures) == (3, 2, 1)
+
+def test_rate_limits_are_retried_without_tripping_the_breaker(rate_limited):
+    llm = gateway(rate_limited, max_retries=1, breaker=CircuitBreaker(failure_threshold=1, reset_seconds=30))
+    start = time.monotonic()
+    with pytest.raises(openai.RateLimitError):
+        llm.complete("gpt-4o-mini", MESSAGES)
+    # The retry waits out retry-after
+    assert time.monotonic() - start >= 0.05
+    assert (llm.calls, llm.retries, llm.rate_limited) == (2, 1, 2)
+    assert llm.breaker.state == "closed"
+
+def test_breaker_opens_after_consecutive_failures(failing):
+    llm = gateway(failing, breaker=CircuitBreaker(failure_threshold=2, reset_seconds=30))
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            llm.complete("gpt-4o-mini", MESSAGES)
+    assert llm.breaker.state == "open"
+    # Fails fast without reaching the provider
+    with pytest.raises(CircuitOpenError):
+        llm.complete("gpt-4o-mini", MESSAGES)
+    assert (llm.calls, llm.rejected) == (2, 1)
+    assert llm.stats()["circuit"]["times_opened"] == 1
+
+def test_breaker_stops_retries(failing):
+    llm = gateway(failing, max_retries=5, breaker=CircuitBreaker(failure_threshold=2, reset_seconds=30))
+    with pytest.raises(CircuitOpenError):
+        llm.complete("gpt-4o-mini", MESSAGES)
+    assert (llm.calls, llm.rejected) == (2, 1)
+
+def test_successful_probe_closes_the_breaker(failing, healthy):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.1)
+    with pytest.raises(openai.InternalServerError):
+        gateway(failing, breaker=breaker).complete("gpt-4o-mini", MESSAGES)
+    assert breaker.state == "open"
+    time.sleep(0.15)
+    # The provider has recovered: the half-open probe goes through
+    gateway(healthy, breaker=breaker).complete("gpt-4o-mini", MESSAGES)
+    assert (breaker.state, breaker.failures) == ("closed", 0)
+
+def test_failed_probe_reopens_the_breaker(failing):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.1)
+    llm = gateway(failing, breaker=breaker)
+    with pytest.raises(openai.InternalServerError):
+        llm.complete("gpt-4o-mini", MESSAGES)
+    time.sleep(0.15)
+    with pytest.raises(openai.InternalServerError):
+        llm.complete("gpt-4o-mini", MESSAGES)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        llm.complete("gpt-4o-mini", MESSAGES)
+    assert breaker.times_opened == 2
+
+class InFlight:
+    # Counts concurrent create() calls on the clients themselves, independently of the gateway
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _change(self, delta: int):
+        with self._lock:
+            self.current += delta
+            self.peak = max(self.peak, self.current)
+
+    def wrap(self, client):
+        raw = client.chat.completions.with_raw_response
+        create = raw.create
+        if asyncio.iscoroutinefunction(create):
+            async def counted(*args, **kwargs):
+                self._change(1)
+                try:
+                    return await create(*args, **kwargs)
+                finally:
+                    self._change(-1)
+        else:
+            def counted(*args, **kwargs):
+                self._change(1)
+                try:
+                    return create(*args, **kwargs)
+                finally:
+                    self._change(-1)
+        raw.create = counted
+
+def test_sync_and_async_calls_share_the_concurrency_limit(mock_llm):
+    llm = gateway(mock_llm(MOCK_LLM_LATENCY="fixed:100"))
+    in_flight = InFlight()
+    in_flight.wrap(llm.client)
+    in_flight.wrap(llm.async_client)
+
+    async def stream():
+        return [delta async for delta in llm.stream_async("gpt-4o-mini", MESSAGES)]
+
+    async def async_calls():
+        # As SSE streams do in sync IO mode, next to the job threads
+        return await asyncio.gather(*[llm.complete_async("gpt-4o-mini", MESSAGES) for _ in range(4)], stream())
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        sync_calls = [executor.submit(llm.complete, "gpt-4o-mini", MESSAGES) for _ in range(4)]
+        *completions, deltas = executor.submit(asyncio.run, async_calls()).result()
+        assert all(call.result().choices[0].message.content for call in sync_calls)
+    assert all(completion.choices[0].message.content for completion in completions) and deltas
+    # max_concurrency=2 covers both clients together
+    assert in_flight.peak <= 2
+    assert llm.slots.peak == 2
+    assert llm.stats()["in_flight"] == 0
@@ -0,0 +1,34 @@
+import pytest
+from sqlalchemy import text
+from sqlmodel import select
+
+from backend.database import engine
+from backend.migrate import migrate
+from backend.models import UserDemographics
+from backend.load_test import USER_PAYLOAD
+
+def _duplicate_demographics(session, user_id: int):
+    # A database from before user_id was unique, holding two rows for one user
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_userdemographics_user_id"))
+        conn.execute(text("CREATE INDEX ix_userdemographics_user_id ON userdemographics (user_id)"))
+    session.add(UserDemographics(**{**USER_PAYLOAD["demographics"], "country": "Canada"}, user_id=user_id))
+    session.commit()
+
+def _countries(session, user_id: int):
+    session.expire_all()
+    rows = session.exec(select(UserDemographics).where(UserDemographics.user_id == user_id).order_by(UserDemographics.id)).all()
+    return [row.country for row in rows]
+
+def test_duplicates_stop_the_migration(session, campaign):
+    _duplicate_demographics(session, campaign.user_id)
+    with pytest.raises(RuntimeError, match="--dedupe"):
+        migrate()
+    assert _countries(session, campaign.user_id) == ["USA", "Canada"]
+
+def test_dedupe_keeps_the_newest_row(session, campaign):
+    _duplicate_demographics(session, campaign.user_id)
+    migrate(dedupe=True)
+    assert _countries(session, campaign.user_id) == ["Canada"]
+    # The index is unique now, so later runs have nothing to do
+    migrate()
@@ -0,0 +1,52 @@
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.uploads import UPLOAD_MAX_BYTES, sweep_staging
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    uploads, staging = tmp_path / "uploads", tmp_path / "staging"
+    uploads.mkdir()
+    staging.mkdir()
+    monkeypatch.setattr(main, "UPLOADS_DIR", str(uploads))
+    monkeypatch.setattr(main, "UPLOAD_STAGING_DIR", str(staging))
+    return uploads, staging
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+def test_upload_is_stored_by_content(client, dirs):
+    uploads, staging = dirs
+    response = client.post("/upload", files={"file": ("notes.txt", b"hello")})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["size"], body["existing"]) == (5, False)
+    assert os.listdir(uploads) == [f"{body['sha256']}.txt"]
+    # Nothing is left in staging
+    assert os.listdir(staging) == []
+    assert client.post("/upload", files={"file": ("again.txt", b"hello")}).json()["existing"]
+
+def test_declared_oversized_body_is_rejected_before_parsing(client, dirs):
+    response = client.post(
+        "/upload", content=b"--x--\r\n",
+        headers={"Content-Type": "multipart/form-data; boundary=x", "Content-Length": str(UPLOAD_MAX_BYTES * 2)}
+    )
+    assert response.status_code == 413
+
+def test_missing_file_field(client, dirs):
+    assert client.post("/upload", data={"other": "value"}).status_code == 422
+
+def test_sweep_removes_only_stale_staged_files(tmp_path):
+    stale, fresh, kept = tmp_path / ".upload-stale", tmp_path / ".upload-fresh", tmp_path / "photo.png"
+    for path in (stale, fresh, kept):
+        path.write_bytes(b"data")
+    old = time.time() - 7200
+    os.utime(stale, (old, old))
+    os.utime(kept, (old, old))
+    assert sweep_staging(str(tmp_path), max_age=3600) == 1
+    assert sorted(os.listdir(tmp_path)) == [".upload-fresh", "photo.png"]
@@ -0,0 +1,73 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from backend.main import app
+from backend.load_test import USER_PAYLOAD
+from backend.models import UserLifestyle, UserProfile
+
+@pytest.fixture
+def client():
+    # Without the lifespan: the tables come from the database fixture
+    return TestClient(app)
+
+def create_user(client, **sections):
+    response = client.post("/users", json={"name": "Jane Doe", **sections})
+    assert response.status_code == 200
+    return response.json()
+
+def test_patch_name_keeps_sections(client, session):
+    user = create_user(client, **USER_PAYLOAD)
+    response = client.patch(f"/users/{user['id']}", json={"name": "Janet Doe"})
+    assert response.status_code == 200
+    patched = response.json()
+    assert patched["name"] == "Janet Doe"
+    for relation in USER_PAYLOAD:
+        assert patched[relation] == user[relation]
+    assert session.get(UserProfile, user["id"]).updated_at is not None
+
+def test_patch_updates_only_the_fields_sent(client, session):
+    user = create_user(client, **USER_PAYLOAD)
+    response = client.patch(f"/users/{user['id']}", json={"lifestyle": {"occupation": "Chef"}})
+    lifestyle = response.json()["lifestyle"]
+    assert lifestyle == {**user["lifestyle"], "occupation": "Chef"}
+    row = session.exec(select(UserLifestyle).where(UserLifestyle.user_id == user["id"])).one()
+    assert (row.occupation, row.hobbies) == ("Chef", USER_PAYLOAD["lifestyle"]["hobbies"])
+
+def test_patch_replaces_a_section_sent_whole(client):
+    user = create_user(client, **USER_PAYLOAD)
+    demographics = {**USER_PAYLOAD["demographics"], "country": "Canada"}
+    response = client.patch(f"/users/{user['id']}", json={"demographics": demographics})
+    assert response.json()["demographics"] == {**user["demographics"], "country": "Canada"}
+
+def test_patch_creates_a_missing_section(client, session):
+    user = create_user(client, demographics=USER_PAYLOAD["demographics"])
+    assert user["lifestyle"] is None
+    response = client.patch(f"/users/{user['id']}", json={"lifestyle": {"occupation": "Chef"}})
+    lifestyle = response.json()["lifestyle"]
+    assert lifestyle["occupation"] == "Chef"
+    # Fields left out get the model defaults
+    assert lifestyle["hobbies"] == UserLifestyle().hobbies
+    # Sections missing from both the profile and the patch stay empty
+    assert response.json()["psychographics"] is None
+    assert len(session.exec(select(UserLifestyle).where(UserLifestyle.user_id == user["id"])).all()) == 1
+
+def test_repeated_patches_upsert_one_row(client, session):
+    user = create_user(client, demographics=USER_PAYLOAD["demographics"])
+    for occupation in ("Chef", "Baker", "Florist"):
+        client.patch(f"/users/{user['id']}", json={"lifestyle": {"occupation": occupation}})
+    rows = session.exec(select(UserLifestyle).where(UserLifestyle.user_id == user["id"])).all()
+    assert [row.occupation for row in rows] == ["Florist"]
+
+def test_patch_response_matches_a_read(client):
+    user = create_user(client, **USER_PAYLOAD)
+    patched = client.patch(f"/users/{user['id']}", json={
+        "name": "Janet Doe",
+        "psychographics": {"values": ["family"]},
+        "media_preferences": {"preferred_platforms": ["TikTok"]},
+    }).json()
+    assert client.get(f"/users/{user['id']}").json() == patched
+
+def test_patch_unknown_user(client):
+    response = client.patch("/users/999", json={"name": "Nobody"})
+    assert response.status_code == 404
@@ -0,0 +1,83 @@
+import os
+import re
+import time
+import hashlib
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+# Multipart framing (boundary, part headers) allowed on top of the file when
+# the request's Content-Length is checked against UPLOAD_MAX_BYTES
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+# Staged files older than this are left over from a crash and swept at startup
+UPLOAD_STAGING_MAX_AGE_SECONDS = float(os.getenv("UPLOAD_STAGING_MAX_AGE_SECONDS", "3600"))
+
+STAGING_PREFIX = ".upload-"
+
+_EXTENSION = re.compile(r"^\.[a-z0-9]{1,10}$")
+
+class UploadTooLargeError(Exception):
+    pass
+
+@dataclass
+class StoredUpload:
+    filename: str # <sha256><ext>, relative to the uploads directory
+    sha256: str
+    size: int
+    existing: bool # identical content was already stored
+
+def _extension(filename: Optional[str]) -> str:
+    # Only the extension of the client-supplied name is kept, so it can
+    # neither escape the uploads directory nor collide with another file
+    extension = os.path.splitext(filename or "")[1].lower()
+    return extension if _EXTENSION.match(extension) else ""
+
+def store_upload(source: BinaryIO, filename: Optional[str], uploads_dir: str, staging_dir: str) -> StoredUpload:
+    # Blocking: call from a worker thread. Streams the upload to a temp file
+    # in chunks while hashing it, then moves it to its content address.
+    # staging_dir must not be served and must be on the same filesystem as
+    # uploads_dir, so partial files are never public and the move is atomic.
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=staging_dir, prefix=STAGING_PREFIX, delete=False) as temp:
+        try:
+            while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise UploadTooLargeError(f"File exceeds the {UPLOAD_MAX_BYTES} byte limit")
+                digest.update(chunk)
+                temp.write(chunk)
+        except BaseException:
+            temp.close()
+            os.unlink(temp.name)
+            raise
+
+    sha256 = digest.hexdigest()
+    stored_name = f"{sha256}{_extension(filename)}"
+    target = os.path.join(uploads_dir, stored_name)
+    if os.path.exists(target):
+        os.unlink(temp.name)
+        return StoredUpload(filename=stored_name, sha256=sha256, size=size, existing=True)
+
+    # Same content always lands on the same name, so a concurrent identical
+    # upload replacing ours is harmless
+    os.replace(temp.name, target)
+    return StoredUpload(filename=stored_name, sha256=sha256, size=size, existing=False)
+
+def sweep_staging(*directories: str, max_age: float = UPLOAD_STAGING_MAX_AGE_SECONDS) -> int:
+    # Removes staged files a crashed upload left behind; recent ones may
+    # belong to an upload still running in another process
+    removed = 0
+    cutoff = time.time() - max_age
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if entry.name.startswith(STAGING_PREFIX) and entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+                removed += 1
+    if removed:
+        print(f"Removed {removed} stale staged uploads")
+    return removed
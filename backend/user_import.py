@@ -0,0 +1,234 @@
+import os
+import csv
+import json
+import time
+import codecs
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, get_origin
+import anyio
+from fastapi import Request
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlmodel import Session
+
+try:
+    from backend.database import engine
+    from backend.models import UserProfile
+    from backend.schemas import UserProfileCreate
+    from backend.segments import PROFILE_RELATIONS, segment_index
+except ImportError:
+    from database import engine
+    from models import UserProfile
+    from schemas import UserProfileCreate
+    from segments import PROFILE_RELATIONS, segment_index
+
+# POST /users/import: an NDJSON or CSV body of UserProfileCreate records,
+# parsed as it is received and written IMPORT_BATCH_SIZE profiles at a time
+# (one multi-row INSERT ... RETURNING for the profiles, one INSERT per
+# profile table). Rows that fail validation are reported and skipped;
+# memory is bounded by the batch size, not the file size.
+
+# Profiles per transaction
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+# Failures listed in the response; the rest are only counted
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+IMPORT_FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/json": "ndjson",
+}
+
+# CSV column -> (section, field). Columns are "name", "section.field" or
+# just "field", since field names are unique across the profile sections.
+SECTION_FIELDS = {
+    name: (relation, name)
+    for relation, model in PROFILE_RELATIONS.items()
+    for name in model.model_fields if name not in ("id", "user_id")
+}
+# Fields whose CSV cells hold JSON (lists may also be written a|b|c)
+STRUCTURED_FIELDS = {
+    name for name, (relation, _) in SECTION_FIELDS.items()
+    if get_origin(PROFILE_RELATIONS[relation].model_fields[name].annotation) in (list, dict)
+}
+
+class ImportFormatError(ValueError):
+    pass
+
+def import_format(requested: Optional[str], content_type: Optional[str]) -> str:
+    if requested:
+        if requested not in ("csv", "ndjson"):
+            raise ImportFormatError(f"Unknown import format: {requested}")
+        return requested
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type not in IMPORT_FORMATS:
+        raise ImportFormatError("Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson")
+    return IMPORT_FORMATS[media_type]
+
+def body_chunks(request: Request) -> Iterator[bytes]:
+    # Pulls the request body off the event loop one chunk at a time; iterate
+    # it from a worker thread (run_in_threadpool)
+    stream = request.stream().__aiter__()
+
+    async def next_chunk() -> Optional[bytes]:
+        try:
+            return await stream.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    while True:
+        chunk = anyio.from_thread.run(next_chunk)
+        if chunk is None:
+            return
+        if chunk:
+            yield chunk
+
+def _lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    # Complete lines, newline included, holding at most one partial line back
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        start = 0
+        end = pending.find("\n")
+        while end != -1:
+            yield pending[start:end + 1]
+            start = end + 1
+            end = pending.find("\n", start)
+        pending = pending[start:]
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+# Records are (line number, record, error), with record None when the line
+# couldn't be parsed
+def ndjson_records(lines: Iterable[str]) -> Iterator[Tuple[int, Optional[Any], Optional[str]]]:
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line), None
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+
+def _csv_column(header: str) -> Tuple[Optional[str], str]:
+    name = header.strip()
+    if name in ("name", "created_at"):
+        return None, name
+    relation, _, field = name.rpartition(".")
+    if field in SECTION_FIELDS and relation in ("", SECTION_FIELDS[field][0]):
+        return SECTION_FIELDS[field]
+    raise ImportFormatError(f"Unknown CSV column: {header}")
+
+def _csv_value(field: str, cell: str) -> Any:
+    if field not in STRUCTURED_FIELDS:
+        return cell
+    if cell.lstrip()[:1] in ("[", "{"):
+        return json.loads(cell)
+    return [item.strip() for item in cell.split("|") if item.strip()]
+
+def csv_records(lines: Iterable[str]) -> Iterator[Tuple[int, Optional[Any], Optional[str]]]:
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [_csv_column(name) for name in header]
+    for row in reader:
+        # line_num counts physical lines, so quoted newlines keep numbers right
+        number = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue
+        if len(row) != len(columns):
+            yield number, None, f"Expected {len(columns)} columns, got {len(row)}"
+            continue
+        record: Dict[str, Any] = {}
+        try:
+            for (relation, field), cell in zip(columns, row):
+                if cell == "":
+                    continue
+                if relation is None:
+                    record[field] = cell
+                else:
+                    record.setdefault(relation, {})[field] = _csv_value(field, cell)
+        except ValueError as e:
+            yield number, None, f"{field}: invalid JSON ({e})"
+            continue
+        yield number, record, None
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in item['loc']) or 'record'}: {item['msg']}" for item in error.errors())
+
+def insert_profiles(users: List[UserProfileCreate]) -> List[int]:
+    with Session(engine) as session:
+        result = session.execute(
+            insert(UserProfile).returning(UserProfile.id, sort_by_parameter_order=True),
+            [{"name": user.name, "created_at": user.created_at} for user in users]
+        )
+        user_ids = list(result.scalars())
+        for relation, model in PROFILE_RELATIONS.items():
+            rows = [
+                {**section.model_dump(), "user_id": user_id}
+                for user_id, user in zip(user_ids, users)
+                if (section := getattr(user, relation)) is not None
+            ]
+            if rows:
+                session.execute(insert(model), rows)
+        session.commit()
+    # The same flat attributes profile_fields() gives a loaded profile
+    segment_index.upsert_many([
+        (user_id, {
+            name: value
+            for relation in PROFILE_RELATIONS if getattr(user, relation) is not None
+            for name, value in getattr(user, relation).model_dump().items()
+        })
+        for user_id, user in zip(user_ids, users)
+    ])
+    return user_ids
+
+def import_users(chunks: Iterable[bytes], format: str) -> Dict[str, Any]:
+    records = csv_records(_lines(chunks)) if format == "csv" else ndjson_records(_lines(chunks))
+    start = time.perf_counter()
+    received = imported = failed = 0
+    errors: List[Dict[str, Any]] = []
+
+    def fail(number: int, message: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({"line": number, "error": message})
+
+    def flush(batch: List[Tuple[int, UserProfileCreate]]):
+        nonlocal imported
+        try:
+            imported += len(insert_profiles([user for _, user in batch]))
+        except Exception as e:
+            # The batch rolled back as a whole; report every row in it
+            print(f"User import batch failed: {e}")
+            for number, _ in batch:
+                fail(number, f"Insert failed: {e.__class__.__name__}")
+
+    batch: List[Tuple[int, UserProfileCreate]] = []
+    for number, record, error in records:
+        received += 1
+        if error is not None:
+            fail(number, error)
+            continue
+        try:
+            batch.append((number, UserProfileCreate.model_validate(record)))
+        except ValidationError as e:
+            fail(number, _validation_message(e))
+            continue
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    print(f"Imported {imported} of {received} users ({failed} failed) in {time.perf_counter() - start:.1f}s")
+    return {
+        "received": received,
+        "imported": imported,
+        "failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors),
+    }
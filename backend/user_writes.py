@@ -0,0 +1,103 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import bindparam, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine.interfaces import BindTyping
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+try:
+    from backend.models import UserProfile
+    from backend.schemas import UserProfileUpdate
+    from backend.segments import PROFILE_RELATIONS
+except ImportError:
+    from models import UserProfile
+    from schemas import UserProfileUpdate
+    from segments import PROFILE_RELATIONS
+
+# PATCH /users/{id} without the ORM unit of work: one UPDATE ... RETURNING
+# for the profile row, one INSERT ... ON CONFLICT (user_id) DO UPDATE ...
+# RETURNING per section in the patch, and a single SELECT for the sections
+# it leaves alone. The response is built from what those statements return.
+
+def _template_dialect(dialect_class):
+    # Renders :param placeholders with no inline casts, so the compiled SQL
+    # can be reused through text(), whose typed parameters add the casts
+    dialect = dialect_class(paramstyle="named")
+    dialect.bind_typing = BindTyping.NONE
+    return dialect
+
+# Both dialects spell the upsert the same way
+UPSERT_DIALECTS = {
+    "postgresql": (postgresql_insert, _template_dialect(postgresql.dialect)),
+    "sqlite": (sqlite_insert, _template_dialect(sqlite.dialect)),
+}
+
+def section_columns(model) -> List[Any]:
+    return [column for name, column in model.__table__.columns.items() if name not in ("id", "user_id")]
+
+def _section(row) -> Optional[Dict[str, Any]]:
+    return dict(row._mapping) if row is not None else None
+
+@lru_cache(maxsize=None)
+def upsert_section_statement(dialect: str, model, changed: Tuple[str, ...]):
+    # A new row gets every field (defaults included); an existing one only
+    # the `changed` fields, as the ORM path did. SQLAlchemy can't cache ON
+    # CONFLICT statements, so each shape is compiled here once and reused.
+    insert, named = UPSERT_DIALECTS[dialect]
+    columns = [model.__table__.c.user_id, *section_columns(model)]
+    statement = insert(model).values({column.name: bindparam(column.name) for column in columns})
+    # An empty SET would skip the conflicting row, and RETURNING with it
+    updates = {name: statement.excluded[name] for name in changed} or {"user_id": statement.excluded.user_id}
+    statement = statement.on_conflict_do_update(index_elements=[model.user_id], set_=updates).returning(*section_columns(model))
+    sql = str(statement.compile(dialect=named))
+    return text(sql).bindparams(*[bindparam(column.name, type_=column.type) for column in columns]).columns(*section_columns(model))
+
+def patch_user(session: Session, user_id: int, patch: UserProfileUpdate) -> Optional[Dict[str, Any]]:
+    # Returns the patched profile in the UserProfileRead shape, or None if
+    # there is no such user. The caller commits.
+    values: Dict[str, Any] = {"updated_at": datetime.utcnow()}
+    if patch.name is not None:
+        values["name"] = patch.name
+    row = session.execute(
+        update(UserProfile).where(UserProfile.id == user_id).values(**values)
+        .returning(UserProfile.id, UserProfile.name, UserProfile.created_at)
+    ).first()
+    if row is None:
+        return None
+    user = dict(row._mapping)
+
+    dialect = session.get_bind().dialect.name
+    untouched = []
+    for relation, model in PROFILE_RELATIONS.items():
+        section = getattr(patch, relation)
+        if section is None:
+            untouched.append(relation)
+            continue
+        statement = upsert_section_statement(dialect, model, tuple(section.model_dump(exclude_unset=True)))
+        user[relation] = _section(session.execute(statement, {**section.model_dump(), "user_id": user_id}).first())
+
+    if untouched:
+        # Sections missing from the patch still belong in the response
+        statement = select(UserProfile.id)
+        for relation in untouched:
+            model = PROFILE_RELATIONS[relation]
+            statement = statement.add_columns(*[column.label(f"{relation}__{column.name}") for column in section_columns(model)], model.id.label(f"{relation}__id"))
+            statement = statement.outerjoin(model, model.user_id == UserProfile.id)
+        current = session.execute(statement.where(UserProfile.id == user_id)).first()._mapping
+        for relation in untouched:
+            if current[f"{relation}__id"] is None:
+                user[relation] = None
+            else:
+                user[relation] = {column.name: current[f"{relation}__{column.name}"] for column in section_columns(PROFILE_RELATIONS[relation])}
+    return user
+
+def section_fields(user: Dict[str, Any]) -> Dict[str, Any]:
+    # The flat attributes segments.profile_fields() gives a loaded profile
+    fields: Dict[str, Any] = {}
+    for relation in PROFILE_RELATIONS:
+        if user.get(relation) is not None:
+            fields.update(user[relation])
+    return fields
@@ -1,4 +1,4 @@
-import { fetchAPI } from './index';
+import { fetchAPI, fetchAllPages, API_URL } from './index';
 
 export interface Campaign {
     id: number;
@@ -21,9 +21,27 @@ export interface Campaign {
     };
 }
 
+export interface GenerationJob {
+    id: number;
+    campaign_id: number;
+    status: string;
+    stage: string;
+    error?: string;
+    created_at: string;
+    started_at?: string;
+    finished_at?: string;
+}
+
+export interface GenerationStreamHandlers {
+    onPersona?: (persona: any) => void;
+    onToken?: (text: string) => void;
+    onDone?: () => void;
+    onError?: (detail: string) => void;
+}
+
 export const campaignsApi = {
     getAll: async (): Promise<Campaign[]> => {
-        return fetchAPI('/campaigns');
+        return fetchAllPages<Campaign>('/campaigns');
     },
 
     getById: async (id: string | number): Promise<Campaign> => {
@@ -37,9 +55,30 @@ export const campaignsApi = {
         });
     },
 
-    generate: async (id: number): Promise<Campaign> => {
+    generate: async (id: number): Promise<GenerationJob> => {
         return fetchAPI(`/campaigns/${id}/generate`, {
             method: 'POST',
         });
     },
+
+    // Streams the persona and then the Sora prompt token by token; returns a function that closes the stream
+    generateStream: (id: number, handlers: GenerationStreamHandlers): (() => void) => {
+        const source = new EventSource(`${API_URL}/campaigns/${id}/generate/stream`);
+        source.addEventListener('persona', (e) => handlers.onPersona?.(JSON.parse((e as MessageEvent).data)));
+        source.addEventListener('token', (e) => handlers.onToken?.(JSON.parse((e as MessageEvent).data).text));
+        source.addEventListener('done', () => {
+            source.close();
+            handlers.onDone?.();
+        });
+        source.addEventListener('error', (e) => {
+            source.close();
+            const data = (e as MessageEvent).data;
+            handlers.onError?.(data ? JSON.parse(data).detail : 'Stream failed');
+        });
+        return () => source.close();
+    },
+
+    getJob: async (jobId: number): Promise<GenerationJob> => {
+        return fetchAPI(`/jobs/${jobId}`);
+    },
 };
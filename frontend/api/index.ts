@@ -1,6 +1,6 @@
 export const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://127.0.0.1:8000';
 
-export async function fetchAPI(endpoint: string, options: RequestInit = {}) {
+async function request(endpoint: string, options: RequestInit = {}): Promise<Response> {
     const res = await fetch(`${API_URL}${endpoint}`, {
         ...options,
         headers: {
@@ -14,5 +14,25 @@ export async function fetchAPI(endpoint: string, options: RequestInit = {}) {
         throw new Error(errorData.detail || `API Error: ${res.statusText}`);
     }
 
+    return res;
+}
+
+export async function fetchAPI(endpoint: string, options: RequestInit = {}) {
+    const res = await request(endpoint, options);
     return res.json();
 }
+
+// List endpoints return one page at a time; follows X-Next-Cursor until the last page
+export async function fetchAllPages<T>(endpoint: string, pageSize = 1000): Promise<T[]> {
+    const items: T[] = [];
+    const separator = endpoint.includes('?') ? '&' : '?';
+    let cursor: string | null = null;
+    do {
+        const page = `${endpoint}${separator}limit=${pageSize}${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`;
+        const res = await request(page);
+        items.push(...(await res.json()));
+        cursor = res.headers.get('X-Next-Cursor');
+    } while (cursor);
+
+    return items;
+}
@@ -1,10 +1,17 @@
 import { fetchAPI } from './index';
 
+export interface ImageVariants {
+    thumb: string;
+    card: string;
+    full: string;
+}
+
 export interface Product {
     id: number;
     name: string;
     description: string;
     image_url?: string;
+    image_variants?: ImageVariants | null;
     features: string[];
     created_at: string;
 }
@@ -1,7 +1,8 @@
 import { API_URL } from './index';
+import { ImageVariants } from './products';
 
 export const uploadsApi = {
-    uploadFile: async (file: File): Promise<{ url: string }> => {
+    uploadFile: async (file: File): Promise<{ url: string; variants?: ImageVariants | null }> => {
         const formData = new FormData();
         formData.append('file', file);
 
@@ -1,4 +1,4 @@
-import { fetchAPI } from './index';
+import { fetchAPI, fetchAllPages } from './index';
 
 export interface User {
     id: number;
@@ -12,7 +12,7 @@ export interface User {
 
 export const usersApi = {
     getAll: async (): Promise<User[]> => {
-        return fetchAPI('/users');
+        return fetchAllPages<User>('/users');
     },
 
     getById: async (id: string | number): Promise<User> => {
@@ -92,7 +92,7 @@ export default function CampaignDetails() {
                         <h3 className="text-lg font-bold text-gray-900 mb-4">Product Details</h3>
                         <div className="flex gap-4">
                             {(campaign.product as any).image_url && (
-                                <img src={(campaign.product as any).image_url} alt="Product" className="w-24 h-24 object-cover rounded-lg border border-gray-100" />
+                                <img src={(campaign.product as any).image_variants?.thumb ?? (campaign.product as any).image_url} alt="Product" className="w-24 h-24 object-cover rounded-lg border border-gray-100" />
                             )}
                             <div>
                                 <div className="font-bold text-gray-900">{campaign.product?.name}</div>
@@ -7,7 +7,7 @@ interface Campaign {
     creative_persona: any; // Using any for flexibility with the JSON structure
     created_at: string;
     user: { name: string; age: number; location: string; bio: string };
-    product: { name: string; description: string; image_url: string };
+    product: { name: string; description: string; image_url: string; image_variants?: { thumb: string; card: string; full: string } | null };
 }
 
 interface Props {
@@ -63,7 +63,7 @@ export default function CampaignDetailsModal({ campaign, isOpen, onClose }: Prop
                                 <p><span className="text-gray-500">Desc:</span> {campaign.product?.description}</p>
                                 {campaign.product?.image_url && (
                                     <img
-                                        src={campaign.product.image_url}
+                                        src={campaign.product.image_variants?.card ?? campaign.product.image_url}
                                         alt="Product"
                                         className="mt-2 h-24 w-auto object-cover rounded-lg border border-gray-200"
                                     />